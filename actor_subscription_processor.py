@@ -2,19 +2,85 @@
 
 import time
 import re
-from datetime import datetime, timedelta
+import json
+import hashlib
+from datetime import datetime, timedelta, timezone
 import logging
 from typing import Optional, Dict, Any, List, Set, Callable
 import threading
+import concurrent.futures
 from enum import Enum
 
 import tmdb_handler
 import emby_handler
+import constants
 from db_handler import get_db_connection # ★★★ 核心修改：导入新的数据库连接函数
 import moviepilot_handler
 
 logger = logging.getLogger(__name__)
 
+# 同时扫描的演员订阅数
+ACTOR_SCAN_WORKERS = 4
+# 扫描期间请求 TMDb 演员作品的速率上限（次/秒）
+ACTOR_SCAN_TMDB_RATE = 5.0
+# TMDb 人物变动接口最多支持查询的天数
+TMDB_CHANGES_MAX_DAYS = 14
+# 人物变动列表最多翻阅的页数；超过时（或超过待判断的演员数）直接全部重新获取作品列表更省请求
+TMDB_CHANGES_MAX_PAGES = 50
+
+class _RateLimiter:
+    """简单的全局速率限制：保证相邻两次调用之间至少间隔 1/rate 秒。"""
+    def __init__(self, rate_per_sec: float):
+        self._interval = 1.0 / rate_per_sec if rate_per_sec > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self._interval
+        if slot > now:
+            time.sleep(slot - now)
+
+class _SubscriptionSession:
+    """
+    一次扫描任务内的订阅去重，可被多个扫描线程共享。
+    同一作品只提交一次；其他线程同时遇到它时等待这次提交的结果，提交失败则允许后来者重试。
+    """
+    def __init__(self, subscribed_ids: Optional[Set[str]] = None):
+        self.subscribed_ids = subscribed_ids if subscribed_ids is not None else set()
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, threading.Event] = {}
+
+    def is_subscribed(self, media_id: str) -> bool:
+        with self._lock:
+            return media_id in self.subscribed_ids
+
+    def subscribe_once(self, media_id: str, submit: Callable[[], bool]) -> bool:
+        while True:
+            with self._lock:
+                if media_id in self.subscribed_ids:
+                    return True
+                event = self._in_flight.get(media_id)
+                is_owner = event is None
+                if is_owner:
+                    event = threading.Event()
+                    self._in_flight[media_id] = event
+            if not is_owner:
+                event.wait()
+                continue
+            success = False
+            try:
+                success = submit()
+            finally:
+                with self._lock:
+                    if success:
+                        self.subscribed_ids.add(media_id)
+                    del self._in_flight[media_id]
+                event.set()
+            return success
+
 class MediaStatus(Enum):
     IN_LIBRARY = 'IN_LIBRARY'
     PENDING_RELEASE = 'PENDING_RELEASE'
@@ -34,6 +100,7 @@ class ActorSubscriptionProcessor:
         self.emby_api_key = config.get('emby_api_key')
         self.emby_user_id = config.get('emby_user_id')
         self.subscribe_delay_sec = config.get('subscribe_delay_sec', 0.5)
+        self.credits_max_age_days = int(config.get(constants.CONFIG_OPTION_ACTOR_CREDITS_MAX_AGE_DAYS, 7) or 7)
         self._stop_event = threading.Event()
 
     def signal_stop(self):
@@ -62,7 +129,7 @@ class ActorSubscriptionProcessor:
             with get_db_connection() as conn:
                 # ★★★ 核心修改：不再需要设置 row_factory，因为 db_handler 已配置 RealDictCursor
                 cursor = conn.cursor()
-                cursor.execute("SELECT id, actor_name FROM actor_subscriptions WHERE status = 'active'")
+                cursor.execute("SELECT id, actor_name, tmdb_person_id, credits_checked_at FROM actor_subscriptions WHERE status = 'active'")
                 # fetchall() 在 RealDictCursor 下返回字典列表，行为一致
                 subs_to_process = cursor.fetchall()
         except Exception as e:
@@ -97,90 +164,211 @@ class ActorSubscriptionProcessor:
             _update_status(-1, "错误：连接 Emby 或获取数据失败。")
             return
 
-        session_subscribed_ids: Set[str] = set()
-
-        for i, sub in enumerate(subs_to_process):
-            if self.is_stop_requested():
-                logger.info("定时演员订阅扫描任务被用户中断。")
-                break
-            
-            progress = int(5 + ((i + 1) / total_subs) * 95)
-            message = f"  -> ({i+1}/{total_subs}) 正在扫描演员: {sub['actor_name']}"
-            _update_status(progress, message)
-            logger.info(message)
-            
-            self.run_full_scan_for_actor(sub['id'], emby_tmdb_ids, session_subscribed_ids)
-            
-            if not self.is_stop_requested() and i < total_subs - 1:
-                time.sleep(1) 
+        # ★★★ 多个演员并发扫描，TMDb 请求（含人物变动列表）共享一个速率上限，订阅去重在所有线程间共享 ★★★
+        tmdb_limiter = _RateLimiter(ACTOR_SCAN_TMDB_RATE)
+        ids_needing_credits = self._select_subscriptions_needing_credits(subs_to_process, tmdb_limiter)
+        logger.info(f"  -> 其中 {len(ids_needing_credits)} 个演员需要重新获取作品列表，其余仅根据已记录的作品刷新状态。")
+
+        session = _SubscriptionSession()
+        finished = 0
+        with concurrent.futures.ThreadPoolExecutor(max_workers=ACTOR_SCAN_WORKERS) as executor:
+            future_to_sub = {
+                executor.submit(self.run_full_scan_for_actor, sub['id'], emby_tmdb_ids, session, tmdb_limiter,
+                                refresh_credits=sub['id'] in ids_needing_credits): sub
+                for sub in subs_to_process
+            }
+            for future in concurrent.futures.as_completed(future_to_sub):
+                sub = future_to_sub[future]
+                finished += 1
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error(f"扫描演员 {sub['actor_name']} 时发生未捕获的异常: {e}", exc_info=True)
+                progress = int(5 + (finished / total_subs) * 95)
+                _update_status(progress, f"  -> ({finished}/{total_subs}) 已扫描演员: {sub['actor_name']}")
+
+        if self.is_stop_requested():
+            logger.info("定时演员订阅扫描任务被用户中断。")
                 
         if not self.is_stop_requested():
             logger.trace("--- 定时演员订阅扫描任务执行完毕 ---")
             _update_status(100, "  -> 所有订阅扫描完成。")
 
 
-    def run_full_scan_for_actor(self, subscription_id: int, emby_tmdb_ids: Set[str], session_subscribed_ids: Optional[Set[str]] = None):
-        if session_subscribed_ids is None:
-            session_subscribed_ids = set()
+    def _select_subscriptions_needing_credits(self, subs: List[Dict[str, Any]],
+                                              tmdb_limiter: Optional[_RateLimiter] = None) -> Set[int]:
+        """
+        决定哪些订阅需要重新下载完整的作品列表：
+        从未获取过、超过 credits_max_age_days 未获取，或 TMDb 人物变动接口显示其有变动。
+        变动接口不可用、或变动列表页数多于待判断的演员数时，全部视为需要获取。
+        """
+        now = datetime.now(timezone.utc)
+        max_age = timedelta(days=min(self.credits_max_age_days, TMDB_CHANGES_MAX_DAYS))
+        needing = set()
+        fresh_subs = []
+        for sub in subs:
+            checked_at = sub.get('credits_checked_at')
+            if checked_at is None or now - checked_at >= max_age:
+                needing.add(sub['id'])
+            else:
+                fresh_subs.append(sub)
+        if not fresh_subs:
+            return needing
+
+        start_date = min(sub['credits_checked_at'] for sub in fresh_subs).date().isoformat()
+        max_pages = min(len(fresh_subs), TMDB_CHANGES_MAX_PAGES)
+        changed_person_ids = tmdb_handler.get_changed_person_ids(
+            self.tmdb_api_key, start_date, max_pages=max_pages, rate_limiter=tmdb_limiter
+        )
+        if changed_person_ids is None:
+            logger.warning("  -> TMDb 人物变动列表不可用或过长，本次将重新获取所有演员的作品列表。")
+            needing.update(sub['id'] for sub in fresh_subs)
+        else:
+            needing.update(sub['id'] for sub in fresh_subs if sub['tmdb_person_id'] in changed_person_ids)
+        return needing
+
+    @staticmethod
+    def _credits_fingerprint(all_works: List[Dict]) -> str:
+        """筛选后作品列表的指纹：只关心作品本身及其上映日期。筛选规则或评分变化导致作品增减时指纹随之变化。"""
+        works = sorted(
+            (work.get('media_type', 'movie' if 'title' in work else 'tv'), work.get('id') or 0,
+             work.get('release_date') or work.get('first_air_date') or '')
+            for work in all_works
+        )
+        return hashlib.sha1(json.dumps(works).encode('utf-8')).hexdigest()
+
+    def run_full_scan_for_actor(self, subscription_id: int, emby_tmdb_ids: Set[str],
+                                session_subscribed_ids=None, tmdb_limiter: Optional[_RateLimiter] = None,
+                                refresh_credits: bool = True):
+        """
+        为一个订阅执行全量作品扫描。
+        数据库只在扫描前读取、扫描后写入时短暂占用连接；TMDb 和 MoviePilot 请求期间不持有连接。
+        session_subscribed_ids 可以是本次任务共享的 _SubscriptionSession，也可以是普通的 ID 集合。
+        refresh_credits=False 时不请求 TMDb，只根据已记录的作品重新判断入库/订阅状态。
+        """
+        if isinstance(session_subscribed_ids, _SubscriptionSession):
+            session = session_subscribed_ids
+        else:
+            session = _SubscriptionSession(session_subscribed_ids)
 
         logger.trace(f"--- 开始为订阅ID {subscription_id} 执行全量作品扫描 ---")
         try:
-            # ★★★ 核心修改：使用新的 get_db_connection
+            if self.is_stop_requested(): return
+
+            # 阶段1：短事务读取订阅配置和已追踪的作品
             with get_db_connection() as conn:
                 cursor = conn.cursor()
-
                 # ★★★ 核心修改：SQL占位符从 ? 改为 %s
                 cursor.execute("SELECT * FROM actor_subscriptions WHERE id = %s", (subscription_id,))
                 sub = cursor.fetchone()
                 if not sub: return
-                
-                logger.trace(f"  -> 正在处理演员: {sub['actor_name']} (TMDb ID: {sub['tmdb_person_id']})")
-
                 old_tracked_media = self._get_existing_tracked_media(cursor, subscription_id)
-                
-                credits = tmdb_handler.get_person_credits_tmdb(sub['tmdb_person_id'], self.tmdb_api_key)
-                if self.is_stop_requested() or not credits: return
-                
-                all_works = credits.get('movie_credits', {}).get('cast', []) + credits.get('tv_credits', {}).get('cast', [])
-                logger.info(f"  -> 从TMDb获取到演员 {sub['actor_name']} 的 {len(all_works)} 部原始作品记录。")
+                tracked_works = None if refresh_credits else self._get_tracked_works(cursor, subscription_id)
 
-                filtered_works = self._filter_works(all_works, sub)
-                logger.info(f"  -> 根据规则筛选后，有 {len(filtered_works)} 部作品需要处理。")
+            logger.trace(f"  -> 正在处理演员: {sub['actor_name']} (TMDb ID: {sub['tmdb_person_id']})")
 
-                media_to_insert = []
-                media_to_update = []
-                today_str = datetime.now().strftime('%Y-%m-%d')
+            if not refresh_credits:
+                self._refresh_tracked_statuses(sub, tracked_works, old_tracked_media, emby_tmdb_ids, session)
+                return
+
+            # 阶段2：网络请求（不持有数据库连接）
+            if tmdb_limiter: tmdb_limiter.wait()
+            credits = tmdb_handler.get_person_credits_tmdb(sub['tmdb_person_id'], self.tmdb_api_key)
+            if self.is_stop_requested() or not credits: return
+            
+            all_works = credits.get('movie_credits', {}).get('cast', []) + credits.get('tv_credits', {}).get('cast', [])
+            logger.info(f"  -> 从TMDb获取到演员 {sub['actor_name']} 的 {len(all_works)} 部原始作品记录。")
+            filtered_works = self._filter_works(all_works, sub)
+            logger.info(f"  -> 根据规则筛选后，有 {len(filtered_works)} 部作品需要处理。")
+
+            # 筛选后的作品与上次完全相同（且已追踪记录与之一致）时，无需再做插入/删除的比对和重写，只刷新状态
+            credits_fingerprint = self._credits_fingerprint(filtered_works)
+            if credits_fingerprint == sub.get('credits_fingerprint') and {work.get('id') for work in filtered_works} == set(old_tracked_media):
+                logger.debug(f"  -> 演员 {sub['actor_name']} 的作品列表与上次相同，只刷新已追踪作品的状态。")
+                self._refresh_tracked_statuses(sub, filtered_works, old_tracked_media, emby_tmdb_ids, session, mark_checked=True)
+                return
 
-                for work in filtered_works:
-                    if self.is_stop_requested(): break
+            media_to_insert = []
+            media_to_update = []
+            today_str = datetime.now().strftime('%Y-%m-%d')
 
-                    media_id = work.get('id')
-                    old_status = old_tracked_media.get(media_id)
+            for work in filtered_works:
+                if self.is_stop_requested(): break
 
-                    current_status = self._determine_media_status(work, emby_tmdb_ids, today_str, old_status, session_subscribed_ids)
-                    if not current_status: continue
+                media_id = work.get('id')
+                old_status = old_tracked_media.get(media_id)
 
-                    if old_status is None:
-                        media_to_insert.append(self._prepare_media_dict(work, subscription_id, current_status))
-                    elif old_status != current_status.value:
-                        media_to_update.append({'status': current_status.value, 'subscription_id': subscription_id, 'tmdb_media_id': media_id})
-                    
-                    old_tracked_media.pop(media_id, None)
+                current_status = self._determine_media_status(work, emby_tmdb_ids, today_str, old_status, session)
+                if not current_status: continue
 
-                if self.is_stop_requested():
-                    logger.info(f"任务在处理作品时被中断 (订阅ID: {subscription_id})。")
-                    return
+                if old_status is None:
+                    media_to_insert.append(self._prepare_media_dict(work, subscription_id, current_status))
+                elif old_status != current_status.value:
+                    media_to_update.append({'status': current_status.value, 'subscription_id': subscription_id, 'tmdb_media_id': media_id})
+                
+                old_tracked_media.pop(media_id, None)
+
+            if self.is_stop_requested():
+                logger.info(f"任务在处理作品时被中断 (订阅ID: {subscription_id})。")
+                return
 
-                media_ids_to_delete = list(old_tracked_media.keys())
+            media_ids_to_delete = list(old_tracked_media.keys())
 
+            # 阶段3：短事务写回结果
+            with get_db_connection() as conn:
+                cursor = conn.cursor()
                 self._update_database_records(cursor, subscription_id, media_to_insert, media_to_update, media_ids_to_delete)
-                
+                cursor.execute(
+                    "UPDATE actor_subscriptions SET credits_fingerprint = %s, credits_checked_at = CURRENT_TIMESTAMP WHERE id = %s",
+                    (credits_fingerprint, subscription_id)
+                )
                 conn.commit()
-                logger.info(f"  -> ✅ {sub['actor_name']} 的全量处理成功完成 ---")
+            logger.info(f"  -> ✅ {sub['actor_name']} 的全量处理成功完成 ---")
 
         except Exception as e:
             logger.error(f"为订阅ID {subscription_id} 执行扫描时发生严重错误: {e}", exc_info=True)
 
+    def _refresh_tracked_statuses(self, sub: Dict[str, Any], tracked_works: List[Dict], old_tracked_media: Dict[int, str],
+                                  emby_tmdb_ids: Set[str], session: _SubscriptionSession, mark_checked: bool = False):
+        """
+        作品列表无需重新获取或未发生变化时：只对已记录的作品重新判断状态（入库、上映后订阅等）。
+        mark_checked=True 表示刚从 TMDb 确认过作品列表，同时更新 credits_checked_at。
+        """
+        subscription_id = sub['id']
+        today_str = datetime.now().strftime('%Y-%m-%d')
+        media_to_update = []
+        for work in tracked_works:
+            if self.is_stop_requested():
+                logger.info(f"任务在处理作品时被中断 (订阅ID: {subscription_id})。")
+                return
+            old_status = old_tracked_media.get(work['id'])
+            current_status = self._determine_media_status(work, emby_tmdb_ids, today_str, old_status, session)
+            if current_status and old_status != current_status.value:
+                media_to_update.append({'status': current_status.value, 'subscription_id': subscription_id, 'tmdb_media_id': work['id']})
+
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            self._update_database_records(cursor, subscription_id, [], media_to_update, [])
+            if mark_checked:
+                cursor.execute("UPDATE actor_subscriptions SET credits_checked_at = CURRENT_TIMESTAMP WHERE id = %s", (subscription_id,))
+            conn.commit()
+        logger.info(f"  -> ✅ {sub['actor_name']} 的作品列表无变化，已根据记录刷新 {len(media_to_update)} 部作品的状态 ---")
+
+    def _get_tracked_works(self, cursor, subscription_id: int) -> List[Dict]:
+        """把已追踪的作品还原成与 TMDb 作品列表相同结构的字典，供状态判断复用。"""
+        cursor.execute(
+            "SELECT tmdb_media_id, media_type, title, release_date FROM tracked_actor_media WHERE subscription_id = %s",
+            (subscription_id,)
+        )
+        works = []
+        for row in cursor.fetchall():
+            release_date = row['release_date'].isoformat() if row['release_date'] else ''
+            if row['media_type'] == MediaType.SERIES.value:
+                works.append({'id': row['tmdb_media_id'], 'media_type': 'tv', 'name': row['title'], 'first_air_date': release_date})
+            else:
+                works.append({'id': row['tmdb_media_id'], 'media_type': 'movie', 'title': row['title'], 'release_date': release_date})
+        return works
+
     def _get_existing_tracked_media(self, cursor, subscription_id: int) -> Dict[int, str]:
         """从数据库获取当前已追踪的媒体及其状态。"""
         # ★★★ 核心修改：SQL占位符从 ? 改为 %s
@@ -252,7 +440,7 @@ class ActorSubscriptionProcessor:
             
         return filtered
 
-    def _determine_media_status(self, work: Dict, emby_tmdb_ids: Set[str], today_str: str, old_status: Optional[str], session_subscribed_ids: Set[str]) -> Optional[MediaStatus]:
+    def _determine_media_status(self, work: Dict, emby_tmdb_ids: Set[str], today_str: str, old_status: Optional[str], session: _SubscriptionSession) -> Optional[MediaStatus]:
         """判断单个作品的当前状态，如果需要则触发订阅。"""
         # ... (此函数无数据库交互，无需修改) ...
         media_id_str = str(work.get('id'))
@@ -264,28 +452,28 @@ class ActorSubscriptionProcessor:
         if old_status == MediaStatus.SUBSCRIBED.value:
             return MediaStatus.SUBSCRIBED
 
-        if media_id_str in session_subscribed_ids:
+        if session.is_subscribed(media_id_str):
             logger.trace(f"  -> 作品 '{work.get('title') or work.get('name')}' (ID: {media_id_str}) 已在本次任务中被订阅，跳过重复请求。")
             return MediaStatus.SUBSCRIBED
 
         if release_date_str > today_str:
             return MediaStatus.PENDING_RELEASE
         
-        logger.info(f"  -> 发现缺失作品: {work.get('title') or work.get('name')}，准备提交订阅...")
-        success = False
         media_type_raw = work.get('media_type', 'movie' if 'title' in work else 'tv')
 
-        if media_type_raw == 'movie':
-            success = moviepilot_handler.subscribe_movie_to_moviepilot(
-                movie_info={'title': work.get('title'), 'tmdb_id': work.get('id')}, config=self.config)
-        else: # tv
-            success = moviepilot_handler.subscribe_series_to_moviepilot(
-                series_info={'item_name': work.get('name'), 'tmdb_id': work.get('id')}, season_number=None, config=self.config)
-        
-        time.sleep(self.subscribe_delay_sec)
-
-        if success:
-            session_subscribed_ids.add(media_id_str)
+        def submit() -> bool:
+            logger.info(f"  -> 发现缺失作品: {work.get('title') or work.get('name')}，准备提交订阅...")
+            if media_type_raw == 'movie':
+                success = moviepilot_handler.subscribe_movie_to_moviepilot(
+                    movie_info={'title': work.get('title'), 'tmdb_id': work.get('id')}, config=self.config)
+            else: # tv
+                success = moviepilot_handler.subscribe_series_to_moviepilot(
+                    series_info={'item_name': work.get('name'), 'tmdb_id': work.get('id')}, season_number=None, config=self.config)
+            time.sleep(self.subscribe_delay_sec)
+            return success
+
+        # 同一作品在本次任务中只提交一次，并发线程会等待这次提交的结果
+        if session.subscribe_once(media_id_str, submit):
             return MediaStatus.SUBSCRIBED
         else:
             return MediaStatus.MISSING
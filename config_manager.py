@@ -91,6 +91,7 @@ constants.CONFIG_OPTION_EMBY_ADMIN_PASS: (constants.CONFIG_SECTION_EMBY, 'passwo
     constants.CONFIG_OPTION_RESUBSCRIBE_COMPLETED_ON_MISSING: (constants.CONFIG_SECTION_MOVIEPILOT, 'boolean', False),
     constants.CONFIG_OPTION_RESUBSCRIBE_DAILY_CAP: (constants.CONFIG_SECTION_MOVIEPILOT, 'int', 200),
     constants.CONFIG_OPTION_RESUBSCRIBE_DELAY_SECONDS: (constants.CONFIG_SECTION_MOVIEPILOT, 'float', 1.5),
+    constants.CONFIG_OPTION_ACTOR_CREDITS_MAX_AGE_DAYS: (constants.CONFIG_SECTION_MOVIEPILOT, 'int', 7),
     
     # [LocalDataSource]
     constants.CONFIG_OPTION_LOCAL_DATA_PATH: (constants.CONFIG_SECTION_LOCAL_DATA, 'string', ""),
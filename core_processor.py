@@ -2,10 +2,13 @@
 
 import os
 import json
+import hashlib
 import concurrent.futures
 from typing import Dict, List, Optional, Any, Tuple, Set
 import shutil
 import threading
+import bisect
+from array import array
 from datetime import datetime, timezone
 import time as time_module
 import psycopg2
@@ -18,6 +21,7 @@ import constants
 import logging
 import actor_utils
 from cachetools import TTLCache
+import db_handler
 from db_handler import ActorDBManager
 from db_handler import get_db_connection as get_central_db_connection
 from ai_translator import AITranslator
@@ -46,6 +50,94 @@ def _read_local_json(file_path: str) -> Optional[Dict[str, Any]]:
     except Exception as e:
         logger.error(f"读取本地JSON文件失败: {file_path}, 错误: {e}")
         return None
+# --- 覆盖缓存文件的增量写入 ---
+OVERRIDE_MANIFEST_FILENAME = ".override_hashes.json"
+IMAGE_TAGS_MANIFEST_FILENAME = ".image_tags.json"
+IMAGE_DOWNLOAD_WORKERS = 4
+# --- 全量任务断点的键 ---
+FULL_LIBRARY_CHECKPOINT_KEY = "process_full_library"
+MEDIA_ASSETS_CHECKPOINT_KEY = "sync_all_media_assets"
+TASK_CHECKPOINT_MAX_AGE_HOURS = 24  # 超过该时长的断点不再续跑，工作列表中的图片标签、修改时间等已不可信
+CHECKPOINT_FLUSH_INTERVAL = 20      # 并发任务每完成这么多项才把游标写回数据库一次
+def _atomic_write_bytes(file_path: str, data: bytes):
+    """先写同目录临时文件再 os.replace，保证目标文件要么是旧内容、要么是完整的新内容。"""
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, file_path)
+def _load_override_manifest(target_dir: str) -> Dict[str, Dict[str, Any]]:
+    """读取覆盖目录中记录的生成文件哈希清单，格式: {相对路径: {sha1, size, mtime_ns}}。"""
+    manifest_path = os.path.join(target_dir, OVERRIDE_MANIFEST_FILENAME)
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        return manifest if isinstance(manifest, dict) else {}
+    except (OSError, ValueError):
+        return {}
+def _save_override_manifest(target_dir: str, manifest: Dict[str, Dict[str, Any]]):
+    data = json.dumps(manifest, ensure_ascii=False, sort_keys=True).encode('utf-8')
+    _atomic_write_bytes(os.path.join(target_dir, OVERRIDE_MANIFEST_FILENAME), data)
+def _write_override_file_if_changed(target_dir: str, rel_path: str, data: bytes, manifest: Dict[str, Dict[str, Any]]) -> int:
+    """
+    内容哈希与磁盘上的文件一致时不做任何写入，否则原子写入。
+    返回实际写入的字节数 (未变化时为 0)，并就地更新 manifest。
+    """
+    file_path = os.path.join(target_dir, rel_path)
+    new_hash = hashlib.sha1(data).hexdigest()
+    try:
+        st = os.stat(file_path)
+    except FileNotFoundError:
+        st = None
+
+    if st is not None:
+        entry = manifest.get(rel_path)
+        # 清单命中且文件未被外部改动 (大小+修改时间一致)，无需读盘即可判定未变化
+        if entry and entry.get("sha1") == new_hash and entry.get("size") == st.st_size and entry.get("mtime_ns") == st.st_mtime_ns:
+            return 0
+        # 清单缺失或过期：退回到读取现有文件计算哈希
+        if st.st_size == len(data):
+            with open(file_path, 'rb') as f:
+                if hashlib.sha1(f.read()).hexdigest() == new_hash:
+                    manifest[rel_path] = {"sha1": new_hash, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+                    return 0
+
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    _atomic_write_bytes(file_path, data)
+    st = os.stat(file_path)
+    manifest[rel_path] = {"sha1": new_hash, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    return len(data)
+def _copy_file_if_changed(source_path: str, target_path: str) -> int:
+    """增量复制：大小和修改时间都与源文件一致时跳过 (copy2 会保留修改时间)，返回写入的字节数。"""
+    src_st = os.stat(source_path)
+    try:
+        dst_st = os.stat(target_path)
+        if dst_st.st_size == src_st.st_size and int(dst_st.st_mtime) == int(src_st.st_mtime):
+            return 0
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    tmp_path = f"{target_path}.tmp"
+    shutil.copy2(source_path, tmp_path)
+    os.replace(tmp_path, target_path)
+    return src_st.st_size
+def _get_emby_image_tag(item: Dict[str, Any], image_type: str) -> Tuple[bool, Optional[str]]:
+    """
+    从 Emby 项目数据中取出某个图片槽位当前的 tag。
+    返回 (是否掌握该槽位的 tag 信息, tag)。信息未知时调用方应照常下载。
+    """
+    if image_type == "Backdrop":
+        if "BackdropImageTags" not in item:
+            return False, None
+        backdrop_tags = item.get("BackdropImageTags") or []
+        return True, (backdrop_tags[0] if backdrop_tags else None)
+    if "ImageTags" not in item:
+        return False, None
+    return True, (item.get("ImageTags") or {}).get(image_type)
+def _dump_override_json(data: Dict[str, Any]) -> bytes:
+    """覆盖缓存 JSON 的统一序列化格式，保证相同内容得到相同字节，哈希才能稳定。"""
+    return json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
 def _save_metadata_to_cache(
     cursor: psycopg2.extensions.cursor,
     tmdb_id: str,
@@ -90,6 +182,7 @@ def _save_metadata_to_cache(
         metadata = {
             "tmdb_id": tmdb_id,
             "item_type": item_type,
+            "emby_item_id": item_details_from_emby.get('Id'),
             "title": item_details_from_emby.get('Name'),
             "original_title": item_details_from_emby.get('OriginalTitle'),
             "release_year": item_details_from_emby.get('ProductionYear'),
@@ -110,6 +203,7 @@ def _save_metadata_to_cache(
         
         # media_metadata 表的冲突键是 (tmdb_id, item_type)
         update_clauses = [f"{col} = EXCLUDED.{col}" for col in columns]
+        update_clauses.append("last_updated_at = NOW()")  # 本地搜索索引据此判断是否需要重建
         update_str = ', '.join(update_clauses)
 
         sql = f"""
@@ -154,6 +248,193 @@ def _aggregate_series_cast_from_tmdb_data(series_data: Dict[str, Any], all_episo
     
     logger.info(f"  -> 共为 '{series_data.get('name')}' 聚合了 {len(full_aggregated_cast)} 位独立演员。")
     return full_aggregated_cast
+def _compute_fingerprint(payload: Any) -> str:
+    """
+    为写回 Emby 的数据计算稳定指纹。
+    键排序 + 紧凑分隔符，保证同样的内容在任何一次运行中都得到同样的结果。
+    """
+    canonical = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+def _compute_person_fingerprint(name: Optional[str], provider_ids: Optional[Dict[str, Any]]) -> str:
+    """演员(Person)写回字段的指纹：名字 + 外部ID。"""
+    sanitized_ids = {k: str(v) for k, v in (provider_ids or {}).items() if v is not None and str(v).strip()}
+    return _compute_fingerprint({"name": name or "", "provider_ids": sanitized_ids})
+def _compute_cast_fingerprint(item_type: str, cast_for_emby_handler: List[Dict[str, Any]], rating: Optional[float], lock_cast: bool) -> str:
+    """媒体项写回的指纹：最终演员表(顺序敏感) + 评分 + 锁定策略。"""
+    cast_payload = [
+        [
+            actor.get("name") or "",
+            actor.get("character") or "",
+            actor.get("emby_person_id") or "",
+            {k: str(v) for k, v in (actor.get("provider_ids") or {}).items() if v is not None and str(v).strip()}
+        ]
+        for actor in cast_for_emby_handler
+    ]
+    return _compute_fingerprint({"type": item_type, "cast": cast_payload, "rating": rating, "lock": lock_cast})
+def _emby_cast_matches(emby_people: List[Dict[str, Any]], cast_for_emby_handler: List[Dict[str, Any]]) -> bool:
+    """Emby 当前的演员表(名字+角色，顺序敏感)是否与将要写回的一致，用来发现 Emby 刷新或手动修改造成的偏差。"""
+    current = [
+        (str(person.get("Name") or "").strip(), str(person.get("Role") or "").strip())
+        for person in (emby_people or []) if person.get("Type") in ("Actor", "GuestStar")
+    ]
+    expected = [
+        (str(actor.get("name")).strip(), str(actor.get("character") or "").strip())
+        for actor in cast_for_emby_handler if actor.get("name") and str(actor.get("name")).strip()
+    ]
+    return current == expected
+# --- 已处理媒体的紧凑成员集合 ---
+PROCESSED_SET_REFRESH_OVERLAP_SECONDS = 600  # 增量刷新时回看的时间窗口，兜住“事务开始早、提交晚”的写入
+class _ProcessedItemSet:
+    """
+    已处理媒体ID的紧凑集合，只回答“是否已处理”这一热点问题，条目名称等详情按需查库。
+    纯数字ID(Emby 常规ID)存放在有序 array('q') 中二分查找，每个只占 8 字节；
+    其余ID和新增/删除的增量放在小集合里，积累到阈值再合并回有序数组。
+    """
+    _COMPACT_THRESHOLD = 4096
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sorted_ids = array('q')
+        self._added: Set[str] = set()
+        self._removed: Set[str] = set()
+        self._pending_numeric = 0
+        self._watermark: Optional[datetime] = None
+
+    @staticmethod
+    def _as_int(item_id: str) -> Optional[int]:
+        # 只接受规范的十进制写法，保证 str(int(x)) == x，集合内外的ID可以无损往返
+        if item_id and item_id.isdigit() and (item_id == "0" or item_id[0] != "0") and len(item_id) < 19:
+            return int(item_id)
+        return None
+
+    def _in_sorted(self, item_id: str) -> bool:
+        numeric = self._as_int(item_id)
+        if numeric is None:
+            return False
+        pos = bisect.bisect_left(self._sorted_ids, numeric)
+        return pos < len(self._sorted_ids) and self._sorted_ids[pos] == numeric
+
+    def _compact(self):
+        numeric_ids = {n for n in self._sorted_ids}
+        for item_id in self._removed:
+            numeric = self._as_int(item_id)
+            if numeric is not None:
+                numeric_ids.discard(numeric)
+        remaining_added = set()
+        for item_id in self._added:
+            numeric = self._as_int(item_id)
+            if numeric is None:
+                remaining_added.add(item_id)
+            else:
+                numeric_ids.add(numeric)
+        self._sorted_ids = array('q', sorted(numeric_ids))
+        self._added = remaining_added
+        self._removed = set()
+        self._pending_numeric = 0
+
+    def _maybe_compact(self):
+        if self._pending_numeric > self._COMPACT_THRESHOLD:
+            self._compact()
+
+    def __contains__(self, item_id: str) -> bool:
+        with self._lock:
+            if item_id in self._added:
+                return True
+            if item_id in self._removed:
+                return False
+            return self._in_sorted(item_id)
+
+    def __len__(self) -> int:
+        with self._lock:
+            removed_hits = sum(1 for i in self._removed if self._in_sorted(i))
+            return len(self._sorted_ids) - removed_hits + len(self._added)
+
+    def add(self, item_id: str):
+        with self._lock:
+            self._removed.discard(item_id)
+            if not self._in_sorted(item_id) and item_id not in self._added:
+                self._added.add(item_id)
+                if self._as_int(item_id) is not None:
+                    self._pending_numeric += 1
+                    self._maybe_compact()
+
+    def discard(self, item_id: str):
+        with self._lock:
+            self._added.discard(item_id)
+            if self._in_sorted(item_id) and item_id not in self._removed:
+                self._removed.add(item_id)
+                self._pending_numeric += 1
+                self._maybe_compact()
+
+    def clear(self):
+        with self._lock:
+            self._sorted_ids = array('q')
+            self._added = set()
+            self._removed = set()
+            self._pending_numeric = 0
+            # 水位线保留：清空后只需关心之后新写入的记录
+
+    def load(self, conn):
+        """全量装载：只取 item_id，用服务端游标分批读取，不把名称等详情读进内存。"""
+        cursor = conn.cursor()
+        # 先取水位线再取ID，两条语句之间新写入的记录最多在下次增量刷新时被重复确认一次
+        cursor.execute("SELECT MAX(processed_at) AS watermark FROM processed_log")
+        watermark = cursor.fetchone()['watermark']
+        numeric_ids = array('q')
+        other_ids = set()
+        with conn.cursor(name="processed_item_ids") as stream:
+            stream.itersize = 10000
+            stream.execute("SELECT item_id FROM processed_log WHERE item_name IS NOT NULL AND item_name <> ''")
+            for row in stream:
+                item_id = row['item_id']
+                numeric = self._as_int(item_id)
+                if numeric is None:
+                    other_ids.add(item_id)
+                else:
+                    numeric_ids.append(numeric)
+        with self._lock:
+            self._sorted_ids = array('q', sorted(numeric_ids))
+            self._added = other_ids
+            self._removed = set()
+            self._pending_numeric = 0
+            self._watermark = watermark
+
+    def refresh(self, conn) -> int:
+        """
+        增量刷新：只拉取水位线之后(含回看窗口)写入的记录，返回本次新发现的条目数。
+        增量刷新发现不了其他入口删除的记录、也发现不了导入的旧时间戳记录，
+        所以刷新后再比对一次总行数，对不上就全量重新装载。
+        """
+        cursor = conn.cursor()
+        count_sql = "SELECT COUNT(*) AS total FROM processed_log WHERE item_name IS NOT NULL AND item_name <> ''"
+        with self._lock:
+            watermark = self._watermark
+        sql = "SELECT item_id, processed_at FROM processed_log WHERE item_name IS NOT NULL AND item_name <> ''"
+        if watermark is None:
+            # 装载时表为空、没有水位线，此时直接拉取全部即可(数据量必然很小)
+            cursor.execute(sql)
+        else:
+            cursor.execute(
+                sql + " AND processed_at > %s - make_interval(secs => %s)",
+                (watermark, PROCESSED_SET_REFRESH_OVERLAP_SECONDS)
+            )
+        new_count = 0
+        for row in cursor.fetchall():
+            if row['item_id'] not in self:
+                new_count += 1
+            self.add(row['item_id'])
+            processed_at = row['processed_at']
+            with self._lock:
+                if processed_at is not None and (self._watermark is None or processed_at > self._watermark):
+                    self._watermark = processed_at
+        cursor.execute(count_sql)
+        total_in_db = cursor.fetchone()['total']
+        if total_in_db != len(self):
+            logger.debug(f"已处理记录数与数据库不一致 (内存 {len(self)} / 数据库 {total_in_db})，将全量重新装载。")
+            self.load(conn)
+        return new_count
+_PROCESSED_ITEM_SET: Optional[_ProcessedItemSet] = None
+_PROCESSED_ITEM_SET_LOCK = threading.Lock()
 class MediaProcessor:
     def __init__(self, config: Dict[str, Any]):
         # ★★★ 然后，从这个 config 字典里，解析出所有需要的属性 ★★★
@@ -376,28 +657,78 @@ class MediaProcessor:
     def is_stop_requested(self) -> bool:
         return self._stop_event.is_set()
 
-    def _load_processed_log_from_db(self) -> Dict[str, str]:
-        log_dict = {}
+    def _load_processed_log_from_db(self) -> _ProcessedItemSet:
+        """
+        获取已处理集合。集合在进程内共享：首次全量装载，之后处理器重新初始化(如保存配置)时只做增量刷新。
+        """
+        global _PROCESSED_ITEM_SET
+        with _PROCESSED_ITEM_SET_LOCK:
+            processed_set = _PROCESSED_ITEM_SET
+            try:
+                with get_central_db_connection() as conn:
+                    if processed_set is None:
+                        processed_set = _ProcessedItemSet()
+                        processed_set.load(conn)
+                        _PROCESSED_ITEM_SET = processed_set
+                        logger.debug(f"已从数据库装载 {len(processed_set)} 条已处理记录。")
+                    else:
+                        new_count = processed_set.refresh(conn)
+                        logger.debug(f"已处理记录增量刷新完成，新增 {new_count} 条。")
+            except Exception as e:
+                logger.error(f"从数据库读取已处理记录失败: {e}", exc_info=True)
+                if processed_set is None:
+                    # 不缓存失败的结果，下次初始化时会重新尝试全量装载
+                    processed_set = _ProcessedItemSet()
+        return processed_set
+
+    def _refresh_processed_items_cache(self):
+        """把其他入口(手动标记、批量移入已处理、删除等)造成的变化合并进内存集合。"""
         try:
-            # 1. ★★★ 使用 with 语句和中央函数 ★★★
             with get_central_db_connection() as conn:
-                cursor = conn.cursor()
-                
-                # 2. 执行查询
-                cursor.execute("SELECT item_id, item_name FROM processed_log")
-                rows = cursor.fetchall()
-                
-                # 3. 处理结果
-                for row in rows:
-                    if row['item_id'] and row['item_name']:
-                        log_dict[row['item_id']] = row['item_name']
-            
-            # 4. with 语句会自动处理所有事情，代码干净利落！
+                self.processed_items_cache.refresh(conn)
+        except Exception as e:
+            logger.warning(f"增量刷新已处理记录失败，将沿用内存中的集合: {e}")
+
+    def reload_processed_items_cache(self):
+        """整表被替换(如数据库恢复)后，全量重新装载已处理集合。"""
+        try:
+            with get_central_db_connection() as conn:
+                self.processed_items_cache.load(conn)
+            logger.debug(f"已全量重新装载 {len(self.processed_items_cache)} 条已处理记录。")
+        except Exception as e:
+            logger.error(f"全量重新装载已处理记录失败: {e}", exc_info=True)
 
+    def _confirm_processed_ids(self, item_ids: List[str]) -> Set[str]:
+        """一次查询确认这些ID在数据库中确实是已处理记录，纠正内存集合里已被删除的条目。查询失败时信任内存集合。"""
+        if not item_ids:
+            return set()
+        try:
+            with get_central_db_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "SELECT item_id FROM processed_log WHERE item_id = ANY(%s) AND item_name IS NOT NULL AND item_name <> ''",
+                    (list(item_ids),)
+                )
+                confirmed = {row['item_id'] for row in cursor.fetchall()}
+        except Exception as e:
+            logger.warning(f"批量确认已处理记录失败，将沿用内存中的集合: {e}")
+            return set(item_ids)
+        for stale_id in set(item_ids) - confirmed:
+            self.processed_items_cache.discard(stale_id)
+        return confirmed
+
+    def _get_processed_item_name(self, item_id: str) -> Optional[str]:
+        """按需查询已处理记录的名称；记录已不存在时返回 None。"""
+        try:
+            with get_central_db_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT item_name FROM processed_log WHERE item_id = %s", (item_id,))
+                row = cursor.fetchone()
+                return row['item_name'] if row and row['item_name'] else None
         except Exception as e:
-            # 5. ★★★ 记录更详细的异常信息 ★★★
-            logger.error(f"从数据库读取已处理记录失败: {e}", exc_info=True)
-        return log_dict
+            logger.warning(f"查询已处理记录失败 (Item ID: {item_id}): {e}")
+            # 查询失败时信任内存集合，按已处理对待
+            return f"ID:{item_id}"
 
     # ✨ 从 SyncHandler 迁移并改造，用于在本地缓存中查找豆瓣JSON文件
     def _find_local_douban_json(self, imdb_id: Optional[str], douban_id: Optional[str], douban_cache_dir: str) -> Optional[str]:
@@ -626,16 +957,21 @@ class MediaProcessor:
     # --- 核心处理总管 ---
     def process_single_item(self, emby_item_id: str,
                             force_reprocess_this_item: bool = False,
-                            force_fetch_from_tmdb: bool = False):
+                            force_fetch_from_tmdb: bool = False,
+                            force_write_back: bool = False):
         """
         【V-API-Ready 最终版 - 带跳过功能】
         这个函数是API模式的入口，它会先检查是否需要跳过已处理的项目。
+        force_write_back=True 时无视写回指纹，总是把演员表写回 Emby 并刷新。
         """
         # 1. 除非强制，否则跳过已处理的
         if not force_reprocess_this_item and emby_item_id in self.processed_items_cache:
-            item_name_from_cache = self.processed_items_cache.get(emby_item_id, f"ID:{emby_item_id}")
-            logger.info(f"媒体 '{item_name_from_cache}' 跳过已处理记录。")
-            return True
+            # 内存集合只负责快速判断，命中后再回库确认并取名称，顺带纠正被其他入口删除的记录
+            item_name_from_db = self._get_processed_item_name(emby_item_id)
+            if item_name_from_db:
+                logger.info(f"媒体 '{item_name_from_db}' 跳过已处理记录。")
+                return True
+            self.processed_items_cache.discard(emby_item_id)
 
         # 2. 检查停止信号
         if self.is_stop_requested():
@@ -651,13 +987,14 @@ class MediaProcessor:
         return self._process_item_core_logic_api_version(
             item_details_from_emby=item_details,
             force_reprocess_this_item=force_reprocess_this_item,
-            force_fetch_from_tmdb=force_fetch_from_tmdb
+            force_fetch_from_tmdb=force_fetch_from_tmdb,
+            force_write_back=force_write_back
         )
 
         # --- 核心处理流程 ---
     
     # ---核心处理流程 ---
-    def _process_item_core_logic_api_version(self, item_details_from_emby: Dict[str, Any], force_reprocess_this_item: bool, force_fetch_from_tmdb: bool = False):
+    def _process_item_core_logic_api_version(self, item_details_from_emby: Dict[str, Any], force_reprocess_this_item: bool, force_fetch_from_tmdb: bool = False, force_write_back: bool = False):
         """
         【V-Final Clarity - 清晰最终版】
         确保数据流清晰、单向，并从根源上解决所有已知问题。
@@ -748,9 +1085,31 @@ class MediaProcessor:
                 # ======================================================================
                 # 阶段 4: 数据写回 (Data Write-back)
                 # ======================================================================
+                # --- 步骤 4.0: 计算写回指纹，内容与上次写回完全一致时跳过所有 Emby 写操作 ---
+                auto_lock_enabled = self.config.get(constants.CONFIG_OPTION_AUTO_LOCK_CAST, True)
+                cast_for_emby_handler = []
+                for actor in final_processed_cast:
+                    cast_for_emby_handler.append({
+                        "name": actor.get("name"),
+                        "character": actor.get("character"),
+                        "emby_person_id": actor.get("emby_person_id"),
+                        "provider_ids": actor.get("provider_ids") 
+                    })
+                cast_fingerprint = _compute_cast_fingerprint(item_type, cast_for_emby_handler, douban_rating, auto_lock_enabled)
+                previous_cast_fingerprint = None if force_write_back else self.log_db_manager.get_cast_fingerprint(cursor, item_id)
+                cast_unchanged = previous_cast_fingerprint == cast_fingerprint
+                # 指纹只记录了上次写回的内容，Emby 端的演员表被刷新或手动改动过时仍需重新写回
+                if cast_unchanged and not _emby_cast_matches(current_emby_cast_raw, cast_for_emby_handler):
+                    logger.info("  -> Emby 当前演员表与上次写回的不一致（可能被 Emby 刷新或手动修改），将重新写回。")
+                    cast_unchanged = False
+
                 # --- 步骤 4.1: 前置更新 - 直接更新演员(Person)自身的外部ID和名字 ---
                 logger.info("  -> 写回步骤 1/2: 检查并更新演员的元数据...")
                 
+                emby_pids_in_cast = [str(a.get("emby_person_id")) for a in final_processed_cast if a.get("emby_person_id")]
+                previous_person_fingerprints = {} if force_write_back else self.actor_db_manager.get_person_fingerprints(cursor, emby_pids_in_cast)
+                persons_skipped = 0
+
                 # ★★★ 核心修正：不再依赖于电影的原始演员列表进行比较 ★★★
                 for actor in final_processed_cast:
                     if self.is_stop_requested():
@@ -768,39 +1127,44 @@ class MediaProcessor:
                         "Name": actor.get("name"),
                         "ProviderIds": actor.get("provider_ids", {})
                     }
+
+                    # 与上次写回的内容完全一致，跳过这次无意义的 GET+POST
+                    person_fingerprint = _compute_person_fingerprint(data_to_update["Name"], data_to_update["ProviderIds"])
+                    if previous_person_fingerprints.get(str(emby_pid)) == person_fingerprint:
+                        persons_skipped += 1
+                        continue
                     
                     # 只要这个演员存在于Emby，就调用更新，确保其数据与我们的最终结果一致
                     # 这种做法更健壮，能修复各种不一致的情况
                     logger.trace(f"  -> 准备为演员 '{actor.get('name')}' (ID: {emby_pid}) 同步元数据...")
-                    emby_handler.update_person_details(
+                    person_updated = emby_handler.update_person_details(
                         person_id=emby_pid,
                         new_data=data_to_update,
                         emby_server_url=self.emby_url,
                         emby_api_key=self.emby_api_key,
                         user_id=self.emby_user_id
                     )
+                    if person_updated:
+                        self.actor_db_manager.save_person_fingerprint(cursor, str(emby_pid), person_fingerprint)
 
+                if persons_skipped:
+                    logger.info(f"  -> {persons_skipped} 位演员的元数据与上次写回一致，已跳过。")
                 logger.info("  -> 演员元数据更新完成。")
 
                 # --- 步骤 4.2:  更新媒体项目自身的演员列表 ---
-                logger.info("  -> 写回步骤 2/2: 准备将最终演员列表更新到媒体项目...")
-                cast_for_emby_handler = []
-                for actor in final_processed_cast:
-                    cast_for_emby_handler.append({
-                        "name": actor.get("name"),
-                        "character": actor.get("character"),
-                        "emby_person_id": actor.get("emby_person_id"),
-                        "provider_ids": actor.get("provider_ids") 
-                    })
-
-                update_success = emby_handler.update_emby_item_cast(
-                    item_id=item_id,
-                    new_cast_list_for_handler=cast_for_emby_handler,
-                    emby_server_url=self.emby_url,
-                    emby_api_key=self.emby_api_key,
-                    user_id=self.emby_user_id,
-                    new_rating=douban_rating
-                )
+                if cast_unchanged:
+                    logger.info("  -> 写回步骤 2/2: 最终演员表与上次写回一致，跳过媒体项目、分集的写回及刷新。")
+                    update_success = False
+                else:
+                    logger.info("  -> 写回步骤 2/2: 准备将最终演员列表更新到媒体项目...")
+                    update_success = emby_handler.update_emby_item_cast(
+                        item_id=item_id,
+                        new_cast_list_for_handler=cast_for_emby_handler,
+                        emby_server_url=self.emby_url,
+                        emby_api_key=self.emby_api_key,
+                        user_id=self.emby_user_id,
+                        new_rating=douban_rating
+                    )
 
                 # +++ 对分集的处理 +++
                 if item_type == "Series" and update_success:
@@ -818,8 +1182,9 @@ class MediaProcessor:
                 auto_refresh_enabled = self.config.get(constants.CONFIG_OPTION_REFRESH_AFTER_UPDATE, True)
 
                 # ★★★ 2. 使用 if 语句包裹整个“刷新”逻辑 ★★★
-                if auto_refresh_enabled:
-                    auto_lock_enabled = self.config.get(constants.CONFIG_OPTION_AUTO_LOCK_CAST, True)
+                if cast_unchanged:
+                    logger.debug("  -> 演员表未变化，无需通知 Emby 刷新。")
+                elif auto_refresh_enabled:
                     fields_to_lock_on_refresh = ["Cast"] if auto_lock_enabled else None
                     
                     if auto_lock_enabled:
@@ -869,12 +1234,15 @@ class MediaProcessor:
                 if processing_score < min_score_for_review:
                     reason = f"处理评分 ({processing_score:.2f}) 低于阈值 ({min_score_for_review})。"
                     self.log_db_manager.remove_from_processed_log(cursor, item_id)
+                    self.processed_items_cache.discard(item_id)
                     self.log_db_manager.save_to_failed_log(cursor, item_id, item_name_for_log, reason, item_type, score=processing_score)
                     logger.info(f"  -> 评分低于阈值,已将 '{item_name_for_log}' 记录到待复核，请手动处理。")
                 else:
                     self.log_db_manager.save_to_processed_log(cursor, item_id, item_name_for_log, score=processing_score)
                     self.log_db_manager.remove_from_failed_log(cursor, item_id)
-                    self.processed_items_cache[item_id] = item_name_for_log
+                    if update_success:
+                        self.log_db_manager.save_cast_fingerprint(cursor, item_id, cast_fingerprint)
+                    self.processed_items_cache.add(item_id)
                     logger.info(f"  -> 已将 '{item_name_for_log}' 添加到已处理，下次将跳过。")
 
                 conn.commit()
@@ -1309,13 +1677,85 @@ class MediaProcessor:
 
     def process_full_library(self, update_status_callback: Optional[callable] = None, force_reprocess_all: bool = False, force_fetch_from_tmdb: bool = False):
         """
-        【V3 - 最终完整版】
+        【V4 - 断点续跑版】
         这是所有全量处理的唯一入口，它自己处理所有与“强制”相关的逻辑。
+        每次运行的参数、有序工作列表和游标都会写入 task_checkpoints；
+        被中止或进程重启后，参数相同的下一次运行直接从游标处继续，不再重新枚举媒体库。
         """
         self.clear_stop_signal()
         
         logger.info(f"进入核心执行层: process_full_library, 接收到的 force_reprocess_all = {force_reprocess_all}, force_fetch_from_tmdb = {force_fetch_from_tmdb}")
 
+        libs_to_process_ids = self.config.get("libraries_to_process", [])
+        if not libs_to_process_ids:
+            logger.warning("未在配置中指定要处理的媒体库。")
+            return
+
+        run_params = {
+            "force_reprocess_all": bool(force_reprocess_all),
+            "force_fetch_from_tmdb": bool(force_fetch_from_tmdb),
+            "libraries": sorted(libs_to_process_ids)
+        }
+        checkpoint = db_handler.get_task_checkpoint(FULL_LIBRARY_CHECKPOINT_KEY, max_age_hours=TASK_CHECKPOINT_MAX_AGE_HOURS)
+        if checkpoint and checkpoint.get("params_json") == run_params and checkpoint.get("work_list_json") is not None:
+            work_list = checkpoint["work_list_json"]
+            start_index = checkpoint.get("cursor_index") or 0
+            logger.info(f"发现未完成的全量处理断点，将从第 {start_index + 1}/{len(work_list)} 项继续，跳过媒体库枚举。")
+        else:
+            work_list = self._prepare_full_library_work_list(update_status_callback, force_reprocess_all, libs_to_process_ids)
+            if work_list is None:
+                return
+            start_index = 0
+            db_handler.save_task_checkpoint(FULL_LIBRARY_CHECKPOINT_KEY, run_params, work_list)
+
+        total = len(work_list)
+        if total == 0:
+            logger.info("没有需要处理的项目。")
+            db_handler.delete_task_checkpoint(FULL_LIBRARY_CHECKPOINT_KEY)
+            if update_status_callback: update_status_callback(100, "未找到可处理的项目。")
+            return
+
+        if update_status_callback: update_status_callback(30, "开始处理现有媒体...")
+
+        # --- 现有媒体项处理循环 ---
+        progress_after_cleanup = 30
+        for i in range(start_index, total):
+            if self.is_stop_requested(): break
+            
+            item_id = work_list[i].get('Id')
+            item_name = work_list[i].get('Name', f"ID:{item_id}")
+
+            if update_status_callback:
+                current_progress = progress_after_cleanup + int(((i + 1) / total) * (100 - progress_after_cleanup))
+                update_status_callback(current_progress, f"处理中 ({i+1}/{total}): {item_name}")
+            
+            succeeded = self.process_single_item(
+                item_id, 
+                force_reprocess_this_item=force_reprocess_all,
+                force_fetch_from_tmdb=force_fetch_from_tmdb,
+                force_write_back=force_reprocess_all
+            )
+
+            # 因中止而未完成的项目不推进游标，续跑时会重新处理它
+            if not succeeded and self.is_stop_requested():
+                break
+            db_handler.update_task_checkpoint_progress(FULL_LIBRARY_CHECKPOINT_KEY, i + 1)
+            
+            time_module.sleep(float(self.config.get("delay_between_items_sec", 0.5)))
+        
+        if not self.is_stop_requested():
+            db_handler.delete_task_checkpoint(FULL_LIBRARY_CHECKPOINT_KEY)
+            if update_status_callback:
+                update_status_callback(100, "全量处理完成")
+        else:
+            logger.info("全量处理已中止，断点已保存，下次以相同参数运行时将从中断处继续。")
+
+    def _prepare_full_library_work_list(self, update_status_callback: Optional[callable], force_reprocess_all: bool, libs_to_process_ids: List[str]) -> Optional[List[Dict[str, Any]]]:
+        """
+        为一次新的全量处理准备有序工作列表 [{'Id', 'Name'}]：
+        枚举媒体库、清理已删除项目，并在非强制模式下提前剔除已处理的项目。
+        失败时返回 None。
+        """
         if force_reprocess_all:
             logger.info("检测到“强制重处理”选项，正在清空已处理日志...")
             try:
@@ -1323,13 +1763,7 @@ class MediaProcessor:
             except Exception as e:
                 logger.error(f"在 process_full_library 中清空日志失败: {e}", exc_info=True)
                 if update_status_callback: update_status_callback(-1, "清空日志失败")
-                return
-
-        # --- ★★★ 补全了这部分代码 ★★★ ---
-        libs_to_process_ids = self.config.get("libraries_to_process", [])
-        if not libs_to_process_ids:
-            logger.warning("未在配置中指定要处理的媒体库。")
-            return
+                return None
 
         logger.info("正在尝试从Emby获取媒体项目...")
         all_emby_libraries = emby_handler.get_emby_libraries(self.emby_url, self.emby_api_key, self.emby_user_id) or []
@@ -1347,20 +1781,16 @@ class MediaProcessor:
             logger.info(f"从媒体库【{', '.join(source_series_lib_names)}】获取到 {len(series)} 个电视剧项目。")
 
         all_items = movies + series
-        total = len(all_items)
-        # --- ★★★ 补全结束 ★★★ ---
-        
-        if total == 0:
+        if not all_items:
             logger.info("在所有选定的库中未找到任何可处理的项目。")
-            if update_status_callback: update_status_callback(100, "未找到可处理的项目。")
-            return
+            return []
 
         # --- 新增：清理已删除的媒体项 ---
         if update_status_callback: update_status_callback(20, "正在检查并清理已删除的媒体项...")
         
         with get_central_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT item_id, item_name FROM processed_log")
+            cursor.execute("SELECT item_id FROM processed_log")
             processed_log_entries = cursor.fetchall()
             
             processed_ids_in_db = {entry['item_id'] for entry in processed_log_entries}
@@ -1374,47 +1804,36 @@ class MediaProcessor:
                 for deleted_item_id in deleted_items_to_clean:
                     self.log_db_manager.remove_from_processed_log(cursor, deleted_item_id)
                     # 同时从内存缓存中移除
-                    if deleted_item_id in self.processed_items_cache:
-                        del self.processed_items_cache[deleted_item_id]
+                    self.processed_items_cache.discard(deleted_item_id)
                     logger.debug(f"  -> 已从 '已处理' 中移除 ItemID: {deleted_item_id}")
                 conn.commit()
                 logger.info("已删除媒体项的清理工作完成。")
             else:
                 logger.info("未发现需要从 '已处理' 中清理的已删除媒体项。")
-        
-        if update_status_callback: update_status_callback(30, "已删除媒体项清理完成，开始处理现有媒体...")
 
-        # --- 现有媒体项处理循环 ---
-        for i, item in enumerate(all_items):
-            if self.is_stop_requested(): break
-            
-            item_id = item.get('Id')
-            item_name = item.get('Name', f"ID:{item_id}")
-
-            if not force_reprocess_all and item_id in self.processed_items_cache:
-                logger.info(f"正在跳过已处理的项目: {item_name}")
-                if update_status_callback:
-                    # 调整进度条的起始点，使其在清理后从 30% 开始
-                    progress_after_cleanup = 30
-                    current_progress = progress_after_cleanup + int(((i + 1) / total) * (100 - progress_after_cleanup))
-                    update_status_callback(current_progress, f"跳过: {item_name}")
-                continue
+        # 合并其他入口在上次刷新后写入的已处理记录，避免重复处理
+        self._refresh_processed_items_cache()
 
-            if update_status_callback:
-                progress_after_cleanup = 30
-                current_progress = progress_after_cleanup + int(((i + 1) / total) * (100 - progress_after_cleanup))
-                update_status_callback(current_progress, f"处理中 ({i+1}/{total}): {item_name}")
-            
-            self.process_single_item(
-                item_id, 
-                force_reprocess_this_item=force_reprocess_all,
-                force_fetch_from_tmdb=force_fetch_from_tmdb
+        # 内存集合命中的ID再批量回库确认一次，防止因记录已被删除而误跳过
+        confirmed_processed = set()
+        if not force_reprocess_all:
+            confirmed_processed = self._confirm_processed_ids(
+                [item.get('Id') for item in all_items if item.get('Id') and item.get('Id') in self.processed_items_cache]
             )
-            
-            time_module.sleep(float(self.config.get("delay_between_items_sec", 0.5)))
-        
-        if not self.is_stop_requested() and update_status_callback:
-            update_status_callback(100, "全量处理完成")
+
+        work_list = []
+        skipped_count = 0
+        for item in all_items:
+            item_id = item.get('Id')
+            if not item_id:
+                continue
+            if item_id in confirmed_processed:
+                skipped_count += 1
+                continue
+            work_list.append({"Id": item_id, "Name": item.get('Name', f"ID:{item_id}")})
+        if skipped_count:
+            logger.info(f"跳过 {skipped_count} 个已处理的项目，本次共需处理 {len(work_list)} 个项目。")
+        return work_list
     # --- 一键翻译 ---
     def translate_cast_list_for_editing(self, 
                                     cast_list: List[Dict[str, Any]], 
@@ -1630,6 +2049,7 @@ class MediaProcessor:
             # 2.1: 前置更新演员名
             logger.info("  -> 手动处理：步骤 1/2: 检查并更新演员名字...")
             original_names_map = {p.get("Id"): p.get("Name") for p in item_details.get("People", []) if p.get("Id")}
+            renamed_person_ids = []
             for actor in cast_for_emby_handler:
                 actor_id = actor.get("emby_person_id")
                 new_name = actor.get("name")
@@ -1640,6 +2060,7 @@ class MediaProcessor:
                         person_id=actor_id, new_data={"Name": new_name},
                         emby_server_url=self.emby_url, emby_api_key=self.emby_api_key, user_id=self.emby_user_id
                     )
+                    renamed_person_ids.append(str(actor_id))
             logger.info("  -> 手动处理：演员名字前置更新完成。")
 
             # 2.2: 更新媒体主项目的演员列表
@@ -1683,6 +2104,12 @@ class MediaProcessor:
                 cursor = conn.cursor()
                 self.log_db_manager.save_to_processed_log(cursor, item_id, item_name, score=10.0)
                 self.log_db_manager.remove_from_failed_log(cursor, item_id)
+                # 手动写回后 Emby 中的内容已变，同步更新写回指纹，避免后续自动处理误判为“未变化”
+                self.log_db_manager.save_cast_fingerprint(
+                    cursor, item_id, _compute_cast_fingerprint(item_type, cast_for_emby_handler, None, self.auto_lock_cast_enabled)
+                )
+                for renamed_pid in renamed_person_ids:
+                    self.actor_db_manager.save_person_fingerprint(cursor, renamed_pid, None)
 
             logger.info(f"  -> 手动处理 '{item_name}' 流程完成。")
             return True
@@ -1793,10 +2220,11 @@ class MediaProcessor:
     # ★★★ 全量备份到覆盖缓存 ★★★
     def sync_all_media_assets(self, update_status_callback: Optional[callable] = None, force_full_update: bool = False):
         """
-        【V4 - 增量与全量融合版】
+        【V5 - 断点续跑版】
         - 快速模式 (默认): 高效找出并并发处理 Emby 中的新增媒体项。
         - 深度模式 (force_full_update=True): 强制并发处理 Emby 中的所有媒体项。
         - 两种模式均采用并发处理，大幅提升执行效率。
+        - 工作列表和完成进度写入 task_checkpoints，中断后以相同参数再次运行会直接续跑。
         """
         sync_mode = "(全量)" if force_full_update else "(增量)"
         task_name = f"覆盖缓存备份 ({sync_mode})"
@@ -1807,69 +2235,53 @@ class MediaProcessor:
             if update_status_callback: update_status_callback(-1, "未配置本地数据源路径")
             return
 
+        stats = {"success": 0, "skipped": 0, "failed": 0}
         try:
-            # --- 步骤 1: 获取 Emby 媒体库中的所有项目 ---
-            if update_status_callback: update_status_callback(5, "正在获取 Emby 媒体库项目...")
-            
-            all_emby_items = emby_handler.get_emby_library_items(
-                base_url=self.emby_url,
-                api_key=self.emby_api_key,
-                user_id=self.emby_user_id,
-                library_ids=self.config.get('libraries_to_process', []),
-                fields="ProviderIds,Type,DateModified,Name"
-            )
-            if all_emby_items is None:
-                raise RuntimeError("从 Emby 获取媒体项列表失败。")
-
-            emby_item_map = {item['Id']: item for item in all_emby_items}
-            all_emby_ids = set(emby_item_map.keys())
-
-            # --- 步骤 2: 根据模式确定需要处理的项目列表 ---
-            items_to_process_ids: Set[str]
-            
-            if force_full_update:
-                # 深度模式：处理所有 Emby 项目
-                logger.info(f"  -> 全量模式已激活，将处理所有 {len(all_emby_ids)} 个 Emby 项目。")
-                items_to_process_ids = all_emby_ids
+            run_params = {
+                "force_full_update": bool(force_full_update),
+                "libraries": sorted(self.config.get('libraries_to_process', [])),
+                "local_data_path": self.local_data_path
+            }
+            checkpoint = db_handler.get_task_checkpoint(MEDIA_ASSETS_CHECKPOINT_KEY, max_age_hours=TASK_CHECKPOINT_MAX_AGE_HOURS)
+            if checkpoint and checkpoint.get("params_json") == run_params and checkpoint.get("work_list_json") is not None:
+                work_list = checkpoint["work_list_json"]
+                start_index = checkpoint.get("cursor_index") or 0
+                completed_ahead = set(checkpoint.get("completed_ahead_json") or [])
+                logger.info(f"  -> 发现未完成的断点，将从第 {start_index + 1}/{len(work_list)} 项继续，跳过媒体库枚举。")
             else:
-                # 快速模式：计算差集，只处理新项目
-                if update_status_callback: update_status_callback(15, "正在获取本地已处理日志...")
-                with get_central_db_connection() as conn:
-                    cursor = conn.cursor()
-                    cursor.execute("SELECT item_id FROM processed_log")
-                    processed_ids = {row['item_id'] for row in cursor.fetchall()}
-                
-                items_to_process_ids = all_emby_ids - processed_ids
-                logger.info(f"  -> 增量模式：从 {len(all_emby_ids)} 个 Emby 项目中发现 {len(items_to_process_ids)} 个新项目。")
+                work_list = self._prepare_media_assets_work_list(update_status_callback, force_full_update)
+                start_index, completed_ahead = 0, set()
+                db_handler.save_task_checkpoint(MEDIA_ASSETS_CHECKPOINT_KEY, run_params, work_list)
 
-            total_to_process = len(items_to_process_ids)
+            total_to_process = len(work_list)
             if total_to_process == 0:
                 message = "  -> 全量模式检查完成，媒体库为空。" if force_full_update else "  -> 增量模式检查完成，没有发现新项目。"
                 logger.info(message)
+                db_handler.delete_task_checkpoint(MEDIA_ASSETS_CHECKPOINT_KEY)
                 if update_status_callback: update_status_callback(100, message)
                 return
 
-            if update_status_callback: update_status_callback(30, f"准备处理 {total_to_process} 个项目...")
+            indices_to_process = [i for i in range(start_index, total_to_process) if i not in completed_ahead]
+            if update_status_callback: update_status_callback(30, f"准备处理 {len(indices_to_process)} 个项目...")
 
             # --- 步骤 3: 并发处理目标项目 (无论来源是全量还是增量) ---
-            stats = {"success": 0, "skipped": 0, "failed": 0}
             lock = threading.Lock()
+            progress_state = {"cursor": start_index, "done_ahead": set(completed_ahead), "unflushed": 0}
 
-            def worker_process_item(item_id: str):
+            def worker_process_item(item_details: Dict[str, Any]):
                 """线程工作单元：处理单个项目"""
                 if self.is_stop_requested():
                     return "stopped"
+                item_id = item_details.get("Id")
                 try:
-                    item_details = emby_item_map.get(item_id)
-                    if not item_details:
-                        raise ValueError("无法在 Emby 映射中找到项目详情")
-
                     tmdb_id = item_details.get("ProviderIds", {}).get("Tmdb")
                     if not tmdb_id:
                         logger.warning(f"项目 '{item_details.get('Name')}' (ID: {item_id}) 缺少 TMDb ID，跳过。")
                         return "skipped"
 
-                    self.sync_item_images(item_details)
+                    images_ok = self.sync_item_images(item_details)
+                    if not images_ok and self.is_stop_requested():
+                        return "stopped"
                     self.sync_item_metadata(item_details, tmdb_id)
 
                     with get_central_db_connection() as conn_thread:
@@ -1884,16 +2296,32 @@ class MediaProcessor:
                     logger.error(f"处理项目 (ID: {item_id}) 时发生错误: {e}", exc_info=True)
                     return "failed"
 
+            def mark_done(index: int):
+                """记录完成的下标，并把游标推进到连续完成的最远位置。只改内存状态，调用方需持有 lock。"""
+                progress_state["done_ahead"].add(index)
+                while progress_state["cursor"] in progress_state["done_ahead"]:
+                    progress_state["done_ahead"].discard(progress_state["cursor"])
+                    progress_state["cursor"] += 1
+                progress_state["unflushed"] += 1
+
+            def flush_checkpoint(force: bool = False):
+                """在锁内取游标快照，锁外写库，避免数据库往返阻塞其他结果的登记。"""
+                with lock:
+                    if not progress_state["unflushed"] or (not force and progress_state["unflushed"] < CHECKPOINT_FLUSH_INTERVAL):
+                        return
+                    cursor_snapshot = progress_state["cursor"]
+                    done_ahead_snapshot = list(progress_state["done_ahead"])
+                    progress_state["unflushed"] = 0
+                db_handler.update_task_checkpoint_progress(MEDIA_ASSETS_CHECKPOINT_KEY, cursor_snapshot, done_ahead_snapshot)
+
             with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-                future_to_id = {executor.submit(worker_process_item, item_id): item_id for item_id in items_to_process_ids}
+                future_to_index = {executor.submit(worker_process_item, work_list[i]): i for i in indices_to_process}
 
-                for future in concurrent.futures.as_completed(future_to_id):
-                    if self.is_stop_requested():
-                        executor.shutdown(wait=False, cancel_futures=True)
-                        break
-                    
+                def record_result(future):
                     result = future.result()
                     with lock:
+                        if result != "stopped":
+                            mark_done(future_to_index[future])
                         if result == "success":
                             stats["success"] += 1
                         elif result == "skipped":
@@ -1901,26 +2329,91 @@ class MediaProcessor:
                         elif result == "failed":
                             stats["failed"] += 1
                         
-                        processed_count = sum(stats.values())
+                        processed_count = progress_state["cursor"] + len(progress_state["done_ahead"])
                         progress = 30 + int((processed_count / total_to_process) * 70)
                         if update_status_callback:
                             update_status_callback(progress, f"进度: {processed_count}/{total_to_process}")
 
+                recorded = set()
+                for future in concurrent.futures.as_completed(future_to_index):
+                    record_result(future)
+                    recorded.add(future)
+                    flush_checkpoint()
+                    if self.is_stop_requested():
+                        # 收到停止信号：取消尚未开始的任务，等待执行中的任务结束后再收集其结果，保证断点准确
+                        # (被取消的 future 不会通知 as_completed，所以这里必须跳出循环)
+                        executor.shutdown(wait=True, cancel_futures=True)
+                        break
+
+                for future in future_to_index:
+                    if future not in recorded and future.done() and not future.cancelled():
+                        record_result(future)
+                flush_checkpoint(force=True)
+
         except Exception as e:
             logger.error(f"执行 '{task_name}' 时发生严重错误: {e}", exc_info=True)
             if update_status_callback: update_status_callback(-1, f"任务失败: {e}")
             return
 
+        if self.is_stop_requested():
+            logger.info(f"'{task_name}' 已中止，断点已保存，下次以相同参数运行时将从中断处继续。")
+            return
+
+        db_handler.delete_task_checkpoint(MEDIA_ASSETS_CHECKPOINT_KEY)
         final_message = f"✅ 成功: {stats['success']}, 跳过: {stats['skipped']}, 失败: {stats['failed']}。"
         logger.info(f"'{task_name}' 完成。{final_message}")
         if update_status_callback:
             update_status_callback(100, final_message)
+
+    def _prepare_media_assets_work_list(self, update_status_callback: Optional[callable], force_full_update: bool) -> List[Dict[str, Any]]:
+        """枚举 Emby 媒体库，按模式生成覆盖缓存备份的有序工作列表 (只保留后续处理需要的字段)。"""
+        # --- 步骤 1: 获取 Emby 媒体库中的所有项目 ---
+        if update_status_callback: update_status_callback(5, "正在获取 Emby 媒体库项目...")
+        
+        all_emby_items = emby_handler.get_emby_library_items(
+            base_url=self.emby_url,
+            api_key=self.emby_api_key,
+            user_id=self.emby_user_id,
+            library_ids=self.config.get('libraries_to_process', []),
+            fields="ProviderIds,Type,DateModified,Name,ImageTags,BackdropImageTags"
+        )
+        if all_emby_items is None:
+            raise RuntimeError("从 Emby 获取媒体项列表失败。")
+
+        # --- 步骤 2: 根据模式确定需要处理的项目列表 ---
+        if force_full_update:
+            # 深度模式：处理所有 Emby 项目
+            logger.info(f"  -> 全量模式已激活，将处理所有 {len(all_emby_items)} 个 Emby 项目。")
+            items_to_process = all_emby_items
+        else:
+            # 快速模式：计算差集，只处理新项目
+            if update_status_callback: update_status_callback(15, "正在获取本地已处理日志...")
+            with get_central_db_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT item_id FROM processed_log")
+                processed_ids = {row['item_id'] for row in cursor.fetchall()}
+            
+            items_to_process = [item for item in all_emby_items if item.get('Id') not in processed_ids]
+            logger.info(f"  -> 增量模式：从 {len(all_emby_items)} 个 Emby 项目中发现 {len(items_to_process)} 个新项目。")
+
+        kept_fields = ("Id", "Name", "Type", "ProviderIds", "DateModified", "ImageTags", "BackdropImageTags")
+        seen_ids = set()
+        work_list = []
+        for item in items_to_process:
+            item_id = item.get('Id')
+            if not item_id or item_id in seen_ids:
+                continue
+            seen_ids.add(item_id)
+            work_list.append({k: item[k] for k in kept_fields if k in item})
+        return work_list
    
     # --- 备份图片 ---
     def sync_item_images(self, item_details: Dict[str, Any], update_description: Optional[str] = None) -> bool:
         """
         【新增-重构】这个方法负责同步一个媒体项目的所有相关图片。
         它从 _process_item_core_logic 中提取出来，以便复用。
+        每个图片槽位上次下载时的 Emby 图片 tag 记录在 images/.image_tags.json 中，tag 未变的槽位直接跳过；
+        其余图片以有界并发的方式流式下载到磁盘。
         """
         item_id = item_details.get("Id")
         item_type = item_details.get("Type")
@@ -1984,31 +2477,75 @@ class MediaProcessor:
                 logger.debug(f"  -> {log_prefix} 未提供更新描述，将同步所有类型的图片。")
                 images_to_sync = full_image_map
 
-            # --- 执行下载 ---
-            logger.info(f"  -> {log_prefix} 开始为 '{item_name_for_log}' 下载 {len(images_to_sync)} 张图片至 {image_override_dir}...")
-            for image_type, filename in images_to_sync.items():
-                if self.is_stop_requested():
-                    logger.warning(f"  -> {log_prefix} 收到停止信号，中止图片下载。")
-                    return False
-                emby_handler.download_emby_image(item_id, image_type, os.path.join(image_override_dir, filename), self.emby_url, self.emby_api_key)
+            # --- 收集下载任务: (Emby项目ID, 图片类型, 文件名, 项目数据) ---
+            download_jobs = [(item_id, image_type, filename, item_details) for image_type, filename in images_to_sync.items()]
             
             # --- 分集图片逻辑 (只有在完全同步时才考虑执行) ---
             if images_to_sync == full_image_map and item_type == "Series":
-            
-                children = emby_handler.get_series_children(item_id, self.emby_url, self.emby_api_key, self.emby_user_id, series_name_for_log=item_name_for_log) or []
+                children = emby_handler.get_series_children(
+                    item_id, self.emby_url, self.emby_api_key, self.emby_user_id,
+                    series_name_for_log=item_name_for_log,
+                    fields="Id,Name,ParentIndexNumber,IndexNumber,ImageTags"
+                ) or []
                 for child in children:
-                    if self.is_stop_requested():
-                        logger.warning(f"  -> {log_prefix} 收到停止信号，中止子项目图片下载。")
-                        return False
                     child_type, child_id = child.get("Type"), child.get("Id")
                     if child_type == "Season":
                         season_number = child.get("IndexNumber")
                         if season_number is not None:
-                            emby_handler.download_emby_image(child_id, "Primary", os.path.join(image_override_dir, f"season-{season_number}.jpg"), self.emby_url, self.emby_api_key)
+                            download_jobs.append((child_id, "Primary", f"season-{season_number}.jpg", child))
                     elif child_type == "Episode":
                         season_number, episode_number = child.get("ParentIndexNumber"), child.get("IndexNumber")
                         if season_number is not None and episode_number is not None:
-                            emby_handler.download_emby_image(child_id, "Primary", os.path.join(image_override_dir, f"season-{season_number}-episode-{episode_number}.jpg"), self.emby_url, self.emby_api_key)
+                            download_jobs.append((child_id, "Primary", f"season-{season_number}-episode-{episode_number}.jpg", child))
+
+            # --- 按 Emby 图片 tag 过滤掉未变化的槽位 ---
+            tags_manifest_path = os.path.join(image_override_dir, IMAGE_TAGS_MANIFEST_FILENAME)
+            try:
+                with open(tags_manifest_path, 'r', encoding='utf-8') as f:
+                    downloaded_tags = json.load(f)
+            except (OSError, ValueError):
+                downloaded_tags = {}
+
+            pending_jobs = []
+            unchanged_count = 0
+            for source_id, image_type, filename, source_item in download_jobs:
+                tag_known, image_tag = _get_emby_image_tag(source_item, image_type)
+                if tag_known and not image_tag:
+                    # Emby 中本就没有这张图，无需发起注定 404 的请求
+                    continue
+                if image_tag and downloaded_tags.get(filename) == image_tag and os.path.exists(os.path.join(image_override_dir, filename)):
+                    unchanged_count += 1
+                    continue
+                pending_jobs.append((source_id, image_type, filename, image_tag))
+
+            # --- 有界并发下载 ---
+            logger.info(f"  -> {log_prefix} '{item_name_for_log}' 共 {len(download_jobs)} 个图片槽位，{unchanged_count} 个未变化，需下载 {len(pending_jobs)} 张至 {image_override_dir}...")
+            stopped = False
+            if pending_jobs:
+                def _download(job):
+                    source_id, image_type, filename, image_tag = job
+                    if self.is_stop_requested():
+                        return filename, image_tag, None
+                    ok = emby_handler.download_emby_image(
+                        source_id, image_type, os.path.join(image_override_dir, filename),
+                        self.emby_url, self.emby_api_key, image_tag=image_tag
+                    )
+                    return filename, image_tag, ok
+
+                with concurrent.futures.ThreadPoolExecutor(max_workers=IMAGE_DOWNLOAD_WORKERS) as executor:
+                    for filename, image_tag, ok in executor.map(_download, pending_jobs):
+                        if ok is None:
+                            continue
+                        if ok and image_tag:
+                            downloaded_tags[filename] = image_tag
+                        else:
+                            downloaded_tags.pop(filename, None)
+                stopped = self.is_stop_requested()
+                _atomic_write_bytes(tags_manifest_path, json.dumps(downloaded_tags, ensure_ascii=False, sort_keys=True).encode('utf-8'))
+
+            if stopped:
+                logger.warning(f"  -> {log_prefix} 收到停止信号，中止图片下载。")
+                return False
             
             logger.info(f"  -> {log_prefix} ✅ 成功完成 '{item_name_for_log}' 的图片备份。")
             return True
@@ -2017,60 +2554,116 @@ class MediaProcessor:
             return False
     
     # --- 备份元数据 ---
-    def sync_item_metadata(self, item_details: Dict[str, Any], tmdb_id: str):
+    def sync_item_metadata(self, item_details: Dict[str, Any], tmdb_id: str) -> Dict[str, int]:
         """
-        【V12 - 健壮性修复版】
-        无论传入的 item_details 是轻量级还是重量级，都在内部重新获取一次完整的详情，
-        确保后续逻辑总能拿到包含 'People' 的重量级对象。
+        【V13 - 增量写入版】
+        传入的 item_details 不含 'People' 时才重新获取完整详情。
+        先在内存中生成所有覆盖文件的最终内容，再按内容哈希对比，只有变化的文件才会被原子写入；
+        其余基础文件按 大小+修改时间 增量复制。返回 {"files_written", "bytes_written"} 统计。
         """
+        stats = {"files_written": 0, "bytes_written": 0}
         item_id = item_details.get("Id")
         item_name_for_log = item_details.get("Name", f"未知项目(ID:{item_id})")
         log_prefix = "[元数据备份]"
         logger.info(f"  -> {log_prefix} 开始为 '{item_name_for_log}' 执行元数据备份...")
 
-        # ★★★ 核心修复：在这里重新获取一次完整的项目详情 ★★★
-        logger.debug(f"  -> {log_prefix} 正在获取 '{item_name_for_log}' 的完整详情以确保演员信息存在...")
-        full_item_details = emby_handler.get_emby_item_details(
-            item_id, self.emby_url, self.emby_api_key, self.emby_user_id
-        )
+        # ★★★ 只有轻量级对象才需要重新获取完整详情 ★★★
+        if "People" in item_details and item_details.get("Type"):
+            full_item_details = item_details
+        else:
+            logger.debug(f"  -> {log_prefix} 正在获取 '{item_name_for_log}' 的完整详情以确保演员信息存在...")
+            full_item_details = emby_handler.get_emby_item_details(
+                item_id, self.emby_url, self.emby_api_key, self.emby_user_id
+            )
 
         if not full_item_details:
             logger.error(f"  -> {log_prefix} 无法获取项目 {item_id} 的完整详情，元数据备份中止。")
-            return
+            return stats
         
-        # 从这里开始，所有对 item_details 的引用都应改为 full_item_details
         item_type = full_item_details.get("Type")
 
-        # 1. 路径定义和基础文件复制 (不变)
+        # 1. 路径定义
         cache_folder_name = "tmdb-movies2" if item_type == "Movie" else "tmdb-tv"
         source_cache_dir = os.path.join(self.local_data_path, "cache", cache_folder_name, tmdb_id)
         target_override_dir = os.path.join(self.local_data_path, "override", cache_folder_name, tmdb_id)
 
         if not os.path.exists(source_cache_dir):
             logger.warning(f"  -> {log_prefix} 跳过，因为源缓存目录不存在: {source_cache_dir}")
-            return
-        try:
-            shutil.copytree(source_cache_dir, target_override_dir, dirs_exist_ok=True)
-            logger.info(f"  -> {log_prefix} 步骤 1/3: 成功将基础元数据从 '{source_cache_dir}' 复制到 '{target_override_dir}'。")
-        except Exception as e:
-            logger.error(f"  -> {log_prefix} 复制元数据时失败: {e}", exc_info=True)
-            return
+            return stats
 
-        # 2. 获取 Emby 中的“完美演员表”作为我们的目标 (使用修复后的对象)
-        emby_people = full_item_details.get("People", []) # <--- 现在这里总能拿到数据了
+        # 2. 在内存中生成需要改写的文件内容 {相对路径: bytes}
+        generated_files: Dict[str, bytes] = {}
+        emby_people = full_item_details.get("People", [])
         if not emby_people:
             logger.debug(f"  -> {log_prefix} Emby中确实没有演员信息，无需重建演员表。")
-            return
+        else:
+            new_perfect_cast = self._rebuild_override_cast(emby_people)
+            main_json_filename = "all.json" if item_type == "Movie" else "series.json"
+            main_data = _read_local_json(os.path.join(source_cache_dir, main_json_filename)) if os.path.exists(os.path.join(source_cache_dir, main_json_filename)) else None
+
+            main_cast_injected = False
+            if main_data is not None:
+                if 'casts' in main_data and 'cast' in main_data['casts']:
+                    main_data['casts']['cast'] = new_perfect_cast
+                    main_cast_injected = True
+                elif 'credits' in main_data and 'cast' in main_data['credits']:
+                    main_data['credits']['cast'] = new_perfect_cast
+                    main_cast_injected = True
+            if main_cast_injected:
+                generated_files[main_json_filename] = _dump_override_json(main_data)
+
+            # 注入演员表、剧集名和简介到所有季/集文件
+            if main_cast_injected and item_type == "Series":
+                generated_files.update(
+                    self._build_series_child_override_files(item_id, item_name_for_log, source_cache_dir, target_override_dir, new_perfect_cast)
+                )
+
+        # 3. 增量复制未被改写的基础文件，再按哈希写入生成的文件
+        try:
+            os.makedirs(target_override_dir, exist_ok=True)
+            for root, _dirs, files in os.walk(source_cache_dir):
+                for filename in files:
+                    source_path = os.path.join(root, filename)
+                    rel_path = os.path.relpath(source_path, source_cache_dir)
+                    if rel_path in generated_files:
+                        continue
+                    written = _copy_file_if_changed(source_path, os.path.join(target_override_dir, rel_path))
+                    if written:
+                        stats["files_written"] += 1
+                        stats["bytes_written"] += written
+
+            manifest = _load_override_manifest(target_override_dir)
+            manifest_before = json.dumps(manifest, sort_keys=True)
+            for rel_path, data in generated_files.items():
+                written = _write_override_file_if_changed(target_override_dir, rel_path, data, manifest)
+                if written:
+                    stats["files_written"] += 1
+                    stats["bytes_written"] += written
+            if json.dumps(manifest, sort_keys=True) != manifest_before:
+                _save_override_manifest(target_override_dir, manifest)
+        except Exception as e:
+            logger.error(f"  -> {log_prefix} 写入覆盖缓存文件时失败: {e}", exc_info=True)
+            return stats
+
+        if stats["files_written"]:
+            logger.info(f"  -> {log_prefix} 完成，共写入 {stats['files_written']} 个文件 ({stats['bytes_written']} 字节)。")
+        else:
+            logger.info(f"  -> {log_prefix} 完成，所有覆盖文件均未变化，未产生任何写入。")
+        return stats
 
-        # 3. 核心：以 Emby ID 为基准，重建全新的 cast 列表
+    def _rebuild_override_cast(self, emby_people: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """以 Emby Person ID 为基准，从映射表和演员元数据缓存重建覆盖文件使用的 cast 列表。"""
         new_perfect_cast = []
+        actor_people = [p for p in emby_people if p.get("Type") == "Actor"]
         with get_central_db_connection() as conn:
             cursor = conn.cursor()
-            for person in emby_people:
-                if person.get("Type") != "Actor":
-                    continue
+            emby_pids = [str(p.get("Id")) for p in actor_people if p.get("Id")]
+            tmdb_id_by_emby_pid = {}
+            if emby_pids:
+                cursor.execute("SELECT emby_person_id, tmdb_person_id FROM person_identity_map WHERE emby_person_id = ANY(%s)", (emby_pids,))
+                tmdb_id_by_emby_pid = {row['emby_person_id']: row['tmdb_person_id'] for row in cursor.fetchall() if row['tmdb_person_id']}
 
-                # ★★★ 核心改动：获取 Emby Person ID 作为唯一标识符 ★★★
+            for person in actor_people:
                 emby_person_id = person.get("Id")
                 person_name_cn = person.get("Name") # 用于日志和最终名字
                 role_cn = person.get("Role")
@@ -2079,114 +2672,79 @@ class MediaProcessor:
                     logger.warning(f"  -> 演员 '{person_name_cn}' 缺少 Emby Person ID，无法进行精确匹配，已跳过。")
                     continue
 
-                logger.trace(f"  -> 正在处理演员 '{person_name_cn}' (Emby ID: {emby_person_id})...")
-                
-                # 使用 Emby ID 去映射表里精确查找 TMDB ID
-                cursor.execute("SELECT tmdb_person_id FROM person_identity_map WHERE emby_person_id = %s", (emby_person_id,))
-                map_entry_row = cursor.fetchone()
-                
-                if not map_entry_row or not map_entry_row["tmdb_person_id"]:
+                actor_tmdb_id = tmdb_id_by_emby_pid.get(str(emby_person_id))
+                if not actor_tmdb_id:
                     logger.warning(f"  -> 无法在数据库中为演员 '{person_name_cn}' (Emby ID: {emby_person_id}) 找到对应的 TMDB ID，已跳过。")
                     continue
-                
-                actor_tmdb_id = map_entry_row["tmdb_person_id"]
-
-                logger.trace(f"  -> 精确匹配成功: Emby ID {emby_person_id} -> TMDB ID {actor_tmdb_id}")
 
-                # 用找到的 TMDB ID 去获取最详细的元数据
                 full_metadata = self._get_actor_metadata_from_cache(actor_tmdb_id, cursor)
                 if not full_metadata:
                     logger.warning(f"  -> 无法在 actor_metadata 缓存中为 TMDB ID '{actor_tmdb_id}' 找到元数据，已跳过演员 '{person_name_cn}'。")
                     continue
 
                 # 构建一个符合 JSON 格式的、信息完整的演员字典
-                rebuilt_actor = {
+                new_perfect_cast.append({
                     "adult": full_metadata.get("adult", False), "gender": full_metadata.get("gender", 0),
                     "id": actor_tmdb_id, "known_for_department": full_metadata.get("known_for_department", "Acting"),
                     "name": person_name_cn, "original_name": full_metadata.get("original_name"),
                     "popularity": full_metadata.get("popularity", 0.0), "profile_path": full_metadata.get("profile_path"),
                     "cast_id": None, "character": role_cn, "credit_id": None, "order": len(new_perfect_cast)
-                }
-                new_perfect_cast.append(rebuilt_actor)
+                })
+        return new_perfect_cast
+
+    def _build_series_child_override_files(self, series_id: str, series_name: str, source_cache_dir: str,
+                                           target_override_dir: str, new_perfect_cast: List[Dict[str, Any]]) -> Dict[str, bytes]:
+        """生成所有季/集 JSON 的最终内容：注入演员表，并用 Emby 的最新名称和简介覆盖。"""
+        children_from_emby = emby_handler.get_series_children(
+            series_id=series_id,
+            base_url=self.emby_url,
+            api_key=self.emby_api_key,
+            user_id=self.emby_user_id,
+            series_name_for_log=series_name
+        ) or []
+
+        # key 的格式为 "season-1-episode-12"，与文件名完美对应
+        child_data_map = {}
+        for child in children_from_emby:
+            key = None
+            if child.get("Type") == "Season":
+                key = f"season-{child.get('IndexNumber')}"
+            elif child.get("Type") == "Episode":
+                key = f"season-{child.get('ParentIndexNumber')}-episode-{child.get('IndexNumber')}"
+            if key:
+                child_data_map[key] = child
+
+        # 以源缓存为基础；只存在于覆盖目录中的季/集文件，以其自身内容为基础
+        child_filenames = set()
+        for directory in (source_cache_dir, target_override_dir):
+            if os.path.isdir(directory):
+                child_filenames.update(
+                    f for f in os.listdir(directory)
+                    if f.startswith("season-") and f.endswith(".json")
+                )
 
-        # 4. 将重建好的新列表写回主 JSON 文件 (不变)
-        main_json_filename = "all.json" if item_type == "Movie" else "series.json"
-        json_path = os.path.join(target_override_dir, main_json_filename)
-        if not os.path.exists(json_path): return
+        generated = {}
+        for filename in sorted(child_filenames):
+            base_path = os.path.join(source_cache_dir, filename)
+            if not os.path.exists(base_path):
+                base_path = os.path.join(target_override_dir, filename)
+            try:
+                with open(base_path, 'r', encoding='utf-8') as f_child:
+                    child_data = json.load(f_child)
 
-        try:
-            with open(json_path, 'r+', encoding='utf-8') as f:
-                data = json.load(f)
-                if 'casts' in data and 'cast' in data['casts']: data['casts']['cast'] = new_perfect_cast
-                elif 'credits' in data and 'cast' in data['credits']: data['credits']['cast'] = new_perfect_cast
-                else: return
-                f.seek(0)
-                json.dump(data, f, ensure_ascii=False, indent=2)
-                f.truncate()
-                logger.info(f"  -> {log_prefix} 步骤 2/3: 成功将 Emby 中的 {len(new_perfect_cast)} 位完整演员信息重建并写入主备份文件。")
-        except Exception as e:
-            logger.error(f"  -> {log_prefix} 重建并写入 '{main_json_filename}' 时失败: {e}", exc_info=True)
-            return
+                if 'credits' in child_data and 'cast' in child_data['credits']:
+                    child_data['credits']['cast'] = new_perfect_cast
 
-        # 5. 新增：注入演员表到所有季/集文件 (不变)
-        if item_type == "Series":
-            logger.info(f"  -> {log_prefix} 步骤 3/3: 开始将演员表、剧集名和简介注入所有季/集备份文件...")
-            
-            # ★★★ 核心修改 1: 获取所有子项目的最新数据 ★★★
-            # 感谢 emby_handler.py 的修复，这里现在能获取到 Overview 了
-            children_from_emby = emby_handler.get_series_children(
-                series_id=item_details.get("Id"),
-                base_url=self.emby_url,
-                api_key=self.emby_api_key,
-                user_id=self.emby_user_id,
-                series_name_for_log=item_name_for_log
-            ) or []
-
-            # ★★★ 核心修改 2: 创建一个高效的查找映射表 ★★★
-            # key 的格式为 "season-1-episode-12"，与文件名完美对应
-            child_data_map = {}
-            for child in children_from_emby:
-                key = None
-                if child.get("Type") == "Season":
-                    key = f"season-{child.get('IndexNumber')}"
-                elif child.get("Type") == "Episode":
-                    key = f"season-{child.get('ParentIndexNumber')}-episode-{child.get('IndexNumber')}"
-                
-                if key:
-                    child_data_map[key] = child
+                fresh_data = child_data_map.get(os.path.splitext(filename)[0])
+                if fresh_data:
+                    child_data['name'] = fresh_data.get('Name', child_data.get('name'))
+                    child_data['overview'] = fresh_data.get('Overview', child_data.get('overview'))
 
-            updated_children_count = 0
-            try:
-                for filename in os.listdir(target_override_dir):
-                    if filename.startswith("season-") and filename.endswith(".json") and filename != "series.json":
-                        child_json_path = os.path.join(target_override_dir, filename)
-                        try:
-                            with open(child_json_path, 'r+', encoding='utf-8') as f_child:
-                                child_data = json.load(f_child)
-                                
-                                # 注入演员表 (原有逻辑)
-                                if 'credits' in child_data and 'cast' in child_data['credits']:
-                                    child_data['credits']['cast'] = new_perfect_cast
-                                
-                                # ★★★ 核心修改 3: 查找并更新 Name 和 Overview ★★★
-                                file_key = os.path.splitext(filename)[0]
-                                fresh_data = child_data_map.get(file_key)
-                                if fresh_data:
-                                    # 使用从 Emby 获取的最新数据覆盖 JSON 文件中的旧数据
-                                    child_data['name'] = fresh_data.get('Name', child_data.get('name'))
-                                    child_data['overview'] = fresh_data.get('Overview', child_data.get('overview'))
-                                    logger.trace(f"    -> 已为 '{filename}' 更新 Name 和 Overview。")
-                                
-                                # 写回文件
-                                f_child.seek(0)
-                                json.dump(child_data, f_child, ensure_ascii=False, indent=2)
-                                f_child.truncate()
-                                updated_children_count += 1
-                        except Exception as e_child:
-                            logger.warning(f"  -> 更新子文件 '{filename}' 时失败: {e_child}")
-                logger.info(f"  -> {log_prefix} 成功将元数据注入了 {updated_children_count} 个季/集文件。")
-            except Exception as e_list:
-                logger.error(f"  -> {log_prefix} 遍历并更新季/集文件时发生错误: {e_list}", exc_info=True)
+                generated[filename] = _dump_override_json(child_data)
+            except Exception as e_child:
+                logger.warning(f"  -> 生成子文件 '{filename}' 时失败: {e_child}")
+        logger.debug(f"  -> 已为 '{series_name}' 生成 {len(generated)} 个季/集文件的目标内容。")
+        return generated
 
     def sync_single_item_assets(self, item_id: str, update_description: Optional[str] = None, sync_timestamp_iso: Optional[str] = None):
         """
@@ -2203,7 +2761,7 @@ class MediaProcessor:
         try:
             item_details = emby_handler.get_emby_item_details(
                 item_id, self.emby_url, self.emby_api_key, self.emby_user_id,
-                fields="ProviderIds,Type,Name,People,ImageTags,IndexNumber,ParentIndexNumber"
+                fields="ProviderIds,Type,Name,People,ImageTags,BackdropImageTags,IndexNumber,ParentIndexNumber"
             )
             if not item_details:
                 raise ValueError("在Emby中找不到该项目。")
@@ -2335,7 +2893,7 @@ class MediaProcessor:
             unified_rating = get_unified_rating(official_rating)    # 即使 official_rating 是 None，函数也能处理
 
             metadata = {
-                "tmdb_id": tmdb_id, "item_type": item_type,
+                "tmdb_id": tmdb_id, "item_type": item_type, "emby_item_id": full_details_emby.get('Id'),
                 "title": full_details_emby.get('Name'), "original_title": full_details_emby.get('OriginalTitle'),
                 "release_year": full_details_emby.get('ProductionYear'), "rating": full_details_emby.get('CommunityRating'),
                 "official_rating": official_rating, # 保留原始值用于调试
@@ -5,10 +5,13 @@ import xml.etree.ElementTree as ET
 import re
 import os
 import sys
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Callable
 import json
+import hashlib
+import threading
 from datetime import datetime, timedelta, date
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from cachetools import LRUCache, TTLCache
 
 # ★★★ 核心修正：再次回归 gevent.subprocess ★★★
 from gevent import subprocess, Timeout
@@ -22,6 +25,15 @@ from tmdb_handler import search_media, get_tv_details_tmdb
 
 logger = logging.getLogger(__name__)
 
+# --- 榜单导入缓存（跨任务、跨 ListImporter 实例共享） ---
+# 源地址 -> {etag, last_modified, content, digest}，用于条件请求
+_LIST_SOURCE_CACHE = LRUCache(maxsize=128)
+# (源地址, 类型, 数量限制) -> (内容摘要, 匹配结果)；有过期时间，以便定期重试之前匹配失败的条目
+_LIST_RESULT_CACHE = TTLCache(maxsize=128, ttl=6 * 3600)
+# (标准化标题, 年份, 类型) -> TMDb ID
+_TITLE_MATCH_CACHE = TTLCache(maxsize=8192, ttl=24 * 3600)
+_LIST_CACHE_LOCK = threading.Lock()
+
 
 class ListImporter:
     """
@@ -149,11 +161,41 @@ class ListImporter:
             tmdb_id = tmdb_match.group(1)
         return imdb_id, tmdb_id
     
-    def _get_titles_and_imdbids_from_url(self, url: str) -> List[Dict[str, str]]:
+    def _fetch_list_source(self, url: str) -> Optional[Tuple[str, str]]:
+        """
+        带 ETag/Last-Modified 条件请求地获取榜单源，返回 (内容, 内容摘要)。
+        服务器返回 304 时直接使用上次缓存的内容。
+        """
         try:
-            response = self.session.get(url, timeout=20)
+            with _LIST_CACHE_LOCK:
+                cached = _LIST_SOURCE_CACHE.get(url)
+            headers = {}
+            if cached:
+                if cached.get('etag'): headers['If-None-Match'] = cached['etag']
+                if cached.get('last_modified'): headers['If-Modified-Since'] = cached['last_modified']
+
+            response = self.session.get(url, timeout=20, headers=headers)
+            if response.status_code == 304 and cached:
+                logger.debug(f"  -> 榜单源 '{url}' 未变化 (304)，使用缓存内容。")
+                return cached['content'], cached['digest']
             response.raise_for_status()
+
             content = response.text
+            digest = hashlib.sha1(content.encode('utf-8')).hexdigest()
+            with _LIST_CACHE_LOCK:
+                _LIST_SOURCE_CACHE[url] = {
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                    'content': content,
+                    'digest': digest,
+                }
+            return content, digest
+        except Exception as e:
+            logger.error(f"从URL '{url}' 获取榜单时出错: {e}")
+            return None
+
+    def _parse_titles_and_imdbids(self, content: str) -> List[Dict[str, str]]:
+        try:
             root = ET.fromstring(content)
             items = []
             channel = root.find('channel')
@@ -190,9 +232,14 @@ class ListImporter:
                     items.append({'title': title.strip(), 'imdb_id': imdb_id, 'year': year, 'douban_link': douban_link})
             return items
         except Exception as e:
-            logger.error(f"从URL '{url}' 获取榜单时出错: {e}")
+            logger.error(f"解析榜单内容时出错: {e}")
             return []
 
+    def _get_titles_and_imdbids_from_url(self, url: str) -> List[Dict[str, str]]:
+        source = self._fetch_list_source(url)
+        if not source: return []
+        return self._parse_titles_and_imdbids(source[0])
+
     def _parse_series_title(self, title: str) -> Tuple[str, Optional[int]]:
         # 新增：支持 "Name Season 2" 格式的英文正则，忽略大小写
         SEASON_PATTERN_EN = re.compile(r'(.*?)\s+Season\s+(\d+)', re.IGNORECASE)
@@ -220,6 +267,19 @@ class ListImporter:
         return show_name, season_number
 
     def _match_title_to_tmdb(self, title: str, item_type: str, year: Optional[str] = None) -> Optional[str]:
+        # 同一个标题+年份+类型的匹配结果在一段时间内复用，避免每次刷新都重复搜索TMDb
+        cache_key = (" ".join(title.lower().split()), year, item_type)
+        with _LIST_CACHE_LOCK:
+            if cache_key in _TITLE_MATCH_CACHE:
+                return _TITLE_MATCH_CACHE[cache_key]
+        tmdb_id = self._search_title_on_tmdb(title, item_type, year)
+        # 只缓存成功的匹配，网络错误等导致的失败下次仍会重试
+        if tmdb_id:
+            with _LIST_CACHE_LOCK:
+                _TITLE_MATCH_CACHE[cache_key] = tmdb_id
+        return tmdb_id
+
+    def _search_title_on_tmdb(self, title: str, item_type: str, year: Optional[str] = None) -> Optional[str]:
         if item_type == 'Movie':
             results = search_media(title, self.tmdb_api_key, 'Movie', year=year)
             year_info = f" (年份: {year})" if year else ""
@@ -288,7 +348,19 @@ class ListImporter:
         item_types = definition.get('item_type', ['Movie'])
         if isinstance(item_types, str): item_types = [item_types]
         limit = definition.get('limit')
-        items = self._get_titles_and_imdbids_from_url(url)
+        source = self._fetch_list_source(url)
+        if not source: return []
+        content, digest = source
+
+        # 榜单内容没有变化时，直接复用上次的匹配结果，完全跳过TMDb匹配
+        result_key = (url, tuple(item_types), limit)
+        with _LIST_CACHE_LOCK:
+            cached_result = _LIST_RESULT_CACHE.get(result_key)
+        if cached_result and cached_result[0] == digest:
+            logger.info(f"  -> 榜单 '{url}' 内容未变化，直接使用上次的匹配结果 ({len(cached_result[1])} 项)。")
+            return [dict(item) for item in cached_result[1]]
+
+        items = self._parse_titles_and_imdbids(content)
         if not items: return []
         if limit and isinstance(limit, int) and limit > 0:
             logger.info(f"  -> RSS榜单已启用数量限制，将只处理前 {limit} 个项目。")
@@ -377,8 +449,135 @@ class ListImporter:
         logger.info(f"  -> RSS匹配完成，成功获得 {len(tmdb_items)} 个TMDb项目。")
         
         unique_items = list({f"{item['type']}-{item['id']}-{item.get('season')}": item for item in tmdb_items}.values())
+        with _LIST_CACHE_LOCK:
+            _LIST_RESULT_CACHE[result_key] = (digest, [dict(item) for item in unique_items])
         return unique_items
 
+# --- 筛选类合集的倒排索引 ---
+_LIST_TERM_FIELDS = ('genres', 'countries', 'studios', 'tags', 'actors', 'directors')
+
+def _rule_required_terms(rule: Dict[str, Any]) -> Optional[set]:
+    """
+    返回“该规则成立时，媒体项必然拥有其中至少一个”的词项集合；
+    无法据此剪枝的规则(否定、数值、日期、标题等)返回 None。
+    """
+    field, op, value = rule.get("field"), rule.get("operator"), rule.get("value")
+    try:
+        if field in _LIST_TERM_FIELDS:
+            if op == 'is_one_of':
+                return {(field, v) for v in value} if isinstance(value, list) else set()
+            if op == 'contains':
+                return {(field, value)}
+        elif field == 'unified_rating':
+            if op == 'is_one_of':
+                return {(field, v) for v in value} if isinstance(value, list) else set()
+            if op == 'eq':
+                return {(field, str(value))}
+    except TypeError:
+        # 值不可哈希，无法建立索引
+        return None
+    return None
+
+def _item_terms(item_metadata: Dict[str, Any]) -> set:
+    terms = set()
+    for field in _LIST_TERM_FIELDS:
+        values = item_metadata.get(f"{field}_json") or []
+        if not isinstance(values, list):
+            continue
+        for v in values:
+            if field in ('actors', 'directors'):
+                v = v.get('name') if isinstance(v, dict) else None
+            try:
+                if v is not None:
+                    terms.add((field, v))
+            except TypeError:
+                continue
+    if item_metadata.get('unified_rating'):
+        terms.add(('unified_rating', item_metadata['unified_rating']))
+    return terms
+
+class _FilterCollectionIndex:
+    """
+    词项(类型/国家/工作室/标签/演员/导演/分级) -> 合集ID 的倒排索引。
+    只用于缩小候选范围：被剪掉的合集一定不匹配，候选合集仍由 _item_matches_rules 完整判定，结果与逐个判定完全一致。
+    按合集逐个比对定义增量更新，只有新增/修改/删除的合集才会重新建索引。
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._collections: Dict[int, Dict[str, Any]] = {}  # id -> {'row', 'terms' or None}
+        self._order: List[int] = []
+        self._postings: Dict[Any, set] = {}
+        self._always_candidates: set = set()
+
+    @staticmethod
+    def _index_terms(definition: Dict[str, Any]) -> Optional[set]:
+        rules = definition.get('rules', [])
+        if not rules:
+            return None
+        logic = str(definition.get('logic', 'AND')).upper()
+        per_rule = [_rule_required_terms(rule) for rule in rules]
+        if logic == 'AND':
+            # 任选一条可剪枝的规则即可，选词项最少的那条，候选最精确
+            indexable = [terms for terms in per_rule if terms is not None]
+            return min(indexable, key=len) if indexable else None
+        # OR：只有所有规则都可剪枝时，才能用它们的并集作为候选条件
+        if any(terms is None for terms in per_rule):
+            return None
+        return set().union(*per_rule)
+
+    def _remove(self, collection_id: int):
+        entry = self._collections.pop(collection_id, None)
+        if not entry:
+            return
+        if entry['terms'] is None:
+            self._always_candidates.discard(collection_id)
+            return
+        for term in entry['terms']:
+            postings = self._postings.get(term)
+            if postings:
+                postings.discard(collection_id)
+                if not postings:
+                    del self._postings[term]
+
+    def sync(self, rows: List[Dict[str, Any]]):
+        with self._lock:
+            seen = set()
+            for row in rows:
+                collection_id = row['id']
+                seen.add(collection_id)
+                entry = self._collections.get(collection_id)
+                if entry and entry['row'] == row:
+                    continue
+                self._remove(collection_id)
+                try:
+                    terms = self._index_terms(row.get('definition_json') or {})
+                except (TypeError, AttributeError):
+                    terms = None
+                self._collections[collection_id] = {'row': row, 'terms': terms}
+                if terms is None:
+                    self._always_candidates.add(collection_id)
+                else:
+                    for term in terms:
+                        self._postings.setdefault(term, set()).add(collection_id)
+            for collection_id in list(self._collections):
+                if collection_id not in seen:
+                    self._remove(collection_id)
+            self._order = [row['id'] for row in rows]
+
+    def candidates(self, item_metadata: Dict[str, Any]) -> List[Dict[str, Any]]:
+        with self._lock:
+            candidate_ids = set(self._always_candidates)
+            for term in _item_terms(item_metadata):
+                postings = self._postings.get(term)
+                if postings:
+                    candidate_ids |= postings
+            return [self._collections[cid]['row'] for cid in self._order if cid in candidate_ids]
+
+_filter_collection_index = _FilterCollectionIndex()
+
+# 动态筛选规则的编译结果缓存 (规则JSON -> 谓词)
+_DYNAMIC_PREDICATE_CACHE = LRUCache(maxsize=256)
+
 class FilterEngine:
     """
     【V4 - PG JSON 兼容最终版】
@@ -594,14 +793,15 @@ class FilterEngine:
         media_type_cn = "剧集" if media_item_type == "Series" else "影片"
         logger.info(f"  -> 正在为{media_type_cn}《{item_metadata.get('title')}》实时匹配自定义合集...")
         matched_collections = []
-        all_filter_collections = [
-            c for c in db_handler.get_all_custom_collections() 
-            if c['type'] == 'filter' and c['status'] == 'active' and c['emby_collection_id']
-        ]
+        all_filter_collections = db_handler.get_active_filter_collection_definitions()
         if not all_filter_collections:
             logger.debug("没有发现任何已启用的筛选类合集，跳过匹配。")
             return []
-        for collection_def in all_filter_collections:
+        # ★★★ 先用倒排索引剪掉不可能匹配的合集，只对候选合集做完整的规则判定 ★★★
+        _filter_collection_index.sync(all_filter_collections)
+        candidate_collections = _filter_collection_index.candidates(item_metadata)
+        logger.debug(f"  -> 倒排索引从 {len(all_filter_collections)} 个筛选类合集中选出 {len(candidate_collections)} 个候选。")
+        for collection_def in candidate_collections:
             try:
                 definition = collection_def['definition_json']
                 collection_item_types = definition.get('item_type', ['Movie'])
@@ -625,6 +825,43 @@ class FilterEngine:
         return matched_collections
     
     # ▼▼▼ 动态筛选 ▼▼▼
+    @staticmethod
+    def _get_playback_status(emby_item: Dict[str, Any], user_data: Dict[str, Any]) -> str:
+        current_status = 'unplayed'  # 默认状态
+        item_type = emby_item.get('Type')
+
+        # ★★★ 核心修改：针对剧集的优化逻辑 ★★★
+        if item_type == 'Series':
+            unplayed_count = user_data.get('UnplayedItemCount')
+            total_count = emby_item.get('RecursiveItemCount')
+
+            # 只有在能获取到有效数据时才使用新逻辑
+            if unplayed_count is not None and total_count is not None and total_count > 0:
+                if unplayed_count == 0:
+                    current_status = 'played'
+                elif unplayed_count < total_count:
+                    current_status = 'in_progress'
+                else:  # unplayed_count >= total_count
+                    current_status = 'unplayed'
+            else:
+                # 如果数据不完整，回退到旧的、基于整体Played状态的判断
+                is_played = user_data.get('Played', False)
+                if is_played:
+                    current_status = 'played'
+                # 注意：剧集的 PlaybackPositionTicks 不可靠，这里不判断 in_progress
+
+        # ★★★ 电影和其他类型的回退逻辑 (保持旧逻辑不变) ★★★
+        else:
+            is_played = user_data.get('Played', False)
+            in_progress = user_data.get('PlaybackPositionTicks', 0) > 0
+            
+            if is_played:
+                current_status = 'played'
+            elif in_progress:
+                current_status = 'in_progress'
+            # else 默认是 unplayed
+        return current_status
+
     def _item_matches_dynamic_rules(self, emby_item: Dict[str, Any], rules: List[Dict[str, Any]], logic: str) -> bool:
         if not rules: return True
         
@@ -639,39 +876,7 @@ class FilterEngine:
             if not op: op = 'is'
 
             if field == 'playback_status':
-                current_status = 'unplayed'  # 默认状态
-                item_type = emby_item.get('Type')
-
-                # ★★★ 核心修改：针对剧集的优化逻辑 ★★★
-                if item_type == 'Series':
-                    unplayed_count = user_data.get('UnplayedItemCount')
-                    total_count = emby_item.get('RecursiveItemCount')
-
-                    # 只有在能获取到有效数据时才使用新逻辑
-                    if unplayed_count is not None and total_count is not None and total_count > 0:
-                        if unplayed_count == 0:
-                            current_status = 'played'
-                        elif unplayed_count < total_count:
-                            current_status = 'in_progress'
-                        else:  # unplayed_count >= total_count
-                            current_status = 'unplayed'
-                    else:
-                        # 如果数据不完整，回退到旧的、基于整体Played状态的判断
-                        is_played = user_data.get('Played', False)
-                        if is_played:
-                            current_status = 'played'
-                        # 注意：剧集的 PlaybackPositionTicks 不可靠，这里不判断 in_progress
-
-                # ★★★ 电影和其他类型的回退逻辑 (保持旧逻辑不变) ★★★
-                else:
-                    is_played = user_data.get('Played', False)
-                    in_progress = user_data.get('PlaybackPositionTicks', 0) > 0
-                    
-                    if is_played:
-                        current_status = 'played'
-                    elif in_progress:
-                        current_status = 'in_progress'
-                    # else 默认是 unplayed
+                current_status = self._get_playback_status(emby_item, user_data)
 
                 # 后续的 is_match 和 op 判断逻辑保持不变
                 is_match = (current_status == value)
@@ -699,15 +904,70 @@ class FilterEngine:
         # 动态筛选目前只支持 AND
         return all(results)
 
+    @classmethod
+    def _compile_dynamic_rules(cls, rules: List[Dict[str, Any]]) -> Callable[[Dict[str, Any]], bool]:
+        """
+        把动态规则编译成一个闭包谓词，结果与 _item_matches_dynamic_rules 逐项一致，
+        但规则只解析一次，每个媒体项只需执行预先选好的判断函数。
+        """
+        if not rules:
+            return lambda emby_item: True
+
+        get_status = cls._get_playback_status
+        checks = []
+        for rule in rules:
+            field, op, value = rule.get("field"), rule.get("operator"), rule.get("value")
+            if not op: op = 'is'
+            if op not in ('is', 'is_not') or field not in ('playback_status', 'is_favorite'):
+                # 未知字段/操作符在解释器里恒为 False，动态筛选只支持 AND，整条规则集恒不匹配
+                return lambda emby_item: False
+
+            if field == 'playback_status':
+                if op == 'is':
+                    checks.append(lambda item, ud, v=value: get_status(item, ud) == v)
+                else:
+                    checks.append(lambda item, ud, v=value: get_status(item, ud) != v)
+            else:
+                if value is True:
+                    wanted = True
+                elif value is False:
+                    wanted = False
+                else:
+                    # 值既不是 True 也不是 False 时 is_match 恒为 False
+                    if op == 'is':
+                        return lambda emby_item: False
+                    continue
+                if (op == 'is') == wanted:
+                    checks.append(lambda item, ud: bool(ud.get('IsFavorite', False)))
+                else:
+                    checks.append(lambda item, ud: not ud.get('IsFavorite', False))
+
+        def predicate(emby_item: Dict[str, Any]) -> bool:
+            user_data = emby_item.get('UserData', {})
+            for check in checks:
+                if not check(emby_item, user_data):
+                    return False
+            return True
+        return predicate
+
+    def get_dynamic_predicate(self, rules: List[Dict[str, Any]]) -> Callable[[Dict[str, Any]], bool]:
+        """按规则内容缓存编译结果，规则定义变化时自然得到新的缓存键。"""
+        cache_key = json.dumps(rules, sort_keys=True, ensure_ascii=False, default=str)
+        predicate = _DYNAMIC_PREDICATE_CACHE.get(cache_key)
+        if predicate is None:
+            predicate = self._compile_dynamic_rules(rules)
+            _DYNAMIC_PREDICATE_CACHE[cache_key] = predicate
+        return predicate
+
     def execute_dynamic_filter(self, all_emby_items: List[Dict[str, Any]], definition: Dict[str, Any]) -> List[Dict[str, Any]]:
         logger.trace("  -> 动态筛选引擎：开始在实时数据上执行规则...")
         rules = definition.get('rules', [])
-        logic = definition.get('logic', 'AND')
         
         if not rules:
             return all_emby_items
 
-        matched_items = [item for item in all_emby_items if self._item_matches_dynamic_rules(item, rules, logic)]
+        predicate = self.get_dynamic_predicate(rules)
+        matched_items = [item for item in all_emby_items if predicate(item)]
         
         logger.trace(f"  -> 动态筛选完成！共找到 {len(matched_items)} 部匹配的媒体项目。")
         return matched_items
\ No newline at end of file
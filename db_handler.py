@@ -5,6 +5,7 @@ from psycopg2.extras import RealDictCursor, Json
 import json
 import pytz
 import logging
+import threading
 from typing import Optional, Dict, Any, List, Tuple
 from flask import jsonify
 from datetime import datetime, timezone
@@ -296,6 +297,33 @@ class ActorDBManager:
             logger.error(f"upsert_person 未知异常，emby_person_id={person_data.get('emby_id')}: {e}", exc_info=True)
             return -1, "ERROR"
 
+    def get_person_fingerprints(self, cursor: psycopg2.extensions.cursor, emby_person_ids: List[str]) -> Dict[str, str]:
+        """
+        批量读取演员上次写回 Emby 时的数据指纹。
+        返回 {emby_person_id: fingerprint}，没有记录的演员不会出现在结果中。
+        """
+        if not emby_person_ids:
+            return {}
+        try:
+            cursor.execute(
+                "SELECT emby_person_id, emby_fingerprint FROM person_identity_map WHERE emby_person_id = ANY(%s) AND emby_fingerprint IS NOT NULL",
+                (list(emby_person_ids),)
+            )
+            return {row['emby_person_id']: row['emby_fingerprint'] for row in cursor.fetchall()}
+        except Exception as e:
+            logger.error(f"DB读取演员写回指纹失败: {e}", exc_info=True)
+            return {}
+
+    def save_person_fingerprint(self, cursor: psycopg2.extensions.cursor, emby_person_id: str, fingerprint: Optional[str]):
+        """记录演员本次写回 Emby 的数据指纹 (传 None 表示作废)。映射表中不存在该演员时不做任何事。"""
+        try:
+            cursor.execute(
+                "UPDATE person_identity_map SET emby_fingerprint = %s WHERE emby_person_id = %s",
+                (fingerprint, emby_person_id)
+            )
+        except Exception as e:
+            logger.error(f"DB保存演员写回指纹失败 (emby_person_id: {emby_person_id}): {e}", exc_info=True)
+
 # --- 演员映射表清理 ---
 def get_all_emby_person_ids_from_map() -> set:
     """从 person_identity_map 表中获取所有 emby_person_id 的集合。"""
@@ -465,7 +493,8 @@ def add_item_to_watchlist(item_id: str, tmdb_id: str, item_name: str, item_type:
                         item_name = EXCLUDED.item_name,
                         item_type = EXCLUDED.item_type,
                         status = EXCLUDED.status,
-                        last_checked_at = EXCLUDED.last_checked_at;
+                        last_checked_at = EXCLUDED.last_checked_at,
+                        next_check_at = NULL;
                 """
                 cursor.execute(sql, (item_id, tmdb_id, item_name, item_type))
             conn.commit()
@@ -485,7 +514,7 @@ def update_watchlist_item_status(item_id: str, new_status: str) -> bool:
         with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute(
-                "UPDATE watchlist SET status = %s WHERE item_id = %s",
+                "UPDATE watchlist SET status = %s, next_check_at = NULL WHERE item_id = %s",
                 (new_status, item_id)
             )
             conn.commit()
@@ -576,6 +605,7 @@ def batch_update_watchlist_status(item_ids: list, new_status: str) -> int:
             if new_status == 'Watching':
                 updates["paused_until"] = None
                 updates["force_ended"] = False # 使用布尔值更标准
+                updates["next_check_at"] = None # 下一轮常规检查立即处理
             
             # 3. ★★★ 核心修正：将 last_checked_at 的更新直接写入SQL ★★★
             set_clauses = [f"{key} = %s" for key in updates.keys()]
@@ -1040,7 +1070,8 @@ def update_actor_subscription(subscription_id: int, data: dict) -> bool:
             cursor.execute("""
                 UPDATE actor_subscriptions SET
                 status = %s, config_start_year = %s, config_media_types = %s, 
-                config_genres_include_json = %s, config_genres_exclude_json = %s, config_min_rating = %s
+                config_genres_include_json = %s, config_genres_exclude_json = %s, config_min_rating = %s,
+                credits_checked_at = NULL
                 WHERE id = %s
             """, (new_status, new_start_year, final_media_types_str, final_genres_include_json, final_genres_exclude_json, new_min_rating, subscription_id))
             
@@ -1194,11 +1225,27 @@ def get_all_custom_collections() -> List[Dict[str, Any]]:
                 ORDER BY sort_order ASC, id ASC
             """)
             rows = cursor.fetchall()
-            return [dict(row) for row in rows]
+            return apply_collection_member_fields(cursor, [dict(row) for row in rows])
     except psycopg2.Error as e:
         logger.error(f"获取所有自定义合集时发生数据库错误: {e}", exc_info=True)
         return []
 
+def get_active_filter_collection_definitions() -> List[Dict[str, Any]]:
+    """获取已启用、且已有 Emby 实体合集的筛选类合集的规则定义（不读取体积较大的 generated_media_info_json）"""
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, name, definition_json, emby_collection_id
+                FROM custom_collections
+                WHERE type = 'filter' AND status = 'active' AND emby_collection_id IS NOT NULL
+                ORDER BY sort_order ASC, id ASC
+            """)
+            return [dict(row) for row in cursor.fetchall()]
+    except psycopg2.Error as e:
+        logger.error(f"获取筛选类合集定义时发生数据库错误: {e}", exc_info=True)
+        return []
+
 # ★★★ 获取所有已启用的自定义合集，供“一键生成”任务使用 ★★★
 def get_all_active_custom_collections() -> List[Dict[str, Any]]:
     """获取所有状态为 'active' 的自定义合集"""
@@ -1208,23 +1255,44 @@ def get_all_active_custom_collections() -> List[Dict[str, Any]]:
             cursor.execute("SELECT * FROM custom_collections WHERE status = 'active' ORDER BY sort_order ASC, id ASC")
             rows = cursor.fetchall()
             logger.trace(f"  -> 从数据库找到 {len(rows)} 个已启用的自定义合集。")
-            return [dict(row) for row in rows]
+            return apply_collection_member_fields(cursor, [dict(row) for row in rows])
     except psycopg2.Error as e:
         logger.error(f"获取所有已启用的自定义合集时发生数据库错误: {e}", exc_info=True)
         return []
 
-def get_custom_collection_by_id(collection_id: int) -> Optional[Dict[str, Any]]:
+def get_active_custom_collections_for_views() -> List[Dict[str, Any]]:
+    """获取已启用合集中生成虚拟库视图所需的轻量字段（不读取体积较大的 generated_media_info_json）"""
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, name, definition_json, emby_collection_id, sort_order
+                FROM custom_collections WHERE status = 'active' ORDER BY sort_order ASC, id ASC
+            """)
+            return [dict(row) for row in cursor.fetchall()]
+    except psycopg2.Error as e:
+        logger.error(f"获取虚拟库视图所需的合集信息时发生数据库错误: {e}", exc_info=True)
+        return []
+
+def get_custom_collection_by_id(collection_id: int, include_media_json: bool = True) -> Optional[Dict[str, Any]]:
     """
     根据ID获取单个自定义合集的详细信息。
     :param collection_id: 自定义合集的ID。
+    :param include_media_json: 为 False 时不读取体积最大的 generated_media_info_json 列（成员改从子表读取）。
     :return: 包含合集信息的字典，如果未找到则返回None。
     """
     try:
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT * FROM custom_collections WHERE id = %s", (collection_id,))
+            columns = "*"
+            if not include_media_json:
+                cursor.execute("SELECT * FROM custom_collections LIMIT 0")
+                columns = ", ".join(desc[0] for desc in cursor.description if desc[0] != 'generated_media_info_json')
+            cursor.execute(f"SELECT {columns} FROM custom_collections WHERE id = %s", (collection_id,))
             row = cursor.fetchone()
-            return dict(row) if row else None
+            if not row:
+                return None
+            return apply_collection_member_fields(cursor, [dict(row)])[0]
     except psycopg2.Error as e:
         logger.error(f"根据ID {collection_id} 获取自定义合集时发生数据库错误: {e}", exc_info=True)
         return None
@@ -1613,6 +1681,12 @@ def update_custom_collection_after_sync(collection_id: int, update_data: Dict[st
         with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute(sql, tuple(values))
+            # 媒体列表整体写入时，在同一事务中重建成员子表
+            if "generated_media_info_json" in update_data:
+                media_list = update_data["generated_media_info_json"]
+                if isinstance(media_list, str):
+                    media_list = json.loads(media_list)
+                sync_custom_collection_members(cursor, collection_id, media_list)
             conn.commit()
             logger.trace(f"已更新自定义合集 {collection_id} 的同步后状态。")
             return True
@@ -1621,143 +1695,95 @@ def update_custom_collection_after_sync(collection_id: int, update_data: Dict[st
         return False
 
 def update_single_media_status_in_custom_collection(collection_id: int, media_tmdb_id: str, new_status: str) -> bool:
-    """ 更新自定义合集中单个媒体项的状态。"""
+    """ 更新自定义合集中单个媒体项的状态。只修改成员子表中的这一行，媒体列表JSON不动（读取时由子表覆盖）。"""
     try:
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("BEGIN TRANSACTION;")
-            cursor.execute("SELECT generated_media_info_json FROM custom_collections WHERE id = %s", (collection_id,))
+            cursor.execute("""
+                SELECT position FROM custom_collection_members
+                WHERE collection_id = %s AND tmdb_id = %s
+                ORDER BY position LIMIT 1 FOR UPDATE
+            """, (collection_id, str(media_tmdb_id)))
             row = cursor.fetchone()
             if not row:
                 conn.rollback()
                 return False
 
-            # --- ▼▼▼ 核心修复：移除 json.loads，直接使用已解析的对象 ▼▼▼ ---
-            media_items = row.get('generated_media_info_json')
-            if not isinstance(media_items, list):
-                media_items = [] # 安全兜底
-            # --- ▲▲▲ 修复结束 ▲▲▲ ---
-
-            item_found = False
-            for item in media_items:
-                if str(item.get('tmdb_id')) == str(media_tmdb_id):
-                    item['status'] = new_status
-                    item_found = True
-                    break
-            
-            if not item_found:
-                conn.rollback()
-                return False
+            _set_collection_member_fields(cursor, collection_id, row['position'], {"status": new_status})
 
-            missing_count = sum(1 for item in media_items if item.get('status') == 'missing')
-            new_health_status = 'has_missing' if missing_count > 0 else 'ok'
-            
-            update_data = {
-                "generated_media_info_json": json.dumps(media_items, ensure_ascii=False),
-                "missing_count": missing_count,
-                "health_status": new_health_status
-            }
-            
-            set_clauses = [f"{key} = %s" for key in update_data.keys()]
-            values = list(update_data.values())
-            sql = f"UPDATE custom_collections SET {', '.join(set_clauses)} WHERE id = %s"
-            values.append(collection_id)
-            
-            cursor.execute(sql, tuple(values))
+            counts = _count_collection_member_statuses(cursor, collection_id)
+            cursor.execute(
+                "UPDATE custom_collections SET missing_count = %s, health_status = %s WHERE id = %s",
+                (counts['missing'], 'has_missing' if counts['missing'] > 0 else 'ok', collection_id)
+            )
             conn.commit()
             logger.trace(f"已更新自定义合集 {collection_id} 中媒体 {media_tmdb_id} 的状态为 '{new_status}'。")
             return True
     except Exception as e:
         logger.error(f"DB: 更新自定义合集中媒体状态时发生数据库错误: {e}", exc_info=True)
-        if conn and conn.in_transaction:
-            conn.rollback()
-        raise
+        return False
 
 # --- 更新榜单合集 ---
 def match_and_update_list_collections_on_item_add(new_item_tmdb_id: str, new_item_emby_id: str, new_item_name: str) -> List[Dict[str, Any]]:
     """
-    【V3 - PG JSONB 查询修复版】
+    【V4 - 成员子表版】
     当新媒体入库时，查找所有匹配的'list'类型合集，更新其内部状态，并返回需要被操作的Emby合集信息。
-    - 修复了因对 JSONB 字段使用 LIKE 操作符导致的数据库错误。
-    - 改为使用 PostgreSQL 高效的 @> (contains) 操作符进行查询。
+    - 通过 custom_collection_members 的 tmdb_id 索引定位候选合集，不再扫描/解析整个媒体列表JSON。
+    - 每个合集只修改命中的那一条子表行（JSON 读取时由子表覆盖），计数由子表聚合得到。
     """
     collections_to_update_in_emby = []
     
     try:
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            
-            # ★★★ 核心修复 1/2：修改 SQL 查询语句 ★★★
-            # 不再使用 LIKE，而是使用 @> 操作符，并对参数进行 ::jsonb 类型转换
-            sql_find = """
-                SELECT * FROM custom_collections 
-                WHERE type = 'list' 
-                  AND status = 'active' 
-                  AND emby_collection_id IS NOT NULL
-                  AND generated_media_info_json @> %s::jsonb
-            """
-            
-            # ★★★ 核心修复 2/2：构建一个符合 @> 操作符要求的 JSON 字符串作为参数 ★★★
-            # 我们要查找的是一个数组，这个数组里包含一个 tmdb_id 是目标ID的对象
-            search_payload = json.dumps([{'tmdb_id': str(new_item_tmdb_id)}])
-            
-            cursor.execute(sql_find, (search_payload,))
-            candidate_collections = cursor.fetchall()
-
-            if not candidate_collections:
+            # 每个合集取第一个“尚未入库”的同 TMDb ID 条目，与旧逻辑一致
+            cursor.execute("""
+                SELECT DISTINCT ON (m.collection_id)
+                       m.collection_id, m.position, m.status, c.name, c.emby_collection_id
+                FROM custom_collection_members m
+                JOIN custom_collections c ON c.id = m.collection_id
+                WHERE m.tmdb_id = %s
+                  AND m.status IS DISTINCT FROM 'in_library'
+                  AND c.type = 'list'
+                  AND c.status = 'active'
+                  AND c.emby_collection_id IS NOT NULL
+                ORDER BY m.collection_id, m.position
+            """, (str(new_item_tmdb_id),))
+            candidates = cursor.fetchall()
+
+            if not candidates:
                 logger.debug(f"  -> 未在任何榜单合集中找到 TMDb ID: {new_item_tmdb_id}。")
                 return []
 
-            # --- 后续逻辑保持不变 ---
-            cursor.execute("BEGIN TRANSACTION;")
             try:
-                for collection_row in candidate_collections:
-                    collection = dict(collection_row)
-                    collection_id = collection['id']
-                    collection_name = collection['name']
-                    
-                    try:
-                        # psycopg2 会自动将 jsonb 转为 list/dict，所以这里直接用
-                        media_list = collection.get('generated_media_info_json') or []
-                        item_found_and_updated = False
-                        
-                        for media_item in media_list:
-                            if str(media_item.get('tmdb_id')) == str(new_item_tmdb_id) and media_item.get('status') != 'in_library':
-                                old_status_key = media_item.get('status', 'unknown')
-                                new_status_key = 'in_library'
-                                old_status_cn = STATUS_TRANSLATION_MAP.get(old_status_key, old_status_key)
-                                new_status_cn = STATUS_TRANSLATION_MAP.get(new_status_key, new_status_key)
-
-                                logger.info(f"  -> 数据库状态更新：项目《{new_item_name}》在合集《{collection_name}》中的状态将从【{old_status_cn}】更新为【{new_status_cn}】。")
-                                
-                                media_item['status'] = new_status_key
-                                media_item['emby_id'] = new_item_emby_id 
-                                item_found_and_updated = True
-                                break
-                        
-                        if item_found_and_updated:
-                            new_in_library_count = sum(1 for m in media_list if m.get('status') == 'in_library')
-                            new_missing_count = sum(1 for m in media_list if m.get('status') == 'missing')
-                            new_health_status = 'has_missing' if new_missing_count > 0 else 'ok'
-                            new_json_data = json.dumps(media_list, ensure_ascii=False)
-                            
-                            cursor.execute("""
-                                UPDATE custom_collections
-                                SET generated_media_info_json = %s,
-                                    in_library_count = %s,
-                                    missing_count = %s,
-                                    health_status = %s
-                                WHERE id = %s
-                            """, (new_json_data, new_in_library_count, new_missing_count, new_health_status, collection_id))
-                            
-                            collections_to_update_in_emby.append({
-                                'emby_collection_id': collection['emby_collection_id'],
-                                'name': collection_name
-                            })
+                for candidate in candidates:
+                    collection_id = candidate['collection_id']
+                    collection_name = candidate['name']
+
+                    old_status_key = candidate['status'] or 'unknown'
+                    new_status_key = 'in_library'
+                    old_status_cn = STATUS_TRANSLATION_MAP.get(old_status_key, old_status_key)
+                    new_status_cn = STATUS_TRANSLATION_MAP.get(new_status_key, new_status_key)
+                    logger.info(f"  -> 数据库状态更新：项目《{new_item_name}》在合集《{collection_name}》中的状态将从【{old_status_cn}】更新为【{new_status_cn}】。")
+
+                    _set_collection_member_fields(
+                        cursor, collection_id, candidate['position'],
+                        {"status": new_status_key, "emby_id": new_item_emby_id}
+                    )
 
-                    except (json.JSONDecodeError, TypeError) as e_json:
-                        logger.warning(f"解析或处理榜单合集《{collection_name}》的数据时出错: {e_json}，跳过。")
-                        continue
+                    counts = _count_collection_member_statuses(cursor, collection_id)
+                    cursor.execute("""
+                        UPDATE custom_collections
+                        SET in_library_count = %s,
+                            missing_count = %s,
+                            health_status = %s
+                        WHERE id = %s
+                    """, (counts['in_library'], counts['missing'], 'has_missing' if counts['missing'] > 0 else 'ok', collection_id))
+
+                    collections_to_update_in_emby.append({
+                        'emby_collection_id': candidate['emby_collection_id'],
+                        'name': collection_name
+                    })
                 
                 conn.commit()
                 
@@ -1793,45 +1819,46 @@ def get_media_metadata_by_tmdb_ids(tmdb_ids: List[str], item_type: str) -> List[
 def append_item_to_filter_collection_db(collection_id: int, new_item_tmdb_id: str, new_item_emby_id: str) -> bool:
     """
     当一个新媒体项匹配规则筛选合集时，更新数据库中的状态。
-    这包括向 generated_media_info_json 追加精简信息，并更新 in_library_count。
+    这包括在成员子表末尾追加一行（JSON 视图读取时由子表补齐，不改写JSON），并更新 in_library_count。
     """
     try:
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            # 开启事务并锁定行，防止并发写入冲突
-            cursor.execute("BEGIN TRANSACTION;")
-            cursor.execute("SELECT generated_media_info_json, in_library_count FROM custom_collections WHERE id = %s FOR UPDATE", (collection_id,))
+            # 锁定合集行，防止并发追加导致下标冲突
+            cursor.execute("""
+                SELECT in_library_count,
+                       GREATEST(
+                           CASE WHEN jsonb_typeof(generated_media_info_json) = 'array'
+                                THEN jsonb_array_length(generated_media_info_json) ELSE 0 END,
+                           (SELECT COALESCE(MAX(position) + 1, 0) FROM custom_collection_members WHERE collection_id = %s)
+                       ) AS media_count
+                FROM custom_collections WHERE id = %s FOR UPDATE
+            """, (collection_id, collection_id))
             row = cursor.fetchone()
             if not row:
                 conn.rollback()
                 logger.warning(f"尝试向规则合集 (DB ID: {collection_id}) 追加媒体项，但未找到该合集。")
                 return False
 
-            # 获取当前JSON，如果为NULL或无效，则初始化为空列表
-            media_list = row.get('generated_media_info_json') or []
-            if not isinstance(media_list, list):
-                media_list = []
-            
             # 检查是否已存在，避免重复添加
-            if any(item.get('emby_id') == new_item_emby_id for item in media_list):
+            cursor.execute(
+                "SELECT 1 FROM custom_collection_members WHERE collection_id = %s AND emby_id = %s LIMIT 1",
+                (collection_id, new_item_emby_id)
+            )
+            if cursor.fetchone():
                 conn.rollback()
                 logger.debug(f"媒体项 {new_item_emby_id} 已存在于合集 {collection_id} 的JSON缓存中，跳过追加。")
                 return True
 
-            # 追加新的精简媒体信息
-            media_list.append({
-                'tmdb_id': new_item_tmdb_id,
-                'emby_id': new_item_emby_id
-            })
-            
-            # 更新库内数量
             new_in_library_count = (row.get('in_library_count') or 0) + 1
-            
-            # 将更新后的数据写回数据库
-            new_json_data = json.dumps(media_list, ensure_ascii=False)
             cursor.execute(
-                "UPDATE custom_collections SET generated_media_info_json = %s, in_library_count = %s WHERE id = %s",
-                (new_json_data, new_in_library_count, collection_id)
+                "UPDATE custom_collections SET in_library_count = %s WHERE id = %s",
+                (new_in_library_count, collection_id)
+            )
+            cursor.execute(
+                "INSERT INTO custom_collection_members (collection_id, position, tmdb_id, media_type, season, status, emby_id) "
+                "VALUES (%s, %s, %s, NULL, NULL, NULL, %s)",
+                (collection_id, row['media_count'], str(new_item_tmdb_id), new_item_emby_id)
             )
             conn.commit()
             logger.info(f"  -> 数据库状态同步：已将新媒体项 {new_item_emby_id} 追加到规则合集 (DB ID: {collection_id}) 的JSON缓存中。")
@@ -1842,6 +1869,184 @@ def append_item_to_filter_collection_db(collection_id: int, new_item_tmdb_id: st
             conn.rollback()
         logger.error(f"向规则合集 {collection_id} 的JSON缓存追加媒体项时发生数据库错误: {e}", exc_info=True)
         return False
+
+# ★★★ 合集成员子表 (custom_collection_members) ★★★
+# 子表按 position 与 generated_media_info_json 的数组下标一一对应，是 status / emby_id 的唯一数据源：
+# 单项状态变更和规则合集追加只写子表；JSON 只在整体同步时重写，读取时由 apply_collection_member_fields 覆盖。
+def _collection_member_row(collection_id: int, position: int, media_item: Dict[str, Any]) -> tuple:
+    season = media_item.get('season')
+    try:
+        season = int(season) if season is not None else None
+    except (TypeError, ValueError):
+        season = None
+    tmdb_id = media_item.get('tmdb_id')
+    return (
+        collection_id, position,
+        str(tmdb_id) if tmdb_id is not None else None,
+        media_item.get('media_type'), season,
+        media_item.get('status'), media_item.get('emby_id')
+    )
+
+def sync_custom_collection_members(cursor: psycopg2.extensions.cursor, collection_id: int, media_list: Optional[List[Dict[str, Any]]]):
+    """用完整的媒体列表重建某个合集的成员行。必须与 generated_media_info_json 的整体写入在同一事务中调用。"""
+    from psycopg2.extras import execute_values
+    cursor.execute("DELETE FROM custom_collection_members WHERE collection_id = %s", (collection_id,))
+    # position 取原列表下标，遇到无法识别的条目只跳过该条，其余成员的下标仍与JSON一致
+    rows = [
+        _collection_member_row(collection_id, position, item)
+        for position, item in enumerate(media_list or []) if isinstance(item, dict)
+    ]
+    if len(rows) != len(media_list or []):
+        logger.warning(f"合集 {collection_id} 的媒体列表中有 {len(media_list) - len(rows)} 个无法识别的条目，已跳过。")
+    if rows:
+        execute_values(
+            cursor,
+            "INSERT INTO custom_collection_members (collection_id, position, tmdb_id, media_type, season, status, emby_id) VALUES %s",
+            rows, page_size=1000
+        )
+
+def rebuild_missing_custom_collection_members(cursor: psycopg2.extensions.cursor) -> int:
+    """为还没有成员行的合集从 JSON 回填子表（升级后首次启动、数据库恢复之后）。返回插入的行数。"""
+    cursor.execute("""
+        INSERT INTO custom_collection_members (collection_id, position, tmdb_id, media_type, season, status, emby_id)
+        SELECT c.id, e.ord - 1, e.item->>'tmdb_id', e.item->>'media_type',
+               CASE WHEN e.item->>'season' ~ '^[0-9]+$' THEN (e.item->>'season')::int END,
+               e.item->>'status', e.item->>'emby_id'
+        FROM custom_collections c
+        CROSS JOIN LATERAL jsonb_array_elements(
+            CASE WHEN jsonb_typeof(c.generated_media_info_json) = 'array' THEN c.generated_media_info_json ELSE '[]'::jsonb END
+        ) WITH ORDINALITY AS e(item, ord)
+        WHERE NOT EXISTS (SELECT 1 FROM custom_collection_members m WHERE m.collection_id = c.id)
+        ON CONFLICT DO NOTHING
+    """)
+    return cursor.rowcount
+
+def _set_collection_member_fields(cursor: psycopg2.extensions.cursor, collection_id: int, position: int, fields: Dict[str, Any]):
+    """修改成员行的字段（只支持 status / emby_id）。JSON 视图不在这里改写，读取时由子表覆盖。"""
+    set_clauses = [f"{key} = %s" for key in fields]
+    cursor.execute(
+        f"UPDATE custom_collection_members SET {', '.join(set_clauses)} WHERE collection_id = %s AND position = %s",
+        tuple(fields.values()) + (collection_id, position)
+    )
+
+def apply_collection_member_fields(cursor: psycopg2.extensions.cursor, collections: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    用成员子表的 status / emby_id 覆盖合集行中 generated_media_info_json 的对应下标（原地修改并返回），
+    并补上只存在于子表中的追加成员。所有需要完整媒体列表的读取方都应经过这里。
+    """
+    ids = [c['id'] for c in collections if isinstance(c.get('generated_media_info_json'), list)]
+    if not ids:
+        return collections
+    cursor.execute("""
+        SELECT collection_id, position, tmdb_id, media_type, season, status, emby_id
+        FROM custom_collection_members WHERE collection_id = ANY(%s)
+        ORDER BY collection_id, position
+    """, (ids,))
+    members_by_collection: Dict[int, List[Dict[str, Any]]] = {}
+    for row in cursor.fetchall():
+        members_by_collection.setdefault(row['collection_id'], []).append(row)
+
+    for collection in collections:
+        media_list = collection.get('generated_media_info_json')
+        members = members_by_collection.get(collection.get('id'))
+        if not isinstance(media_list, list) or not members:
+            continue
+        for member in members:
+            position = member['position']
+            if position < len(media_list):
+                media_item = media_list[position]
+                if not isinstance(media_item, dict):
+                    continue
+                for key in ('status', 'emby_id'):
+                    if member[key] is not None or key in media_item:
+                        media_item[key] = member[key]
+            else:
+                # 规则合集追加的成员只写了子表
+                media_list.append({k: member[k] for k in ('tmdb_id', 'media_type', 'season', 'status', 'emby_id') if member[k] is not None})
+    return collections
+
+def _count_collection_member_statuses(cursor: psycopg2.extensions.cursor, collection_id: int) -> Dict[str, int]:
+    cursor.execute("""
+        SELECT COUNT(*) FILTER (WHERE status = 'in_library') AS in_library,
+               COUNT(*) FILTER (WHERE status = 'missing') AS missing
+        FROM custom_collection_members WHERE collection_id = %s
+    """, (collection_id,))
+    row = cursor.fetchone()
+    return {'in_library': row['in_library'], 'missing': row['missing']}
+
+def get_custom_collection_members(collection_id: int, status: Optional[str] = None,
+                                  limit: Optional[int] = None, offset: int = 0,
+                                  with_details: bool = False) -> Dict[str, Any]:
+    """
+    按榜单顺序分页读取合集成员（可按状态过滤），过滤和分页都在子表上完成，不加载整个媒体列表JSON。
+    with_details=True 时把 JSON 视图展开一次，按下标与当前页成员关联取出展示字段（标题、海报、上映日期等），
+    与子表字段合并后返回，子表中的状态/Emby ID 优先。
+    :return: {'total': 满足条件的总数, 'items': [{position, tmdb_id, media_type, season, status, emby_id, ...}, ...]}
+    """
+    where = "WHERE m.collection_id = %s"
+    params: List[Any] = [collection_id]
+    if status:
+        where += " AND m.status = %s"
+        params.append(status)
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT COUNT(*) AS total FROM custom_collection_members m {where}", tuple(params))
+            total = cursor.fetchone()['total']
+            details_cte, details_column, details_join = "", "", ""
+            page_params: List[Any] = []
+            if with_details:
+                # 整个数组只展开一次，再按下标哈希关联，避免逐行在大 JSON 上取下标
+                details_cte = """
+                    WITH details AS (
+                        SELECT e.ord - 1 AS position, e.item
+                        FROM custom_collections c
+                        CROSS JOIN LATERAL jsonb_array_elements(
+                            CASE WHEN jsonb_typeof(c.generated_media_info_json) = 'array' THEN c.generated_media_info_json ELSE '[]'::jsonb END
+                        ) WITH ORDINALITY AS e(item, ord)
+                        WHERE c.id = %s
+                    )
+                """
+                details_column = ", d.item AS details"
+                details_join = "LEFT JOIN details d ON d.position = m.position"
+                page_params.append(collection_id)
+            page_sql = f"""
+                {details_cte}
+                SELECT m.position, m.tmdb_id, m.media_type, m.season, m.status, m.emby_id{details_column}
+                FROM custom_collection_members m {details_join} {where}
+                ORDER BY m.position
+            """
+            page_params.extend(params)
+            if limit is not None:
+                page_sql += " LIMIT %s OFFSET %s"
+                page_params.extend([limit, offset])
+            cursor.execute(page_sql, tuple(page_params))
+            items = []
+            for row in cursor.fetchall():
+                member = dict(row)
+                details = member.pop('details', None)
+                if isinstance(details, dict):
+                    member = {**details, **{k: v for k, v in member.items() if v is not None}}
+                items.append(member)
+            return {'total': total, 'items': items}
+    except psycopg2.Error as e:
+        logger.error(f"读取合集 {collection_id} 的成员时发生数据库错误: {e}", exc_info=True)
+        return {'total': 0, 'items': []}
+
+def get_custom_collection_ordered_emby_ids(collection_id: int) -> List[str]:
+    """按榜单顺序返回合集中所有已入库媒体的 Emby ID。"""
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT emby_id FROM custom_collection_members
+                WHERE collection_id = %s AND emby_id IS NOT NULL AND emby_id <> ''
+                ORDER BY position
+            """, (collection_id,))
+            return [row['emby_id'] for row in cursor.fetchall()]
+    except psycopg2.Error as e:
+        logger.error(f"读取合集 {collection_id} 的 Emby ID 列表时发生数据库错误: {e}", exc_info=True)
+        return []
 # ======================================================================
 # 模块 7: 应用设置数据访问 (Application Settings Data Access)
 # ======================================================================
@@ -2017,7 +2222,7 @@ def get_all_resubscribe_cache() -> List[Dict[str, Any]]:
         return []
 
 def upsert_resubscribe_cache_batch(items_data: List[Dict[str, Any]]):
-    """【V5 - 增加来源库ID】批量更新或插入洗版缓存数据。"""
+    """【V6 - 增加文件指纹与规则哈希】批量更新或插入洗版缓存数据。"""
     if not items_data:
         return
 
@@ -2026,7 +2231,8 @@ def upsert_resubscribe_cache_batch(items_data: List[Dict[str, Any]]):
             item_id, item_name, tmdb_id, item_type, status, reason,
             resolution_display, quality_display, effect_display, audio_display, subtitle_display,
             audio_languages_raw, subtitle_languages_raw, last_checked_at,
-            matched_rule_id, matched_rule_name, source_library_id
+            matched_rule_id, matched_rule_name, source_library_id,
+            source_fingerprint, rule_hash
         ) VALUES %s
         ON CONFLICT (item_id) DO UPDATE SET
             item_name = EXCLUDED.item_name, tmdb_id = EXCLUDED.tmdb_id,
@@ -2039,7 +2245,9 @@ def upsert_resubscribe_cache_batch(items_data: List[Dict[str, Any]]):
             last_checked_at = EXCLUDED.last_checked_at,
             matched_rule_id = EXCLUDED.matched_rule_id,
             matched_rule_name = EXCLUDED.matched_rule_name,
-            source_library_id = EXCLUDED.source_library_id;
+            source_library_id = EXCLUDED.source_library_id,
+            source_fingerprint = EXCLUDED.source_fingerprint,
+            rule_hash = EXCLUDED.rule_hash;
     """
     values_to_insert = []
     for item in items_data:
@@ -2053,7 +2261,9 @@ def upsert_resubscribe_cache_batch(items_data: List[Dict[str, Any]]):
             datetime.now(timezone.utc),
             item.get('matched_rule_id'),
             item.get('matched_rule_name'),
-            item.get('source_library_id')
+            item.get('source_library_id'),
+            item.get('source_fingerprint'),
+            item.get('rule_hash')
         ))
     
     try:
@@ -2266,4 +2476,207 @@ def decrement_subscription_quota() -> bool:
                 return False
     except Exception as e:
         logger.error(f"减少订阅配额时发生严重错误: {e}", exc_info=True)
-        return False
\ No newline at end of file
+        return False
+
+def _quota_today_str() -> str:
+    return datetime.now(pytz.timezone(constants.TIMEZONE)).strftime('%Y-%m-%d')
+
+def reserve_subscription_quota(amount: int) -> int:
+    """
+    在一个事务里从今日配额中预留最多 amount 个名额（同样会做“懒重置”），返回实际预留到的数量。
+    """
+    if amount <= 0:
+        return 0
+    max_quota = config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_RESUBSCRIBE_DAILY_CAP, 200)
+    today_str = _quota_today_str()
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            # 先保证记录存在，这样 FOR UPDATE 能锁住它，并发预留不会各自拿到一份满额
+            cursor.execute("""
+                INSERT INTO app_settings (setting_key, value_json, last_updated_at)
+                VALUES ('subscription_quota_state', '{}'::jsonb, NOW())
+                ON CONFLICT (setting_key) DO NOTHING
+            """)
+            cursor.execute("SELECT value_json FROM app_settings WHERE setting_key = 'subscription_quota_state' FOR UPDATE")
+            row = cursor.fetchone()
+            state = (row['value_json'] if row else None) or {}
+            if state.get('last_reset_date') != today_str:
+                logger.info(f"检测到新的一天 ({today_str})，正在重置订阅配额为 {max_quota}。")
+                state = {'current_quota': max_quota, 'last_reset_date': today_str}
+            current_quota = state.get('current_quota', 0)
+            granted = max(0, min(amount, current_quota))
+            state['current_quota'] = current_quota - granted
+            _save_setting_with_cursor(cursor, 'subscription_quota_state', state)
+            conn.commit()
+            logger.debug(f"  -> 预留订阅配额 {granted}/{amount}，剩余: {state['current_quota']}")
+            return granted
+    except Exception as e:
+        logger.error(f"预留订阅配额时发生错误，按 0 处理: {e}", exc_info=True)
+        return 0
+
+def release_subscription_quota(amount: int, reserved_on: str) -> bool:
+    """
+    归还预留后没有用掉的配额。只有预留时的日期仍是今天才归还，跨天后配额已重置，不再加回。
+    """
+    if amount <= 0:
+        return True
+    max_quota = config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_RESUBSCRIBE_DAILY_CAP, 200)
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT value_json FROM app_settings WHERE setting_key = 'subscription_quota_state' FOR UPDATE")
+            row = cursor.fetchone()
+            state = (row['value_json'] if row else None) or {}
+            if state.get('last_reset_date') != reserved_on:
+                conn.rollback()
+                return True
+            state['current_quota'] = min(max_quota, state.get('current_quota', 0) + amount)
+            _save_setting_with_cursor(cursor, 'subscription_quota_state', state)
+            conn.commit()
+            logger.debug(f"  -> 已归还 {amount} 个未使用的订阅配额，剩余: {state['current_quota']}")
+            return True
+    except Exception as e:
+        logger.error(f"归还订阅配额时发生错误: {e}", exc_info=True)
+        return False
+
+class SubscriptionQuotaReservation:
+    """
+    批量订阅用的配额预留：每次从数据库原子地预留一批名额，在内存中逐个分发，
+    结束时把没用掉的名额还回去。可被多个线程同时使用，分发出去的名额不会超过实际预留到的数量。
+
+    用法：
+        with SubscriptionQuotaReservation(block_size=len(items)) as quota:
+            if quota.take(): ...提交订阅，失败时 quota.give_back()
+    """
+
+    def __init__(self, block_size: int = 20):
+        self.block_size = max(1, int(block_size))
+        self.exhausted = False
+        self.used = 0
+        self._available = 0
+        self._reserved_on: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def take(self) -> bool:
+        """取一个名额；本地没有名额时再向数据库预留一批。配额用尽返回 False。"""
+        with self._lock:
+            if self._available == 0 and not self.exhausted:
+                reserved_on = _quota_today_str()
+                granted = reserve_subscription_quota(self.block_size)
+                if granted > 0:
+                    # 只有本地名额用完才会再预留，所以这里记录的日期总是对应当前全部本地名额
+                    self._reserved_on = reserved_on
+                    self._available += granted
+                else:
+                    self.exhausted = True
+            if self._available == 0:
+                return False
+            self._available -= 1
+            self.used += 1
+            return True
+
+    def give_back(self):
+        """提交失败时把名额放回本地，供后续项目使用。"""
+        with self._lock:
+            self._available += 1
+            self.used -= 1
+
+    def release(self):
+        """把本地剩余的名额还给数据库。"""
+        with self._lock:
+            unused, self._available = self._available, 0
+            reserved_on = self._reserved_on
+        if unused > 0 and reserved_on:
+            release_subscription_quota(unused, reserved_on)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+# ======================================================================
+# 模块 10: 任务断点续跑 (Task Checkpoints)
+# ======================================================================
+
+def get_task_checkpoint(run_key: str, max_age_hours: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """
+    读取某个全量任务的断点记录。
+    返回包含 params_json、work_list_json、cursor_index、completed_ahead_json 的字典，不存在时返回 None。
+    指定 max_age_hours 时，创建时间早于该时限的断点（工作列表已过时）会被删除并返回 None。
+    """
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM task_checkpoints WHERE run_key = %s", (run_key,))
+            row = cursor.fetchone()
+            if not row:
+                return None
+            if max_age_hours is not None:
+                cursor.execute(
+                    "DELETE FROM task_checkpoints WHERE run_key = %s AND created_at < NOW() - make_interval(secs => %s)",
+                    (run_key, float(max_age_hours) * 3600)
+                )
+                if cursor.rowcount > 0:
+                    conn.commit()
+                    logger.info(f"DB: 任务 '{run_key}' 的断点创建于 {row['created_at']}，已超过 {max_age_hours} 小时，已丢弃。")
+                    return None
+            return dict(row)
+    except Exception as e:
+        logger.error(f"DB: 读取任务断点 '{run_key}' 时失败: {e}", exc_info=True)
+        return None
+
+def save_task_checkpoint(run_key: str, params: Dict[str, Any], work_list: List[Any]) -> bool:
+    """为一次新的全量运行创建断点：记录运行参数和有序工作列表，游标归零。"""
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO task_checkpoints (run_key, params_json, work_list_json, cursor_index, completed_ahead_json, created_at, updated_at)
+                VALUES (%s, %s, %s, 0, '[]'::jsonb, NOW(), NOW())
+                ON CONFLICT (run_key) DO UPDATE SET
+                    params_json = EXCLUDED.params_json,
+                    work_list_json = EXCLUDED.work_list_json,
+                    cursor_index = 0,
+                    completed_ahead_json = '[]'::jsonb,
+                    created_at = NOW(),
+                    updated_at = NOW();
+            """, (run_key, Json(params), Json(work_list)))
+            conn.commit()
+            logger.debug(f"DB: 已为任务 '{run_key}' 创建断点，共 {len(work_list)} 个工作项。")
+            return True
+    except Exception as e:
+        logger.error(f"DB: 创建任务断点 '{run_key}' 时失败: {e}", exc_info=True)
+        return False
+
+def update_task_checkpoint_progress(run_key: str, cursor_index: int, completed_ahead: Optional[List[int]] = None) -> bool:
+    """
+    推进断点游标。
+    cursor_index 之前的工作项均已完成；completed_ahead 记录并发执行时在游标之后已提前完成的下标。
+    """
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "UPDATE task_checkpoints SET cursor_index = %s, completed_ahead_json = %s, updated_at = NOW() WHERE run_key = %s",
+                (cursor_index, Json(sorted(completed_ahead or [])), run_key)
+            )
+            conn.commit()
+            return cursor.rowcount > 0
+    except Exception as e:
+        logger.error(f"DB: 更新任务断点 '{run_key}' 时失败: {e}", exc_info=True)
+        return False
+
+def delete_task_checkpoint(run_key: str) -> bool:
+    """任务完整跑完后删除断点。"""
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM task_checkpoints WHERE run_key = %s", (run_key,))
+            conn.commit()
+            return cursor.rowcount > 0
+    except Exception as e:
+        logger.error(f"DB: 删除任务断点 '{run_key}' 时失败: {e}", exc_info=True)
+        return False
@@ -3,7 +3,6 @@
 import requests
 import concurrent.futures
 import os
-import shutil
 import time
 import utils
 import threading
@@ -26,6 +25,8 @@ class SimpleLogger:
     def success(self, msg): print(f"[EMBY_SUCCESS] {msg}")
 _emby_id_cache = {}
 _emby_season_cache = {}
+# 增删合集成员时每个请求携带的最大 ID 数，避免 URL 过长
+COLLECTION_MEMBERSHIP_CHUNK_SIZE = 100
 _emby_episode_cache = {}
 # ★★★ 模拟用户登录以获取临时 AccessToken 的辅助函数 ★★★
 def _get_emby_access_token(emby_url, username, password) -> tuple[Optional[str], Optional[str]]:
@@ -356,8 +357,13 @@ def get_emby_library_items(
     search_term: Optional[str] = None,
     library_name_map: Optional[Dict[str, str]] = None,
     fields: Optional[str] = None,
-    force_user_endpoint: bool = False
+    force_user_endpoint: bool = False,
+    strict: bool = False
 ) -> Optional[List[Dict[str, Any]]]:
+    """
+    获取指定媒体库中的项目。默认某个库请求失败时记录错误并跳过该库；
+    strict=True 时任何一个库请求失败都返回 None，调用方可据此区分“库为空”和“获取失败”。
+    """
     if not base_url or not api_key:
         logger.error("get_emby_library_items: base_url 或 api_key 未提供。")
         return None
@@ -428,6 +434,8 @@ def get_emby_library_items(
         
         except Exception as e:
             logger.error(f"请求库 '{library_name}' 中的项目失败: {e}", exc_info=True)
+            if strict:
+                return None
             continue
 
     type_to_chinese = {"Movie": "电影", "Series": "电视剧", "Video": "视频", "MusicAlbum": "音乐专辑"}
@@ -648,6 +656,135 @@ def get_all_persons_from_emby(
         
         if person_details_batch:
             yield person_details_batch
+# ★★★ 按页获取单个媒体库中的项目，每页一次请求带回所需字段 ★★★
+def iter_emby_library_items_paged(
+    base_url: str,
+    api_key: str,
+    user_id: str,
+    library_id: str,
+    media_type_filter: str,
+    fields: str,
+    page_size: int = 200,
+    stop_event: Optional[threading.Event] = None
+) -> Generator[List[Dict[str, Any]], None, None]:
+    """
+    分页获取指定媒体库中的项目，每次 yield 一页。每个项目会附带 '_SourceLibraryId'。
+    请求失败时记录错误并结束迭代。
+    """
+    if not all([base_url, api_key, user_id, library_id]):
+        logger.error("iter_emby_library_items_paged: 参数不足。")
+        return
+
+    api_url = f"{base_url.rstrip('/')}/Users/{user_id}/Items"
+    params = {
+        "api_key": api_key, "Recursive": "true", "ParentId": library_id,
+        "IncludeItemTypes": media_type_filter, "Fields": fields,
+        "SortBy": "SortName", "SortOrder": "Ascending",
+    }
+    api_timeout = config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_EMBY_API_TIMEOUT, 60)
+    start_index = 0
+    while True:
+        if stop_event and stop_event.is_set():
+            return
+        request_params = params.copy()
+        request_params["StartIndex"] = start_index
+        request_params["Limit"] = page_size
+        try:
+            response = requests.get(api_url, params=request_params, timeout=api_timeout)
+            response.raise_for_status()
+            items = response.json().get("Items", [])
+        except requests.exceptions.RequestException as e:
+            logger.error(f"分页请求库 {library_id} 中的项目失败 (StartIndex={start_index}): {e}", exc_info=True)
+            return
+        if not items:
+            return
+        for item in items:
+            item['_SourceLibraryId'] = library_id
+        yield items
+        if len(items) < page_size:
+            return
+        start_index += len(items)
+
+# ★★★ 按排序和数量上限从媒体库中取少量项目，不拉取整个库 ★★★
+def get_emby_library_items_sample(
+    base_url: str,
+    api_key: str,
+    user_id: str,
+    library_id: str,
+    media_type_filter: str,
+    fields: str,
+    limit: int,
+    sort_by: Optional[str] = None,
+    sort_order: str = "Descending",
+    image_types: Optional[str] = None
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    用一次带 SortBy / Limit 的请求取回媒体库中排在最前的若干项目。
+    sort_by 为 "Random" 时由服务器随机抽样；image_types（如 "Primary,Backdrop"）只返回带有这些图片之一的项目。
+    请求失败返回 None。
+    """
+    if not all([base_url, api_key, user_id, library_id]):
+        logger.error("get_emby_library_items_sample: 参数不足。")
+        return None
+
+    api_url = f"{base_url.rstrip('/')}/Users/{user_id}/Items"
+    params = {
+        "api_key": api_key, "Recursive": "true", "ParentId": library_id,
+        "IncludeItemTypes": media_type_filter, "Fields": fields, "Limit": limit,
+    }
+    if sort_by:
+        params["SortBy"] = sort_by
+        params["SortOrder"] = sort_order
+    if image_types:
+        params["ImageTypes"] = image_types
+    try:
+        api_timeout = config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_EMBY_API_TIMEOUT, 60)
+        response = requests.get(api_url, params=params, timeout=api_timeout)
+        response.raise_for_status()
+        return response.json().get("Items", [])
+    except requests.exceptions.RequestException as e:
+        logger.error(f"抽样请求库 {library_id} 中的项目失败: {e}", exc_info=True)
+        return None
+# ★★★ 一次请求取回一批剧集各自的第一集 ★★★
+def get_first_episodes_for_series(
+    base_url: str,
+    api_key: str,
+    user_id: str,
+    series_ids: List[str],
+    fields: str = "SeriesId,MediaStreams,Path"
+) -> Optional[Dict[str, Dict[str, Any]]]:
+    """
+    用 AncestorIds 一次查询多部剧集的所有分集，返回 {剧集ID: 排序后的第一集}。
+    分集按 SortName 排序，取每部剧集排在最前的一集。请求失败返回 None。
+    """
+    if not all([base_url, api_key, user_id]):
+        return None
+    if not series_ids:
+        return {}
+
+    api_url = f"{base_url.rstrip('/')}/Users/{user_id}/Items"
+    params = {
+        "api_key": api_key,
+        "AncestorIds": ",".join(series_ids),
+        "IncludeItemTypes": "Episode",
+        "Recursive": "true",
+        "Fields": fields if "SeriesId" in fields else f"SeriesId,{fields}",
+        "SortBy": "SortName", "SortOrder": "Ascending",
+    }
+    try:
+        api_timeout = config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_EMBY_API_TIMEOUT, 60)
+        response = requests.get(api_url, params=params, timeout=api_timeout)
+        response.raise_for_status()
+        wanted = set(series_ids)
+        first_episodes: Dict[str, Dict[str, Any]] = {}
+        for episode in response.json().get("Items", []):
+            series_id = episode.get("SeriesId")
+            if series_id in wanted and series_id not in first_episodes:
+                first_episodes[series_id] = episode
+        return first_episodes
+    except requests.exceptions.RequestException as e:
+        logger.error(f"批量获取 {len(series_ids)} 部剧集的分集时发生错误: {e}", exc_info=True)
+        return None
 # ✨✨✨ 获取剧集下所有剧集的函数 ✨✨✨
 def get_series_children(
     series_id: str,
@@ -741,7 +878,8 @@ def download_emby_image(
     emby_server_url: str,
     emby_api_key: str,
     max_width: Optional[int] = None,
-    max_height: Optional[int] = None
+    max_height: Optional[int] = None,
+    image_tag: Optional[str] = None
 ) -> bool:
     if not all([item_id, image_type, save_path, emby_server_url, emby_api_key]):
         logger.error("download_emby_image: 参数不足。")
@@ -751,17 +889,23 @@ def download_emby_image(
     params = {"api_key": emby_api_key}
     if max_width: params["maxWidth"] = max_width
     if max_height: params["maxHeight"] = max_height
+    if image_tag: params["tag"] = image_tag
 
     logger.trace(f"准备下载图片: 类型='{image_type}', 从 URL: {image_url}")
     
+    tmp_path = f"{save_path}.tmp"
     try:
         # ★★★ 核心修改: 动态获取超时时间 ★★★
         api_timeout = config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_EMBY_API_TIMEOUT, 60)
         with requests.get(image_url, params=params, stream=True, timeout=api_timeout) as r:
             r.raise_for_status()
             os.makedirs(os.path.dirname(save_path), exist_ok=True)
-            with open(save_path, 'wb') as f:
-                shutil.copyfileobj(r.raw, f)
+            # 边下载边写入临时文件，完成后再原子替换，避免中断时留下半张图片
+            with open(tmp_path, 'wb') as f:
+                for chunk in r.iter_content(chunk_size=65536):
+                    if chunk:
+                        f.write(chunk)
+        os.replace(tmp_path, save_path)
         logger.trace(f"成功下载图片并保存到: {save_path}")
         return True
     except requests.exceptions.RequestException as e:
@@ -773,6 +917,12 @@ def download_emby_image(
     except Exception as e:
         logger.error(f"保存图片到 '{save_path}' 时发生未知错误: {e}")
         return False
+    finally:
+        if os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
 # --- 定时翻译演员 ---
 def prepare_actor_translation_data(
     emby_url: str,
@@ -993,31 +1143,29 @@ def get_collection_members(collection_id: str, base_url: str, api_key: str, user
         logger.error(f"获取合集 {collection_id} 成员时失败: {e}")
         return None
 
-def add_items_to_collection(collection_id: str, item_ids: List[str], base_url: str, api_key: str) -> bool:
+def _change_collection_membership(method: str, collection_id: str, item_ids: List[str], base_url: str, api_key: str) -> bool:
+    """按 COLLECTION_MEMBERSHIP_CHUNK_SIZE 分批向合集添加(POST)或移除(DELETE)成员，任何一批失败都返回 False。"""
     if not item_ids: return True
     api_url = f"{base_url.rstrip('/')}/Collections/{collection_id}/Items"
-    params = {'api_key': api_key, 'Ids': ",".join(item_ids)}
-    try:
-        # ★★★ 核心修改: 动态获取超时时间 ★★★
-        api_timeout = config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_EMBY_API_TIMEOUT, 60)
-        response = requests.post(api_url, params=params, timeout=api_timeout)
-        response.raise_for_status()
-        return True
-    except requests.RequestException:
-        return False
+    # ★★★ 核心修改: 动态获取超时时间 ★★★
+    api_timeout = config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_EMBY_API_TIMEOUT, 60)
+    all_ok = True
+    for i in range(0, len(item_ids), COLLECTION_MEMBERSHIP_CHUNK_SIZE):
+        chunk = item_ids[i:i + COLLECTION_MEMBERSHIP_CHUNK_SIZE]
+        params = {'api_key': api_key, 'Ids': ",".join(chunk)}
+        try:
+            response = requests.request(method, api_url, params=params, timeout=api_timeout)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            logger.error(f"  -> 合集 {collection_id} 成员变更 ({method}) 的第 {i // COLLECTION_MEMBERSHIP_CHUNK_SIZE + 1} 批失败: {e}")
+            all_ok = False
+    return all_ok
+
+def add_items_to_collection(collection_id: str, item_ids: List[str], base_url: str, api_key: str) -> bool:
+    return _change_collection_membership('POST', collection_id, item_ids, base_url, api_key)
 
 def remove_items_from_collection(collection_id: str, item_ids: List[str], base_url: str, api_key: str) -> bool:
-    if not item_ids: return True
-    api_url = f"{base_url.rstrip('/')}/Collections/{collection_id}/Items"
-    params = {'api_key': api_key, 'Ids': ",".join(item_ids)}
-    try:
-        # ★★★ 核心修改: 动态获取超时时间 ★★★
-        api_timeout = config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_EMBY_API_TIMEOUT, 60)
-        response = requests.delete(api_url, params=params, timeout=api_timeout)
-        response.raise_for_status()
-        return True
-    except requests.RequestException:
-        return False
+    return _change_collection_membership('DELETE', collection_id, item_ids, base_url, api_key)
 
 def empty_collection_in_emby(collection_id: str, base_url: str, api_key: str, user_id: str) -> bool:
     logger.trace(f"  -> 开始清空 Emby 合集 {collection_id} 的所有成员...")
@@ -1070,16 +1218,19 @@ def create_or_update_collection_with_emby_ids(
             set_current = set(current_emby_ids)
             set_desired = set(desired_emby_ids)
             
-            ids_to_remove = list(set_current - set_desired)
-            ids_to_add = list(set_desired - set_current)
+            # 只发送差异部分；保持榜单顺序，并去掉重复ID
+            ids_to_remove = [emby_id for emby_id in dict.fromkeys(current_emby_ids) if emby_id not in set_desired]
+            ids_to_add = [emby_id for emby_id in dict.fromkeys(desired_emby_ids) if emby_id not in set_current]
 
             if ids_to_remove:
                 logger.info(f"  -> 发现 {len(ids_to_remove)} 个项目需要移除...")
-                remove_items_from_collection(emby_collection_id, ids_to_remove, base_url, api_key)
+                if not remove_items_from_collection(emby_collection_id, ids_to_remove, base_url, api_key):
+                    logger.warning(f"  -> 合集 '{collection_name}' 部分成员移除失败，将在下次同步时重试。")
             
             if ids_to_add:
                 logger.info(f"  -> 发现 {len(ids_to_add)} 个新项目需要添加...")
-                add_items_to_collection(emby_collection_id, ids_to_add, base_url, api_key)
+                if not add_items_to_collection(emby_collection_id, ids_to_add, base_url, api_key):
+                    logger.warning(f"  -> 合集 '{collection_name}' 部分成员添加失败，将在下次同步时重试。")
 
             if not ids_to_remove and not ids_to_add:
                 logger.info("  -> 合集内容已是最新，无需改动。")
@@ -1093,7 +1244,10 @@ def create_or_update_collection_with_emby_ids(
 
             api_url = f"{base_url.rstrip('/')}/Collections"
             params = {'api_key': api_key}
-            payload = {'Name': collection_name, 'Ids': ",".join(desired_emby_ids)}
+            # 创建时只携带第一批成员，其余分批追加
+            unique_desired_ids = list(dict.fromkeys(desired_emby_ids))
+            initial_ids = unique_desired_ids[:COLLECTION_MEMBERSHIP_CHUNK_SIZE]
+            payload = {'Name': collection_name, 'Ids': ",".join(initial_ids)}
             
             # ★★★ 核心修改: 动态获取超时时间 ★★★
             api_timeout = config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_EMBY_API_TIMEOUT, 60)
@@ -1101,6 +1255,11 @@ def create_or_update_collection_with_emby_ids(
             response.raise_for_status()
             new_collection_info = response.json()
             emby_collection_id = new_collection_info.get('Id')
+
+            remaining_ids = unique_desired_ids[COLLECTION_MEMBERSHIP_CHUNK_SIZE:]
+            if emby_collection_id and remaining_ids:
+                if not add_items_to_collection(emby_collection_id, remaining_ids, base_url, api_key):
+                    logger.warning(f"  -> 合集 '{collection_name}' 部分成员添加失败，将在下次同步时重试。")
             
             return emby_collection_id
 
@@ -1137,6 +1296,40 @@ def get_emby_items_by_id(
         logger.error(f"根据ID列表批量获取Emby项目时失败: {e}")
         return []
     
+def get_emby_items_map_by_ids(
+    base_url: str,
+    api_key: str,
+    user_id: str,
+    item_ids: List[str],
+    fields: Optional[str] = None,
+    chunk_size: int = 200
+) -> Optional[Dict[str, Dict[str, Any]]]:
+    """
+    分批按 ID 查询项目，返回 {Id: 项目}。不在结果中的 ID 即 Emby 中已不存在。
+    与 get_emby_items_by_id 不同，任何一批请求失败都返回 None，调用方可据此区分“不存在”和“查询失败”。
+    """
+    if not all([base_url, api_key, user_id]):
+        return None
+    api_url = f"{base_url.rstrip('/')}/Users/{user_id}/Items"
+    api_timeout = config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_EMBY_API_TIMEOUT, 60)
+    items_map: Dict[str, Dict[str, Any]] = {}
+    for i in range(0, len(item_ids), chunk_size):
+        params = {
+            "api_key": api_key,
+            "Ids": ",".join(item_ids[i:i + chunk_size]),
+            "Fields": fields or "Id,Name"
+        }
+        try:
+            response = requests.get(api_url, params=params, timeout=api_timeout)
+            response.raise_for_status()
+            for item in response.json().get("Items", []):
+                if item.get("Id"):
+                    items_map[item["Id"]] = item
+        except requests.exceptions.RequestException as e:
+            logger.error(f"根据ID列表批量查询Emby项目时失败: {e}")
+            return None
+    return items_map
+
 def append_item_to_collection(collection_id: str, item_emby_id: str, base_url: str, api_key: str, user_id: str) -> bool:
     logger.trace(f"准备将项目 {item_emby_id} 追加到合集 {collection_id}...")
     
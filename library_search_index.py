@@ -0,0 +1,191 @@
+# library_search_index.py
+# 基于 media_metadata 的本地片名搜索索引，供 WebUI 的媒体库搜索使用，避免每次按键都让 Emby 全库搜索。
+
+import bisect
+import threading
+import time
+from typing import Optional, Dict, Any, List, Tuple
+
+import db_handler
+from utils import contains_chinese, normalize_name_for_matching
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    from pypinyin import lazy_pinyin, Style
+    PYPINYIN_AVAILABLE = True
+except ImportError:
+    PYPINYIN_AVAILABLE = False
+
+# 两次检查数据库是否有变化之间的最短间隔（秒）
+SIGNATURE_CHECK_INTERVAL_SECONDS = 30
+# 单次查询最多扫描的命中位置数，防止单字符查询在大库里扫描过久
+MAX_SCAN_HITS = 5000
+
+# 条目内不同写法之间的分隔符、条目之间的分隔符
+_VARIANT_SEP = "\x01"
+_ENTRY_SEP = "\x00"
+
+
+def _title_variants(title: Optional[str], original_title: Optional[str], pinyin_cache: Dict[str, Tuple[str, ...]]) -> List[str]:
+    """生成一个条目可被搜索到的所有标准化写法：标题、原标题，以及中文标题的全拼和首字母。"""
+    variants: List[str] = []
+    for raw in (title, original_title):
+        if not raw:
+            continue
+        cached = pinyin_cache.get(raw)
+        if cached is None:
+            forms = [normalize_name_for_matching(raw)]
+            if PYPINYIN_AVAILABLE and contains_chinese(raw):
+                syllables = [normalize_name_for_matching(s) for s in lazy_pinyin(raw, style=Style.NORMAL)]
+                syllables = [s for s in syllables if s]
+                forms.append("".join(syllables))
+                forms.append("".join(s[0] for s in syllables))
+            cached = tuple(forms)
+            pinyin_cache[raw] = cached
+        for form in cached:
+            if form and form not in variants:
+                variants.append(form)
+    return variants
+
+
+class _IndexSnapshot:
+    """一次构建好的只读索引；所有写法拼成一个大字符串，用 str.find 在 C 层完成子串扫描。"""
+
+    def __init__(self, entries: List[Dict[str, Any]], keys: List[str]):
+        self.entries = entries
+        self.starts: List[int] = []
+        parts = []
+        offset = 0
+        for key in keys:
+            parts.append(_ENTRY_SEP)
+            offset += 1
+            self.starts.append(offset)
+            parts.append(key)
+            offset += len(key)
+        self.haystack = "".join(parts)
+
+    def search(self, normalized_query: str, limit: int) -> List[Dict[str, Any]]:
+        # 记录每个条目的最佳命中：前缀匹配优先，其次是子串匹配
+        best: Dict[int, int] = {}
+        haystack = self.haystack
+        pos = haystack.find(normalized_query)
+        scanned = 0
+        while pos != -1 and scanned < MAX_SCAN_HITS:
+            scanned += 1
+            entry_index = bisect.bisect_right(self.starts, pos) - 1
+            rank = 0 if haystack[pos - 1] in (_ENTRY_SEP, _VARIANT_SEP) else 1
+            if rank < best.get(entry_index, 2):
+                best[entry_index] = rank
+            pos = haystack.find(normalized_query, pos + 1)
+
+        ordered = sorted(best.items(), key=lambda kv: (kv[1], len(self.entries[kv[0]]["Name"] or ""), kv[0]))
+        return [self.entries[i] for i, _ in ordered[:limit]]
+
+
+class LibrarySearchIndex:
+    """
+    本地片名索引。数据来自 media_metadata（需要 emby_item_id 列），
+    定期用一条聚合查询检查表是否变化，变化时在后台线程重建，重建期间继续使用旧索引。
+    """
+
+    def __init__(self):
+        self._snapshot: Optional[_IndexSnapshot] = None
+        self._signature = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self._building = False
+        self._pinyin_cache: Dict[str, Tuple[str, ...]] = {}
+
+    def _fetch_signature(self):
+        with db_handler.get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT COUNT(*) AS total, MAX(last_updated_at) AS updated, MAX(last_synced_at) AS synced
+                FROM media_metadata WHERE emby_item_id IS NOT NULL
+            """)
+            row = cursor.fetchone()
+            return (row['total'], row['updated'], row['synced'])
+
+    def _build(self, signature):
+        try:
+            with db_handler.get_db_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT emby_item_id, tmdb_id, item_type, title, original_title, release_year
+                    FROM media_metadata
+                    WHERE emby_item_id IS NOT NULL AND item_type IN ('Movie', 'Series')
+                """)
+                rows = cursor.fetchall()
+
+            entries, keys = [], []
+            pinyin_cache: Dict[str, Tuple[str, ...]] = {}
+            old_cache = self._pinyin_cache
+            for row in rows:
+                for raw in (row['title'], row['original_title']):
+                    if raw and raw in old_cache:
+                        pinyin_cache[raw] = old_cache[raw]
+                variants = _title_variants(row['title'], row['original_title'], pinyin_cache)
+                if not variants:
+                    continue
+                entries.append({
+                    "Id": row['emby_item_id'],
+                    "Name": row['title'] or row['original_title'],
+                    "Type": row['item_type'],
+                    "ProductionYear": row['release_year'],
+                    "ProviderIds": {"Tmdb": row['tmdb_id']} if row['tmdb_id'] else {},
+                })
+                keys.append(_VARIANT_SEP.join(variants))
+
+            snapshot = _IndexSnapshot(entries, keys)
+            with self._lock:
+                self._snapshot = snapshot
+                self._signature = signature
+                self._pinyin_cache = pinyin_cache
+            logger.debug(f"本地媒体搜索索引已重建，共 {len(entries)} 个条目。")
+        except Exception as e:
+            logger.error(f"构建本地媒体搜索索引失败: {e}", exc_info=True)
+        finally:
+            with self._lock:
+                self._building = False
+
+    def _ensure_fresh(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._building or now - self._last_check < SIGNATURE_CHECK_INTERVAL_SECONDS:
+                return
+            self._last_check = now
+        try:
+            signature = self._fetch_signature()
+        except Exception as e:
+            logger.warning(f"检查本地媒体搜索索引是否过期失败: {e}")
+            return
+        with self._lock:
+            if signature == self._signature or self._building:
+                return
+            self._building = True
+        threading.Thread(target=self._build, args=(signature,), daemon=True).start()
+
+    def invalidate(self):
+        """让下一次搜索立即检查数据库是否有变化。"""
+        with self._lock:
+            self._last_check = 0.0
+
+    def search(self, query: str, limit: int = 100) -> Optional[List[Dict[str, Any]]]:
+        """
+        在本地索引中搜索，返回与 Emby 搜索结果同结构的字典列表。
+        返回 None 表示索引尚不可用（首次构建中或表里还没有 Emby ID），调用方应回退到 Emby。
+        """
+        self._ensure_fresh()
+        with self._lock:
+            snapshot = self._snapshot
+        if snapshot is None or not snapshot.entries:
+            return None
+        normalized_query = normalize_name_for_matching(query)
+        if not normalized_query:
+            return []
+        return snapshot.search(normalized_query, limit)
+
+
+library_search_index = LibrarySearchIndex()
@@ -2,34 +2,115 @@
 
 import requests
 import logging
-from typing import Dict, Any, Optional
+import time
+import json
+import base64
+import threading
+from typing import Dict, Any, Optional, Tuple
+from requests.adapters import HTTPAdapter
 
 # 从你的常量模块导入，这不会造成循环
 import constants 
 
 logger = logging.getLogger(__name__)
 
+# 登录接口没有返回过期时间、也无法从 Token 中解析时，按这个时长缓存 Token（秒）
+DEFAULT_TOKEN_TTL_SECONDS = 30 * 60
+# 在 Token 过期前这么多秒就提前重新登录
+TOKEN_REFRESH_MARGIN_SECONDS = 60
+
+class _MoviePilotClient:
+    """
+    MoviePilot API 客户端：复用连接池，缓存 access token 直到过期，遇到 401 时重新登录一次再重试。
+    同一组 (地址, 用户名, 密码) 共享一个实例，可被多个线程同时使用。
+    """
+
+    def __init__(self, base_url: str, username: str, password: str):
+        self.base_url = base_url
+        self._username = username
+        self._password = password
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=10)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._token: Optional[str] = None
+        self._token_expires_at = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _token_lifetime(login_json: Dict[str, Any], token: str) -> float:
+        if login_json.get("expires_in"):
+            return float(login_json["expires_in"])
+        # MoviePilot 的 Token 是 JWT，尝试读取其中的 exp（只读取，不校验签名）
+        try:
+            payload_part = token.split(".")[1]
+            payload = json.loads(base64.urlsafe_b64decode(payload_part + "=" * (-len(payload_part) % 4)))
+            if payload.get("exp"):
+                return float(payload["exp"]) - time.time()
+        except Exception:
+            pass
+        return DEFAULT_TOKEN_TTL_SECONDS
+
+    def _get_token(self, stale_token: Optional[str] = None) -> Optional[str]:
+        with self._lock:
+            # 其他线程已经换过 Token 时直接使用新的
+            if self._token and self._token != stale_token and time.monotonic() < self._token_expires_at:
+                return self._token
+            login_url = f"{self.base_url}/api/v1/login/access-token"
+            login_response = self.session.post(login_url, data={"username": self._username, "password": self._password}, timeout=10)
+            login_response.raise_for_status()
+            login_json = login_response.json()
+            token = login_json.get("access_token")
+            if not token:
+                self._token = None
+                return None
+            lifetime = self._token_lifetime(login_json, token)
+            self._token = token
+            self._token_expires_at = time.monotonic() + max(0.0, lifetime - TOKEN_REFRESH_MARGIN_SECONDS)
+            logger.debug("  -> 已登录 MoviePilot 并缓存 Token。")
+            return token
+
+    def subscribe(self, payload: Dict[str, Any]) -> Optional[requests.Response]:
+        """提交订阅。返回 None 表示认证失败、拿不到 Token。"""
+        token = self._get_token()
+        if not token:
+            return None
+        subscribe_url = f"{self.base_url}/api/v1/subscribe/"
+        response = self.session.post(subscribe_url, headers={"Authorization": f"Bearer {token}"}, json=payload, timeout=15)
+        if response.status_code == 401:
+            logger.debug("  -> MoviePilot Token 已失效，重新登录后重试。")
+            token = self._get_token(stale_token=token)
+            if not token:
+                return None
+            response = self.session.post(subscribe_url, headers={"Authorization": f"Bearer {token}"}, json=payload, timeout=15)
+        return response
+
+_clients: Dict[Tuple[str, str, str], _MoviePilotClient] = {}
+_clients_lock = threading.Lock()
+
+def _get_client(config: Dict[str, Any]) -> Optional[_MoviePilotClient]:
+    """按当前配置取得共享的客户端；配置不完整时返回 None。"""
+    moviepilot_url = config.get(constants.CONFIG_OPTION_MOVIEPILOT_URL, '').rstrip('/')
+    mp_username = config.get(constants.CONFIG_OPTION_MOVIEPILOT_USERNAME, '')
+    mp_password = config.get(constants.CONFIG_OPTION_MOVIEPILOT_PASSWORD, '')
+    if not all([moviepilot_url, mp_username, mp_password]):
+        return None
+    key = (moviepilot_url, mp_username, mp_password)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _MoviePilotClient(moviepilot_url, mp_username, mp_password)
+            _clients[key] = client
+        return client
+
 def subscribe_movie_to_moviepilot(movie_info: dict, config: Dict[str, Any], best_version: Optional[int] = None) -> bool:
     """【洗版增强版】一个独立的、可复用的函数，用于订阅单部电影到MoviePilot。"""
     try:
-        moviepilot_url = config.get(constants.CONFIG_OPTION_MOVIEPILOT_URL, '').rstrip('/')
-        mp_username = config.get(constants.CONFIG_OPTION_MOVIEPILOT_USERNAME, '')
-        mp_password = config.get(constants.CONFIG_OPTION_MOVIEPILOT_PASSWORD, '')
-        if not all([moviepilot_url, mp_username, mp_password]):
+        client = _get_client(config)
+        if not client:
             logger.warning("MoviePilot订阅跳过：配置不完整。")
             return False
 
-        login_url = f"{moviepilot_url}/api/v1/login/access-token"
-        login_data = {"username": mp_username, "password": mp_password}
-        login_response = requests.post(login_url, data=login_data, timeout=10)
-        login_response.raise_for_status()
-        access_token = login_response.json().get("access_token")
-        if not access_token:
-            logger.error("MoviePilot订阅失败：认证失败，未能获取到 Token。")
-            return False
-
-        subscribe_url = f"{moviepilot_url}/api/v1/subscribe/"
-        subscribe_headers = {"Authorization": f"Bearer {access_token}"}
         subscribe_payload = {
             "name": movie_info['title'],
             "tmdbid": int(movie_info['tmdb_id']),
@@ -41,7 +122,10 @@ def subscribe_movie_to_moviepilot(movie_info: dict, config: Dict[str, Any], best
             logger.info(f"  -> 本次订阅为洗版订阅")
         
         logger.info(f"  -> 正在向 MoviePilot 提交订阅: '{movie_info['title']}'")
-        sub_response = requests.post(subscribe_url, headers=subscribe_headers, json=subscribe_payload, timeout=15)
+        sub_response = client.subscribe(subscribe_payload)
+        if sub_response is None:
+            logger.error("MoviePilot订阅失败：认证失败，未能获取到 Token。")
+            return False
         
         if sub_response.status_code in [200, 201, 204]:
             logger.info(f"  -> ✅ MoviePilot 已接受订阅任务。")
@@ -56,29 +140,16 @@ def subscribe_movie_to_moviepilot(movie_info: dict, config: Dict[str, Any], best
 def subscribe_series_to_moviepilot(series_info: dict, season_number: Optional[int], config: Dict[str, Any], best_version: Optional[int] = None) -> bool:
     """【V4 - 洗版订阅增强版】一个独立的、可复用的函数，用于订阅单季或整部剧集到MoviePilot。"""
     try:
-        moviepilot_url = config.get(constants.CONFIG_OPTION_MOVIEPILOT_URL, '').rstrip('/')
-        mp_username = config.get(constants.CONFIG_OPTION_MOVIEPILOT_USERNAME, '')
-        mp_password = config.get(constants.CONFIG_OPTION_MOVIEPILOT_PASSWORD, '')
-        if not all([moviepilot_url, mp_username, mp_password]):
+        client = _get_client(config)
+        if not client:
             logger.warning("MoviePilot订阅跳过：配置不完整。")
             return False
 
-        login_url = f"{moviepilot_url}/api/v1/login/access-token"
-        login_data = {"username": mp_username, "password": mp_password}
-        login_response = requests.post(login_url, data=login_data, timeout=10)
-        login_response.raise_for_status()
-        access_token = login_response.json().get("access_token")
-        if not access_token:
-            logger.error("MoviePilot订阅失败：认证失败，未能获取到 Token。")
-            return False
-
         series_title = series_info.get('title') or series_info.get('item_name')
         if not series_title:
             logger.error(f"MoviePilot订阅失败：传入的 series_info 字典中缺少 'title' 或 'item_name' 键。字典内容: {series_info}")
             return False
 
-        subscribe_url = f"{moviepilot_url}/api/v1/subscribe/"
-        subscribe_headers = {"Authorization": f"Bearer {access_token}"}
         subscribe_payload = {
             "name": series_title,
             "tmdbid": int(series_info['tmdb_id']),
@@ -96,7 +167,10 @@ def subscribe_series_to_moviepilot(series_info: dict, season_number: Optional[in
             log_message += f" 第 {season_number} 季"
         logger.info(log_message)
         
-        sub_response = requests.post(subscribe_url, headers=subscribe_headers, json=subscribe_payload, timeout=15)
+        sub_response = client.subscribe(subscribe_payload)
+        if sub_response is None:
+            logger.error("MoviePilot订阅失败：认证失败，未能获取到 Token。")
+            return False
         
         if sub_response.status_code in [200, 201, 204]:
             logger.info(f"  -> ✅ MoviePilot 已接受订阅任务。")
@@ -116,27 +190,16 @@ def subscribe_series_to_moviepilot(series_info: dict, season_number: Optional[in
 def subscribe_with_custom_payload(payload: dict, config: Dict[str, Any]) -> bool:
     """一个通用的订阅函数，直接接收一个完整的订阅 payload。"""
     try:
-        moviepilot_url = config.get(constants.CONFIG_OPTION_MOVIEPILOT_URL, '').rstrip('/')
-        mp_username = config.get(constants.CONFIG_OPTION_MOVIEPILOT_USERNAME, '')
-        mp_password = config.get(constants.CONFIG_OPTION_MOVIEPILOT_PASSWORD, '')
-        if not all([moviepilot_url, mp_username, mp_password]):
+        client = _get_client(config)
+        if not client:
             logger.warning("MoviePilot订阅跳过：配置不完整。")
             return False
-
-        login_url = f"{moviepilot_url}/api/v1/login/access-token"
-        login_data = {"username": mp_username, "password": mp_password}
-        login_response = requests.post(login_url, data=login_data, timeout=10)
-        login_response.raise_for_status()
-        access_token = login_response.json().get("access_token")
-        if not access_token:
-            logger.error("MoviePilot订阅失败：认证失败，未能获取到 Token。")
-            return False
-
-        subscribe_url = f"{moviepilot_url}/api/v1/subscribe/"
-        subscribe_headers = {"Authorization": f"Bearer {access_token}"}
         
         # 直接使用传入的 payload
-        sub_response = requests.post(subscribe_url, headers=subscribe_headers, json=payload, timeout=15)
+        sub_response = client.subscribe(payload)
+        if sub_response is None:
+            logger.error("MoviePilot订阅失败：认证失败，未能获取到 Token。")
+            return False
         
         if sub_response.status_code in [200, 201, 204]:
             logger.info(f"  -> ✅ MoviePilot 已接受订阅任务。")
@@ -8,6 +8,10 @@ from flask import Flask, request, Response
 from urllib.parse import urlparse, urlunparse
 import time
 import uuid # <-- 确保导入
+import hashlib
+import threading
+from typing import Dict, Any, List, Tuple
+from cachetools import TTLCache
 from gevent import spawn
 from geventwebsocket.websocket import WebSocket
 from websocket import create_connection
@@ -53,95 +57,163 @@ def _get_real_emby_url_and_key():
         raise ValueError("Emby服务器地址或API Key未配置")
     return base_url, api_key
 
+# --- /Views 响应缓存 ---
+VIEWS_REVALIDATE_SECONDS = 5     # 在此间隔内直接复用已生成的响应，连数据库都不查
+NATIVE_VIEWS_CACHE_TTL = 300     # 原生媒体库列表、合集封面标签向 Emby 重新获取的间隔
+_native_views_cache = TTLCache(maxsize=64, ttl=NATIVE_VIEWS_CACHE_TTL)
+_views_response_cache: Dict[str, Dict[str, Any]] = {}
+_views_cache_lock = threading.Lock()
+_VIEW_UUID_NAMESPACE = uuid.UUID("6f1c1d2e-8a4b-4c53-9a57-2f7a2b1c0e11")
+
+def _get_native_views_and_cover_tags(user_id: str, real_collection_ids: List[str], should_merge_native: bool) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
+    """
+    获取(带缓存)用户的原生媒体库列表，以及各真实 Emby 合集当前的封面 ImageTag。
+    封面标签取自 Emby 本身，封面真正更新时才会变化，客户端因此可以放心缓存图片。
+    """
+    cache_key = (user_id, should_merge_native, tuple(real_collection_ids))
+    with _views_cache_lock:
+        cached = _native_views_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    base_url = config_manager.APP_CONFIG.get("emby_server_url", "")
+    api_key = config_manager.APP_CONFIG.get("emby_api_key", "")
+    native_views: List[Dict[str, Any]] = []
+    if should_merge_native and user_id:
+        native_views = emby_handler.get_emby_libraries(base_url, api_key, user_id)
+        if native_views is None:
+            # 获取失败不缓存，下次请求重试
+            return [], {}
+
+    cover_tags: Dict[str, str] = {}
+    if real_collection_ids and user_id:
+        for item in emby_handler.get_emby_items_by_id(base_url, api_key, user_id, real_collection_ids, fields="ImageTags"):
+            primary_tag = (item.get("ImageTags") or {}).get("Primary")
+            if item.get("Id") and primary_tag:
+                cover_tags[item["Id"]] = primary_tag
+
+    result = (native_views, cover_tags)
+    with _views_cache_lock:
+        _native_views_cache[cache_key] = result
+    return result
+
+def _build_fake_view(coll: Dict[str, Any], real_server_id: str, cover_tags: Dict[str, str]) -> Dict[str, Any]:
+    db_id = coll['id']
+    real_emby_collection_id = coll['emby_collection_id']
+    mimicked_id = to_mimicked_id(db_id)
+    # 图片标签由封面内容决定：封面不变，标签不变，客户端就会直接使用本地缓存
+    cover_version = cover_tags.get(real_emby_collection_id) or real_emby_collection_id
+    image_tags = {"Primary": f"{real_emby_collection_id}?v={cover_version}"}
+
+    # ★★★ 核心修复：直接使用已经是字典的 definition_json 字段 ★★★
+    definition = coll.get('definition_json') or {}
+    
+    merged_libraries = definition.get('merged_libraries', [])
+    name_suffix = f" (合并库: {len(merged_libraries)}个)" if merged_libraries else ""
+    
+    item_type_from_db = definition.get('item_type', 'Movie')
+    if isinstance(item_type_from_db, list) and len(item_type_from_db) > 1:
+        collection_type = "mixed"
+    else:
+        authoritative_type = item_type_from_db[0] if isinstance(item_type_from_db, list) and item_type_from_db else item_type_from_db if isinstance(item_type_from_db, str) else 'Movie'
+        collection_type = "tvshows" if authoritative_type == 'Series' else "movies"
+
+    view_name = coll['name'] + name_suffix
+    # Guid / Etag 等都由内容确定性地生成，重复请求得到完全相同的结果
+    stable_guid = str(uuid.uuid5(_VIEW_UUID_NAMESPACE, f"custom-{db_id}"))
+    view_etag = hashlib.md5(f"{db_id}|{view_name}|{collection_type}|{image_tags['Primary']}".encode('utf-8')).hexdigest()
+
+    return {
+        "Name": view_name, 
+        "ServerId": real_server_id, 
+        "Id": mimicked_id,
+        "Guid": stable_guid,
+        "Etag": view_etag,
+        "DateCreated": "2025-01-01T00:00:00.0000000Z", 
+        "CanDelete": False, 
+        "CanDownload": False,
+        "SortName": coll['name'], 
+        "ExternalUrls": [], 
+        "ProviderIds": {}, 
+        "IsFolder": True,
+        "ParentId": "2", 
+        "Type": "CollectionFolder",  # 1. 改为 CollectionFolder
+        "PresentationUniqueKey": stable_guid, # 2. 增加 PresentationUniqueKey
+        "DisplayPreferencesId": f"custom-{db_id}", # 3. DisplayPreferencesId 保持不变或改为Guid都可以
+        "ForcedSortName": coll['name'], # 4. 增加 ForcedSortName
+        "Taglines": [], # 5. 增加空的 Taglines
+        "RemoteTrailers": [], # 6. 增加空的 RemoteTrailers
+        "UserData": {"PlaybackPositionTicks": 0, "IsFavorite": False, "Played": False},
+        "ChildCount": 1, 
+        "PrimaryImageAspectRatio": 1.7777777777777777, 
+        "CollectionType": collection_type,
+        "ImageTags": image_tags, 
+        "BackdropImageTags": [], 
+        "LockedFields": [], 
+        "LockData": False
+    }
+
+def _views_response(entry: Dict[str, Any]) -> Response:
+    """按 If-None-Match 决定返回 304 还是完整内容。"""
+    etag = entry['etag']
+    client_etags = [t.strip().removeprefix('W/').strip('"') for t in request.headers.get('If-None-Match', '').split(',')]
+    if etag in client_etags or '*' in client_etags:
+        response = Response(status=304)
+    else:
+        response = Response(entry['body'], mimetype='application/json')
+    response.headers['ETag'] = f'"{etag}"'
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
 def handle_get_views():
     """
-    【V2 - PG JSON 兼容版】
-    - 修复了因 psycopg2 自动解析 JSON 字段而导致的 TypeError。
+    【V3 - 缓存版】
+    - 合并后的视图按用户缓存：短时间内的重复请求直接复用；之后只用一条轻量查询检查合集是否变化，
+      原生媒体库和封面标签按 NATIVE_VIEWS_CACHE_TTL 向 Emby 刷新。
+    - Guid、Etag、ImageTags 都由内容生成，并支持 If-None-Match 返回 304。
     """
     real_server_id = extensions.EMBY_SERVER_ID
     if not real_server_id:
         return "Proxy is not ready", 503
 
     try:
-        collections = db_handler.get_all_active_custom_collections()
-        fake_views_items = []
+        user_id_match = re.search(r'/emby/Users/([^/]+)/Views', request.path)
+        user_id = user_id_match.group(1) if user_id_match else ""
+
+        should_merge_native = config_manager.APP_CONFIG.get('proxy_merge_native_libraries', True)
+        raw_selection = config_manager.APP_CONFIG.get('proxy_native_view_selection', '')
+        selected_native_view_ids = [x.strip() for x in raw_selection.split(',') if x.strip()] if isinstance(raw_selection, str) else (raw_selection or [])
+        native_order = config_manager.APP_CONFIG.get('proxy_native_view_order', 'before')
+        config_key = (real_server_id, bool(should_merge_native), tuple(selected_native_view_ids), native_order)
+
+        now = time.monotonic()
+        with _views_cache_lock:
+            cached = _views_response_cache.get(user_id)
+        if cached and cached['config_key'] == config_key and now - cached['checked_at'] < VIEWS_REVALIDATE_SECONDS:
+            return _views_response(cached)
+
+        collections = db_handler.get_active_custom_collections_for_views()
+        visible_collections = []
         for coll in collections:
-            real_emby_collection_id = coll.get('emby_collection_id')
-            if not real_emby_collection_id:
+            if not coll.get('emby_collection_id'):
                 logger.debug(f"  -> 虚拟库 '{coll['name']}' (ID: {coll['id']}) 因无对应的真实Emby合集而被隐藏。")
                 continue
+            visible_collections.append(coll)
 
-            db_id = coll['id']
-            mimicked_id = to_mimicked_id(db_id)
-            image_tags = {"Primary": f"{real_emby_collection_id}?timestamp={int(time.time())}"}
-
-            # ★★★ 核心修复：直接使用已经是字典的 definition_json 字段 ★★★
-            definition = coll.get('definition_json') or {}
-            
-            merged_libraries = definition.get('merged_libraries', [])
-            name_suffix = f" (合并库: {len(merged_libraries)}个)" if merged_libraries else ""
-            
-            item_type_from_db = definition.get('item_type', 'Movie')
-            if isinstance(item_type_from_db, list) and len(item_type_from_db) > 1:
-                collection_type = "mixed"
-            else:
-                authoritative_type = item_type_from_db[0] if isinstance(item_type_from_db, list) and item_type_from_db else item_type_from_db if isinstance(item_type_from_db, str) else 'Movie'
-                collection_type = "tvshows" if authoritative_type == 'Series' else "movies"
-
-            fake_view = {
-                "Name": coll['name'] + name_suffix, 
-                "ServerId": real_server_id, 
-                "Id": mimicked_id,
-                "Guid": str(uuid.uuid4()), # 我们会用这个Guid
-                "Etag": f"{db_id}{int(time.time())}",
-                "DateCreated": "2025-01-01T00:00:00.0000000Z", 
-                "CanDelete": False, 
-                "CanDownload": False,
-                "SortName": coll['name'], 
-                "ExternalUrls": [], 
-                "ProviderIds": {}, 
-                "IsFolder": True,
-                "ParentId": "2", 
-                "Type": "CollectionFolder",  # 1. 改为 CollectionFolder
-                "PresentationUniqueKey": str(uuid.uuid4()), # 2. 增加 PresentationUniqueKey
-                "DisplayPreferencesId": f"custom-{db_id}", # 3. DisplayPreferencesId 保持不变或改为Guid都可以
-                "ForcedSortName": coll['name'], # 4. 增加 ForcedSortName
-                "Taglines": [], # 5. 增加空的 Taglines
-                "RemoteTrailers": [], # 6. 增加空的 RemoteTrailers
-                "UserData": {"PlaybackPositionTicks": 0, "IsFavorite": False, "Played": False},
-                "ChildCount": 1, 
-                "PrimaryImageAspectRatio": 1.7777777777777777, 
-                "CollectionType": collection_type,
-                "ImageTags": image_tags, 
-                "BackdropImageTags": [], 
-                "LockedFields": [], 
-                "LockData": False
-            }
-            fake_views_items.append(fake_view)
-        
+        native_views, cover_tags = _get_native_views_and_cover_tags(
+            user_id, [c['emby_collection_id'] for c in visible_collections], should_merge_native
+        )
+        fake_views_items = [_build_fake_view(coll, real_server_id, cover_tags) for coll in visible_collections]
         logger.debug(f"已生成 {len(fake_views_items)} 个虚拟库。")
 
         native_views_items = []
-        should_merge_native = config_manager.APP_CONFIG.get('proxy_merge_native_libraries', True)
         if should_merge_native:
-            user_id_match = re.search(r'/emby/Users/([^/]+)/Views', request.path)
-            if user_id_match:
-                user_id = user_id_match.group(1)
-                all_native_views = emby_handler.get_emby_libraries(
-                    config_manager.APP_CONFIG.get("emby_server_url", ""),
-                    config_manager.APP_CONFIG.get("emby_api_key", ""),
-                    user_id
-                )
-                if all_native_views is None: all_native_views = []
-                raw_selection = config_manager.APP_CONFIG.get('proxy_native_view_selection', '')
-                selected_native_view_ids = [x.strip() for x in raw_selection.split(',') if x.strip()] if isinstance(raw_selection, str) else raw_selection
-                if not selected_native_view_ids:
-                    native_views_items = all_native_views
-                else:
-                    native_views_items = [view for view in all_native_views if view.get("Id") in selected_native_view_ids]
+            if not selected_native_view_ids:
+                native_views_items = native_views
+            else:
+                native_views_items = [view for view in native_views if view.get("Id") in selected_native_view_ids]
         
         final_items = []
-        native_order = config_manager.APP_CONFIG.get('proxy_native_view_order', 'before')
         if native_order == 'after':
             final_items.extend(fake_views_items)
             final_items.extend(native_views_items)
@@ -150,7 +222,16 @@ def handle_get_views():
             final_items.extend(fake_views_items)
 
         final_response = {"Items": final_items, "TotalRecordCount": len(final_items)}
-        return Response(json.dumps(final_response), mimetype='application/json')
+        body = json.dumps(final_response)
+        entry = {
+            "config_key": config_key,
+            "checked_at": now,
+            "body": body,
+            "etag": hashlib.sha1(body.encode('utf-8')).hexdigest(),
+        }
+        with _views_cache_lock:
+            _views_response_cache[user_id] = entry
+        return _views_response(entry)
         
     except Exception as e:
         logger.error(f"[PROXY] 获取视图数据时出错: {e}", exc_info=True)
@@ -242,7 +323,7 @@ def handle_mimicked_library_metadata_endpoint(path, mimicked_id, params):
 def handle_get_mimicked_library_items(user_id, mimicked_id, params):
     """
     【V5 - Emby ID 权威数据源 & 排序保持重构版】
-    - 直接从数据库 `generated_media_info_json` 读取权威的、有序的 Emby ID 列表。
+    - 直接从合集成员子表读取权威的、有序的 Emby ID 列表。
     - 使用批量接口精确获取媒体项，然后根据数据库中的顺序重新排序。
     - 完美支持 'original' (榜单原始顺序) 排序。
     """
@@ -256,14 +337,8 @@ def handle_get_mimicked_library_items(user_id, mimicked_id, params):
         
         # --- 阶段一：从数据库获取权威的、有序的 Emby ID 列表 ---
         logger.trace(f"  -> 阶段1：为虚拟库 '{collection_info['name']}' 从DB读取有序Emby ID列表...")
-        db_media_list = collection_info.get('generated_media_info_json') or []
-        
-        # 提取所有有效的 Emby ID，这个列表的顺序就是我们的“原始榜单顺序”
-        ordered_emby_ids = [
-            item.get('emby_id') 
-            for item in db_media_list 
-            if item.get('emby_id')
-        ]
+        # 从成员子表按榜单顺序读取，这个列表的顺序就是我们的“原始榜单顺序”
+        ordered_emby_ids = db_handler.get_custom_collection_ordered_emby_ids(real_db_id)
         
         if not ordered_emby_ids:
             logger.trace("  -> 数据库中无 Emby ID 记录，返回空列表。")
@@ -221,17 +221,26 @@ def api_delete_custom_collection(collection_id):
 @login_required
 def api_get_custom_collection_status(collection_id):
     """
-    【V3 - 最终健壮修复版】
+    【V4 - 成员子表分页版】
     获取单个自定义合集的详情，确保 definition 字段始终为正确的对象格式。
     - 解决了编辑框因 definition 格式错误而无法加载规则的致命BUG。
+    - media_items 从 custom_collection_members 子表读取，支持 ?status=&limit=&offset= 过滤和分页，
+      不再加载并返回整个 generated_media_info_json。不带分页参数时返回全部成员。
     """
     try:
-        collection_details = db_handler.get_custom_collection_by_id(collection_id)
+        collection_details = db_handler.get_custom_collection_by_id(collection_id, include_media_json=False)
         if not collection_details:
             return jsonify({"error": "未在自定义合集表中找到该合集"}), 404
         
         # 为“健康状态”弹窗准备 media_items 字段
-        collection_details['media_items'] = collection_details.get('generated_media_info_json', [])
+        status_filter = request.args.get('status') or None
+        limit = request.args.get('limit', type=int)
+        offset = request.args.get('offset', default=0, type=int)
+        members = db_handler.get_custom_collection_members(
+            collection_id, status=status_filter, limit=limit, offset=max(offset, 0), with_details=True
+        )
+        collection_details['media_items'] = members['items']
+        collection_details['media_total'] = members['total']
         
         # ★★★ 核心修复：确保 definition 是一个对象，而不是字符串 ★★★
         definition_data = collection_details.get('definition_json')
@@ -254,9 +263,7 @@ def api_get_custom_collection_status(collection_id):
             # 其他意外情况（如None），提供一个空的默认值
             collection_details['definition'] = {}
         
-        # 现在，我们可以安全地删除那些体积巨大或不再需要的原始字段
-        if 'generated_media_info_json' in collection_details:
-            del collection_details['generated_media_info_json']
+        # 现在，我们可以安全地删除不再需要的原始字段
         if 'definition_json' in collection_details:
             del collection_details['definition_json']
             
@@ -361,18 +368,11 @@ def api_subscribe_media_from_custom_collection():
         # 成功后扣配额
         db_handler.decrement_subscription_quota()
 
-        target_media_item['status'] = 'subscribed'
-        with db_handler.get_db_connection() as conn:
-            cursor = conn.cursor()
-            new_missing_count = sum(1 for item in media_list if item.get('status') == 'missing')
-            new_health_status = 'has_missing' if new_missing_count > 0 else 'ok'
-            new_media_info_json = json.dumps(media_list, ensure_ascii=False)
-            cursor.execute(
-                "UPDATE custom_collections SET generated_media_info_json = %s, health_status = %s, missing_count = %s WHERE id = %s",
-                (new_media_info_json, new_health_status, new_missing_count, collection_id)
-            )
-            conn.commit()
+        # 只更新这一项的状态（成员子表 + JSON 中对应下标），并重新计算缺失数量
+        if db_handler.update_single_media_status_in_custom_collection(collection_id, str(tmdb_id), 'subscribed'):
             logger.info(f"  -> 已成功更新合集 {collection_id} 中《{authoritative_title}》的状态为 '订阅中'。")
+        else:
+            logger.warning(f"  -> 订阅已提交，但更新合集 {collection_id} 中《{authoritative_title}》的本地状态失败。")
 
         return jsonify({"message": f"《{authoritative_title}》已成功提交订阅，并已更新本地状态。"}), 200
     except Exception as e:
@@ -195,8 +195,11 @@ def api_export_database():
                 )
                 cursor.execute(query)
                 
-                rows = cursor.fetchall()
-                backup_data["data"][table_name] = [dict(row) for row in rows]
+                rows = [dict(row) for row in cursor.fetchall()]
+                if table_name == 'custom_collections':
+                    # 单项状态只写在成员子表中，导出前合并回媒体列表JSON，恢复时据此重建子表
+                    rows = db_handler.apply_collection_member_fields(cursor, rows)
+                backup_data["data"][table_name] = rows
 
         timestamp = time.strftime("%Y%m%d-%H%M%S")
         filename = f"database_backup_{timestamp}.json"
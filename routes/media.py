@@ -10,6 +10,7 @@ import config_manager
 import task_manager
 import extensions
 import db_handler
+from library_search_index import library_search_index
 from extensions import login_required, processor_ready_required
 from urllib.parse import urlparse
 
@@ -38,14 +39,16 @@ def api_search_emby_library():
         return jsonify({"error": "搜索词不能为空"}), 400
 
     try:
-        # ✨✨✨ 调用改造后的函数，并传入 search_term ✨✨✨
-        search_results = emby_handler.get_emby_library_items(
-            base_url=extensions.media_processor_instance.emby_url,
-            api_key=extensions.media_processor_instance.emby_api_key,
-            user_id=extensions.media_processor_instance.emby_user_id,
-            media_type_filter="Movie,Series",
-            search_term=query
-        )
+        # ★★★ 优先使用本地片名索引；索引不可用或本地无命中(可能是尚未同步的新片)时才回退到 Emby 搜索 ★★★
+        search_results = library_search_index.search(query)
+        if not search_results:
+            search_results = emby_handler.get_emby_library_items(
+                base_url=extensions.media_processor_instance.emby_url,
+                api_key=extensions.media_processor_instance.emby_api_key,
+                user_id=extensions.media_processor_instance.emby_user_id,
+                media_type_filter="Movie,Series",
+                search_term=query
+            )
         
         if search_results is None:
             return jsonify({"error": "搜索时发生服务器错误"}), 500
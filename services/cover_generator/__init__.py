@@ -1,12 +1,17 @@
 # services/cover_generator/__init__.py
 
+import os
+import json
+import hashlib
 import logging
 import shutil
 import yaml
 import random
+import threading
 import requests # 使用标准的 requests 库
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Any, List, Tuple, Optional
+from typing import Dict, Any, List, Tuple, Optional, Callable
 
 # 从您的项目中导入您确认存在的模块
 import config_manager
@@ -20,6 +25,39 @@ from .styles.style_multi_1 import create_style_multi_1
 # 使用标准的Python日志记录方式
 logger = logging.getLogger(__name__)
 
+# 所有媒体库共用的素材图片同时下载数量上限
+COVER_DOWNLOAD_WORKERS = 8
+# 渲染（模糊、合成、编码）的并发数，按 CPU 核数
+COVER_RENDER_WORKERS = os.cpu_count() or 2
+# 封面同时上传回 Emby 的数量上限
+COVER_UPLOAD_WORKERS = 2
+# 批量生成时同时在流水线中的媒体库数量上限
+COVER_PIPELINE_WORKERS = 16
+# 不影响封面画面的配置项，计算输入指纹时忽略
+FINGERPRINT_IGNORED_CONFIG_KEYS = ("enabled", "transfer_monitor", "exclude_libraries")
+# 服务器忽略图片类型过滤、抽样结果不够时，回退查询最多取回的项目数
+COVER_SAMPLE_FALLBACK_LIMIT = 100
+
+def _render_cover(render_job: Dict[str, Any]) -> Optional[bytes]:
+    """按渲染参数生成封面图片。只依赖传入的普通数据，可以在任意工作线程中执行。"""
+    style = render_job['style']
+    if style == 'single_1':
+        return create_style_single_1(render_job['image_path'], render_job['title'], render_job['font_path'],
+                                     font_size=render_job['font_size'], blur_size=render_job['blur_size'],
+                                     color_ratio=render_job['color_ratio'], item_count=render_job['item_count'],
+                                     config=render_job['config'])
+    if style == 'single_2':
+        return create_style_single_2(render_job['image_path'], render_job['title'], render_job['font_path'],
+                                     font_size=render_job['font_size'], blur_size=render_job['blur_size'],
+                                     color_ratio=render_job['color_ratio'], item_count=render_job['item_count'],
+                                     config=render_job['config'])
+    if style == 'multi_1':
+        return create_style_multi_1(render_job['library_dir'], render_job['title'], render_job['font_path'],
+                                    font_size=render_job['font_size'], is_blur=render_job['is_blur'],
+                                    blur_size=render_job['blur_size'], color_ratio=render_job['color_ratio'],
+                                    item_count=render_job['item_count'], config=render_job['config'])
+    return None
+
 class CoverGeneratorService:
     """
     一个独立的媒体库封面生成服务，从MoviePilot插件移植而来。
@@ -28,6 +66,11 @@ class CoverGeneratorService:
         "Random": "随机",
         "Latest": "最新添加"
     }
+    # 排序方式对应的 Emby SortBy / SortOrder，由服务器完成排序和抽样
+    SORT_BY_EMBY_PARAMS = {
+        "Random": ("Random", "Ascending"),
+        "Latest": ("DateCreated", "Descending")
+    }
     def __init__(self, config: Dict[str, Any]):
         self.config = config
         
@@ -59,50 +102,129 @@ class CoverGeneratorService:
         self.en_font_path_multi_1 = None
 
         self._fonts_checked_and_ready = False
+        # 多个合集并行生成封面时，保证字体只被检查/下载一次
+        self._fonts_lock = threading.Lock()
+        # 下载和上传各自的并发上限，在同一个服务实例处理的所有媒体库之间共享
+        self._download_slots = threading.BoundedSemaphore(COVER_DOWNLOAD_WORKERS)
+        self._upload_slots = threading.BoundedSemaphore(COVER_UPLOAD_WORKERS)
+
+        # 每个媒体库上次成功生成封面时的输入指纹，输入不变时跳过渲染和上传
+        self.fingerprints_file = self.data_path / "cover_fingerprints.json"
+        self._fingerprints = self.__load_fingerprints()
+        self._fingerprints_lock = threading.Lock()
 
     # --- 核心公开方法 ---
-    def generate_for_library(self, emby_server_id: str, library: Dict[str, Any], item_count: Optional[int] = None, content_types: Optional[List[str]] = None):
+    def generate_for_library(self, emby_server_id: str, library: Dict[str, Any], item_count: Optional[int] = None, content_types: Optional[List[str]] = None, force: bool = False):
         """
         为指定的媒体库生成并上传封面。
         这是从外部调用的主入口。
         ★★★ 新增 content_types 参数，用于精确指定合集内容 ★★★
+        ★★★ 输入（风格配置、选中的图片、字体、标题）与上次相同时跳过，force=True 时强制重新生成 ★★★
         """
-        sort_by_name = self.SORT_BY_DISPLAY_NAME.get(self._sort_by, self._sort_by)
-        logger.info(f"  -> 开始以排序方式: {sort_by_name} 为媒体库 '{library['Name']}' 生成封面...")
-        
         self.__get_fonts()
+        return self.__process_library(emby_server_id, library, item_count, content_types, force, _render_cover)
+
+    def generate_for_libraries(self, emby_server_id: str, jobs: List[Dict[str, Any]], stop_event: Optional[threading.Event] = None,
+                               progress_callback: Optional[Callable[[int, Dict[str, Any]], None]] = None, force: bool = False) -> List[bool]:
+        """
+        批量为多个媒体库/合集生成并上传封面，按“下载 -> 渲染 -> 上传”流水线并行执行。
+        jobs 中每项为 {"library": ..., "item_count": ..., "content_types": ...}，返回与之一一对应的成功标志。
+        素材下载、渲染、上传三个阶段各有独立的并发上限。每完成一个会调用 progress_callback(已完成数, 媒体库)。
+        输入未变化的媒体库会被跳过（视为成功），force=True 时全部重新生成。
+        """
+        if not jobs:
+            return []
+        self.__get_fonts()
+        # 渲染线程池单独限流，下载/上传等待网络时不占用渲染名额
+        render_executor = ThreadPoolExecutor(max_workers=COVER_RENDER_WORKERS)
+        done_count = [0]
+        done_lock = threading.Lock()
+
+        def report(library):
+            if not progress_callback:
+                return
+            with done_lock:
+                done_count[0] += 1
+                done = done_count[0]
+            progress_callback(done, library)
+
+        def run(job):
+            library = job['library']
+            if stop_event and stop_event.is_set():
+                return False
+            try:
+                return self.__process_library(emby_server_id, library, job.get('item_count'), job.get('content_types'), force,
+                                              lambda render_job: render_executor.submit(_render_cover, render_job).result())
+            except Exception as e:
+                logger.error(f"为媒体库 '{library.get('Name')}' 生成封面时发生错误: {e}", exc_info=True)
+                return False
+            finally:
+                report(library)
+
+        try:
+            with ThreadPoolExecutor(max_workers=min(COVER_PIPELINE_WORKERS, len(jobs))) as pipeline:
+                return list(pipeline.map(run, jobs))
+        finally:
+            render_executor.shutdown(wait=True)
+
+    # --- 私有逻辑方法 (从原插件移植和修改) ---
 
+    def __process_library(self, server_id: str, library: Dict[str, Any], item_count, content_types: Optional[List[str]],
+                          force: bool, render: Callable[[Dict[str, Any]], Optional[bytes]]) -> bool:
+        """单个媒体库的完整流程：准备素材 -> 比对输入指纹 -> 渲染 -> 上传 -> 记录指纹"""
         # ★★★ 将 content_types 传递下去 ★★★
-        image_data = self.__generate_image_data(emby_server_id, library, item_count, content_types)
+        render_job = self.__prepare_render_job(server_id, library, item_count, content_types, force)
+        if render_job and render_job.get('unchanged'):
+            logger.info(f"  -> 媒体库 '{library['Name']}' 的封面输入未变化，跳过生成。")
+            return True
+        image_data = render(render_job) if render_job else None
+        success = self.__upload_cover(server_id, library, image_data)
+        if success:
+            self.__save_fingerprint(server_id, library, render_job['fingerprint'])
+        return success
+
+    def __upload_cover(self, server_id: str, library: Dict[str, Any], image_data: Optional[bytes]) -> bool:
         if not image_data:
             logger.error(f"为媒体库 '{library['Name']}' 生成封面图片失败。")
             return False
 
-        success = self.__set_library_image(emby_server_id, library, image_data)
+        with self._upload_slots:
+            success = self.__set_library_image(server_id, library, image_data)
         if success:
             logger.info(f"  -> ✅ 成功更新媒体库 '{library['Name']}' 的封面！")
         else:
             logger.error(f"上传封面到媒体库 '{library['Name']}' 失败。")
-            
         return success
 
-    # --- 私有逻辑方法 (从原插件移植和修改) ---
+    def __prepare_render_job(self, server_id: str, library: Dict[str, Any], item_count: Optional[int] = None, content_types: Optional[List[str]] = None,
+                             force: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        下载阶段：根据配置和媒体库内容准备好素材图片，返回渲染参数（含输入指纹）。
+        选好素材后先计算输入指纹，与上次相同且未强制时不再下载，返回 {"unchanged": True}。
+        """
+        sort_by_name = self.SORT_BY_DISPLAY_NAME.get(self._sort_by, self._sort_by)
+        logger.info(f"  -> 开始以排序方式: {sort_by_name} 为媒体库 '{library['Name']}' 生成封面...")
 
-    def __generate_image_data(self, server_id: str, library: Dict[str, Any], item_count: Optional[int] = None, content_types: Optional[List[str]] = None) -> bytes:
-        """根据配置和媒体库内容，生成最终的封面图片二进制数据"""
         library_name = library['Name']
         title = self.__get_library_title_from_yaml(library_name)
         
         custom_image_paths = self.__check_custom_image(library_name)
         if custom_image_paths:
             logger.info(f"发现媒体库 '{library_name}' 的自定义图片，将使用路径模式生成。")
-            return self.__generate_image_from_path(library_name, title, custom_image_paths, item_count)
+            fingerprint = self.__compute_fingerprint(title, item_count, [self.__file_signature(path) for path in custom_image_paths])
+            if not force and self.__fingerprint_matches(server_id, library, fingerprint):
+                return {"unchanged": True}
+            render_job = self.__generate_image_from_path(library_name, title, custom_image_paths, item_count)
+            if render_job:
+                render_job['fingerprint'] = fingerprint
+            return render_job
 
         logger.trace(f"未发现自定义图片，将从服务器 '{server_id}' 获取媒体项作为封面来源。")
         # ★★★ 将 content_types 传递下去 ★★★
-        return self.__generate_from_server(server_id, library, title, item_count, content_types)
+        return self.__generate_from_server(server_id, library, title, item_count, content_types, force)
 
-    def __generate_from_server(self, server_id: str, library: Dict[str, Any], title: Tuple[str, str], item_count: Optional[int] = None, content_types: Optional[List[str]] = None) -> bytes:
+    def __generate_from_server(self, server_id: str, library: Dict[str, Any], title: Tuple[str, str], item_count: Optional[int] = None, content_types: Optional[List[str]] = None,
+                               force: bool = False) -> Optional[Dict[str, Any]]:
         """从媒体服务器获取项目并生成封面"""
         required_items_count = 1 if self._cover_style.startswith('single') else 9
         
@@ -112,6 +234,12 @@ class CoverGeneratorService:
             logger.warning(f"在媒体库 '{library['Name']}' 中找不到任何带有可用图片的媒体项。")
             return None
 
+        # 图片地址中带有项目ID和图片标签，图片被替换后标签会变化
+        selected_items = items[:1] if self._cover_style.startswith('single') else items[:9]
+        fingerprint = self.__compute_fingerprint(title, item_count, [self.__get_image_url(item) for item in selected_items])
+        if not force and self.__fingerprint_matches(server_id, library, fingerprint):
+            return {"unchanged": True}
+
         # 根据风格调用不同的处理函数
         if self._cover_style.startswith('single'):
             image_url = self.__get_image_url(items[0])
@@ -120,27 +248,33 @@ class CoverGeneratorService:
             image_path = self.__download_image(server_id, image_url, library['Name'], 1)
             if not image_path: return None
             
-            return self.__generate_image_from_path(library['Name'], title, [image_path], item_count)
+            render_job = self.__generate_image_from_path(library['Name'], title, [image_path], item_count)
         else: # multi style
-            image_paths = []
-            for i, item in enumerate(items[:9]):
+            def download_one(indexed_item):
+                i, item = indexed_item
                 image_url = self.__get_image_url(item)
-                if image_url:
-                    path = self.__download_image(server_id, image_url, library['Name'], i + 1)
-                    if path:
-                        image_paths.append(path)
+                return self.__download_image(server_id, image_url, library['Name'], i + 1) if image_url else None
+
+            candidates = list(enumerate(items[:9]))
+            with ThreadPoolExecutor(max_workers=max(1, min(COVER_DOWNLOAD_WORKERS, len(candidates)))) as download_pool:
+                image_paths = [path for path in download_pool.map(download_one, candidates) if path]
             
             if not image_paths:
                 logger.warning(f"为多图模式下载图片失败。")
                 return None
             
-            return self.__generate_image_from_path(library['Name'], title, image_paths, item_count)
+            render_job = self.__generate_image_from_path(library['Name'], title, image_paths, item_count)
+
+        if render_job:
+            render_job['fingerprint'] = fingerprint
+        return render_job
 
     def __get_valid_items_from_library(self, server_id: str, library: Dict[str, Any], limit: int, content_types: Optional[List[str]] = None) -> List[Dict]:
         """
-        【V2 - 封面生成最终修复版】
+        【V3 - 按需抽样版】
         - 优先使用外部传入的 content_types 来确定要获取的媒体类型。
         - 解决了无法获取合集(BoxSet)内部媒体项的问题。
+        - 不再拉取整个媒体库：由服务器按排序方式、图片类型过滤后只返回 limit 个项目。
         """
         library_id = library.get("Id") or library.get("ItemId")
         library_name = library.get("Name")
@@ -175,36 +309,41 @@ class CoverGeneratorService:
             
         logger.trace(f"  -> 正在为媒体库 '{library_name}' 获取类型为 '{item_types_to_fetch}' 的项目...")
 
-        all_items = emby_handler.get_emby_library_items(
-            base_url=base_url,
-            api_key=api_key,
-            user_id=user_id,
-            library_ids=[library_id],
-            media_type_filter=item_types_to_fetch,
-            fields="Id,Name,Type,ImageTags,BackdropImageTags,DateCreated",
-            force_user_endpoint=True
-        )
-        
-        if not all_items:
-            return []
-            
-        valid_items = [item for item in all_items if self.__get_image_url(item)]
-        
-        if not valid_items:
-            return []
-
-        if self._sort_by == "Latest":
-            logger.debug(f"  -> 正在对 {len(valid_items)} 个有效项目按'最新添加'进行排序...")
-            valid_items.sort(key=lambda x: x.get('DateCreated', '1970-01-01T00:00:00.000Z'), reverse=True)
-        elif self._sort_by == "Random":
-            logger.debug(f"  -> 正在对 {len(valid_items)} 个有效项目进行'随机'排序...")
-            random.shuffle(valid_items)
+        sort_by, sort_order = self.SORT_BY_EMBY_PARAMS.get(self._sort_by, (None, "Descending"))
+        sort_by_name = self.SORT_BY_DISPLAY_NAME.get(self._sort_by, self._sort_by)
+        fields = "Id,Name,Type,ImageTags,BackdropImageTags,DateCreated"
+
+        # 1. 只取带有海报或背景图的项目，正常情况下一次请求就能拿到足够的素材
+        logger.debug(f"  -> 正在按'{sort_by_name}'从媒体库 '{library_name}' 抽取 {limit} 个带图片的项目...")
+        sampled_items = emby_handler.get_emby_library_items_sample(
+            base_url=base_url, api_key=api_key, user_id=user_id, library_id=library_id,
+            media_type_filter=item_types_to_fetch, fields=fields, limit=limit,
+            sort_by=sort_by, sort_order=sort_order, image_types="Primary,Backdrop"
+        ) or []
+        valid_items = [item for item in sampled_items if self.__get_image_url(item)]
+
+        # 2. 返回了整页结果却混有无图项目，说明服务器没有按图片类型过滤，不带过滤再取一批，数量仍有上限。
+        #    结果不足一页时媒体库里已没有更多带图片的项目，无需回退。
+        if len(valid_items) < limit and len(sampled_items) >= limit:
+            logger.debug(f"  -> 抽样只得到 {len(valid_items)} 个可用项目，将不带图片过滤再查询最多 {COVER_SAMPLE_FALLBACK_LIMIT} 个项目...")
+            fallback_items = emby_handler.get_emby_library_items_sample(
+                base_url=base_url, api_key=api_key, user_id=user_id, library_id=library_id,
+                media_type_filter=item_types_to_fetch, fields=fields, limit=COVER_SAMPLE_FALLBACK_LIMIT,
+                sort_by=sort_by, sort_order=sort_order
+            ) or []
+            seen_ids = {item.get("Id") for item in valid_items}
+            for item in fallback_items:
+                if len(valid_items) >= limit:
+                    break
+                if item.get("Id") not in seen_ids and self.__get_image_url(item):
+                    seen_ids.add(item.get("Id"))
+                    valid_items.append(item)
 
         return valid_items[:limit]
 
-    def __generate_image_from_path(self, library_name: str, title: Tuple[str, str], image_paths: List[str], item_count: Optional[int] = None) -> bytes:
+    def __generate_image_from_path(self, library_name: str, title: Tuple[str, str], image_paths: List[str], item_count: Optional[int] = None) -> Optional[Dict[str, Any]]:
         """
-        【字体回退修复版】使用本地图片路径列表生成封面。
+        【字体回退修复版】根据本地图片路径列表准备渲染参数，实际渲染由 _render_cover 完成。
         - 确保传递给底层函数的是字符串路径。
         - 在多图模式下，如果专用字体不存在，则优雅地回退到使用单图字体，并记录日志。
         """
@@ -217,15 +356,13 @@ class CoverGeneratorService:
         color_ratio = self.config.get("color_ratio", 0.8)
         font_size = (float(zh_font_size), float(en_font_size))
 
-        if self._cover_style == 'single_1':
-            return create_style_single_1(str(image_paths[0]), title, (str(self.zh_font_path), str(self.en_font_path)), 
-                                         font_size=font_size, blur_size=blur_size, color_ratio=color_ratio,
-                                         item_count=item_count, config=self.config)
-        
-        elif self._cover_style == 'single_2':
-            return create_style_single_2(str(image_paths[0]), title, (str(self.zh_font_path), str(self.en_font_path)), 
-                                         font_size=font_size, blur_size=blur_size, color_ratio=color_ratio,
-                                         item_count=item_count, config=self.config)
+        if self._cover_style in ('single_1', 'single_2'):
+            return {
+                "style": self._cover_style, "image_path": str(image_paths[0]), "title": title,
+                "font_path": (str(self.zh_font_path), str(self.en_font_path)),
+                "font_size": font_size, "blur_size": blur_size, "color_ratio": color_ratio,
+                "item_count": item_count, "config": self.config,
+            }
         
         elif self._cover_style == 'multi_1':
             # ★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★
@@ -259,12 +396,12 @@ class CoverGeneratorService:
             library_dir = self.covers_path / library_name
             self.__prepare_multi_images(library_dir, image_paths)
             
-            return create_style_multi_1(str(library_dir), title, font_path_multi, 
-                                      font_size=font_size_multi, 
-                                      is_blur=self._multi_1_blur, 
-                                      blur_size=blur_size_multi, 
-                                      color_ratio=color_ratio_multi,
-                                      item_count=item_count, config=self.config)
+            return {
+                "style": 'multi_1', "library_dir": str(library_dir), "title": title,
+                "font_path": font_path_multi, "font_size": font_size_multi,
+                "is_blur": self._multi_1_blur, "blur_size": blur_size_multi, "color_ratio": color_ratio_multi,
+                "item_count": item_count, "config": self.config,
+            }
         return None
 
     def __set_library_image(self, server_id: str, library: Dict[str, Any], image_data: bytes) -> bool:
@@ -300,6 +437,61 @@ class CoverGeneratorService:
 
     # --- 以下是辅助函数 ---
 
+    def __compute_fingerprint(self, title: Tuple[str, str], item_count, sources: List[Any]) -> str:
+        """封面输入指纹：风格配置、标题、数量角标、素材来源和字体文件，任一变化都会得到不同的指纹"""
+        style_config = {k: v for k, v in self.config.items() if k not in FINGERPRINT_IGNORED_CONFIG_KEYS}
+        fonts = [self.__file_signature(path) if path else None
+                 for path in (self.zh_font_path, self.en_font_path, self.zh_font_path_multi_1, self.en_font_path_multi_1)]
+        payload = {
+            "style": self._cover_style, "config": style_config, "title": list(title),
+            "item_count": item_count, "sources": sources, "fonts": fonts,
+        }
+        encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha1(encoded.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def __file_signature(path) -> List[Any]:
+        """本地文件的路径、大小和修改时间，文件被替换后签名随之变化"""
+        try:
+            stat = os.stat(path)
+            return [str(path), stat.st_size, stat.st_mtime_ns]
+        except OSError:
+            return [str(path), None, None]
+
+    @staticmethod
+    def __fingerprint_key(server_id: str, library: Dict[str, Any]) -> str:
+        return f"{server_id}-{library.get('Id') or library.get('ItemId')}"
+
+    def __load_fingerprints(self) -> Dict[str, str]:
+        if not self.fingerprints_file.exists():
+            return {}
+        try:
+            with open(self.fingerprints_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取封面输入指纹文件失败，将全部重新生成: {e}")
+            return {}
+
+    def __fingerprint_matches(self, server_id: str, library: Dict[str, Any], fingerprint: str) -> bool:
+        with self._fingerprints_lock:
+            return self._fingerprints.get(self.__fingerprint_key(server_id, library)) == fingerprint
+
+    def __save_fingerprint(self, server_id: str, library: Dict[str, Any], fingerprint: str):
+        """封面上传成功后记录指纹。先读回文件再合并，避免覆盖其他任务同时写入的记录；写临时文件再替换，避免写到一半的文件"""
+        key = self.__fingerprint_key(server_id, library)
+        with self._fingerprints_lock:
+            self._fingerprints[key] = fingerprint
+            stored = self.__load_fingerprints()
+            stored[key] = fingerprint
+            try:
+                tmp_file = self.fingerprints_file.with_suffix('.tmp')
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    json.dump(stored, f, ensure_ascii=False)
+                os.replace(tmp_file, self.fingerprints_file)
+            except OSError as e:
+                logger.warning(f"保存封面输入指纹失败: {e}")
+
     def __get_library_title_from_yaml(self, library_name: str) -> Tuple[str, str]:
         zh_title, en_title = library_name, ''
         if not self._title_config_str:
@@ -330,6 +522,7 @@ class CoverGeneratorService:
         subdir.mkdir(parents=True, exist_ok=True)
         filepath = subdir / f"{count}.jpg"
         
+        self._download_slots.acquire()
         try:
             base_url = config_manager.APP_CONFIG.get('emby_server_url')
             api_key = config_manager.APP_CONFIG.get('emby_api_key')
@@ -354,6 +547,8 @@ class CoverGeneratorService:
 
         except Exception as e:
             logger.error(f"下载图片失败 ({api_path}): {e}", exc_info=True)
+        finally:
+            self._download_slots.release()
             
         return None
         
@@ -404,7 +599,12 @@ class CoverGeneratorService:
         """
         if self._fonts_checked_and_ready:
             return
+        with self._fonts_lock:
+            if self._fonts_checked_and_ready:
+                return
+            self.__prepare_fonts()
 
+    def __prepare_fonts(self):
         font_definitions = [
             {"target_attr": "zh_font_path", "filename": "zh_font.ttf", "local_key": "zh_font_path_local", "url_key": "zh_font_url"},
             {"target_attr": "en_font_path", "filename": "en_font.ttf", "local_key": "en_font_path_local", "url_key": "en_font_url"},
@@ -3,6 +3,7 @@
 import time
 import os
 import json
+import hashlib
 import psycopg2
 import pytz
 from psycopg2 import sql
@@ -13,8 +14,9 @@ from datetime import datetime, date, timezone
 from concurrent.futures import ThreadPoolExecutor, as_completed 
 import concurrent.futures
 import gevent
+import threading
 # 导入类型提示
-from typing import Optional, List
+from typing import Optional, List, Tuple
 from core_processor import MediaProcessor
 from watchlist_processor import WatchlistProcessor
 from actor_subscription_processor import ActorSubscriptionProcessor
@@ -306,10 +308,11 @@ def webhook_processing_task(processor: MediaProcessor, item_id: str, force_repro
 
     logger.trace(f"  -> Webhook 任务及所有后续流程完成: {item_id}")
 # --- 追剧 ---    
-def task_process_watchlist(processor: WatchlistProcessor, item_id: Optional[str] = None):
+def task_process_watchlist(processor: WatchlistProcessor, item_id: Optional[str] = None, force: bool = False):
     """
     【V9 - 启动器】
     调用处理器实例来执行追剧任务，并处理UI状态更新。
+    force=True 时忽略各剧集的下次检查时间，全部重新检查（手动刷新）。
     """
     # 定义一个可以传递给处理器的回调函数
     def progress_updater(progress, message):
@@ -318,7 +321,7 @@ def task_process_watchlist(processor: WatchlistProcessor, item_id: Optional[str]
 
     try:
         # 直接调用 processor 实例的方法，并将回调函数传入
-        processor.run_regular_processing_task_concurrent(progress_callback=progress_updater, item_id=item_id)
+        processor.run_regular_processing_task_concurrent(progress_callback=progress_updater, item_id=item_id, force=force)
 
     except Exception as e:
         task_name = "追剧列表更新"
@@ -530,12 +533,20 @@ def task_import_database(processor, file_content: str, tables_to_import: List[st
                     columns, prepared_data = _prepare_data_for_insert(table_name, table_data)
                     _overwrite_table_data(cursor, table_name, columns, prepared_data)
                     summary_lines.append(f"  - 表 '{cn_name}': 成功恢复 {len(prepared_data)} 条记录。")
+
+                if 'custom_collections' in sorted_tables_to_import:
+                    # 合集表被覆盖后成员子表随之级联清空，这里从恢复的JSON重新生成
+                    rebuilt = db_handler.rebuild_missing_custom_collection_members(cursor)
+                    logger.info(f"已根据恢复的合集数据重建 {rebuilt} 条合集成员记录。")
                 
                 logger.info("="*11 + " 数据库恢复摘要 " + "="*11)
                 for line in summary_lines: logger.info(line)
                 logger.info("="*36)
                 conn.commit()
                 logger.info("✅ 数据库事务已成功提交！所有选择的表已恢复。")
+        # 已处理列表被整表替换，内存中的已处理集合需要全量重新装载
+        if 'processed_log' in tables_to_import:
+            processor.reload_processed_items_cache()
     except Exception as e:
         logger.error(f"数据库恢复任务发生严重错误，所有更改将回滚: {e}", exc_info=True)
         if conn:
@@ -557,10 +568,12 @@ def task_reprocess_single_item(processor: MediaProcessor, item_id: str, item_nam
         task_manager.update_status_from_thread(0, f"正在处理: {item_name_for_ui}")
 
         # 现在才开始真正的工作
+        # 手动触发的重新处理，无视写回指纹，确保结果一定写回 Emby
         processor.process_single_item(
             item_id, 
             force_reprocess_this_item=True,
-            force_fetch_from_tmdb=True
+            force_fetch_from_tmdb=True,
+            force_write_back=True
         )
         # 任务成功完成后的状态更新会自动由任务队列处理，我们无需关心
         logger.debug(f"--- 后台任务完成 ({item_name_for_ui}) ---")
@@ -864,6 +877,47 @@ def task_refresh_collections(processor: MediaProcessor):
     except Exception as e:
         logger.error(f"刷新合集任务失败: {e}", exc_info=True)
         task_manager.update_status_from_thread(-1, f"错误: {e}")
+# 批量订阅时同时向 MoviePilot 提交的最大并发数
+SUBSCRIPTION_SUBMIT_WORKERS = 3
+# 智能订阅每次向数据库预留的配额名额数
+AUTO_SUBSCRIBE_QUOTA_BLOCK = 20
+
+def _submit_subscriptions_with_quota(submit_funcs: List, quota: 'db_handler.SubscriptionQuotaReservation',
+                                     processor: Optional[MediaProcessor] = None, delay: float = 0) -> List[Optional[bool]]:
+    """
+    以有限并发执行一批订阅提交，每次提交前从预留配额中取一个名额，提交失败则归还。
+    返回与 submit_funcs 一一对应的结果：True 成功；False 失败或任务已中止；None 因配额用尽而未提交。
+    delay 大于 0 时，相邻两次提交的开始时间至少间隔 delay 秒。
+    """
+    if not submit_funcs:
+        return []
+    pace_lock = threading.Lock()
+    next_slot = [0.0]
+
+    def run(submit):
+        if processor and processor.is_stop_requested():
+            return False
+        if not quota.take():
+            return None
+        if delay > 0:
+            with pace_lock:
+                now = time.monotonic()
+                start = max(now, next_slot[0])
+                next_slot[0] = start + delay
+            if start > now:
+                time.sleep(start - now)
+        try:
+            success = bool(submit())
+        except Exception as e:
+            logger.error(f"提交订阅时发生错误: {e}", exc_info=True)
+            success = False
+        if not success:
+            quota.give_back()
+        return success
+
+    with ThreadPoolExecutor(max_workers=min(SUBSCRIPTION_SUBMIT_WORKERS, len(submit_funcs))) as executor:
+        return list(executor.map(run, submit_funcs))
+
 # ★★★ 带智能预判的自动订阅任务 ★★★
 def task_auto_subscribe(processor: MediaProcessor):
     """
@@ -888,7 +942,9 @@ def task_auto_subscribe(processor: MediaProcessor):
         successfully_subscribed_items = []
         quota_exhausted = False # 新增一个标志，用于记录配额是否用尽
 
-        with db_handler.get_db_connection() as conn:
+        # 配额一次预留一批、在内存中分发，任务结束时归还没用掉的部分
+        with db_handler.SubscriptionQuotaReservation(block_size=AUTO_SUBSCRIBE_QUOTA_BLOCK) as quota, \
+             db_handler.get_db_connection() as conn:
             cursor = conn.cursor()
 
             # ★★★ 1. 处理原生电影合集 (collections_info) ★★★
@@ -902,43 +958,35 @@ def task_auto_subscribe(processor: MediaProcessor):
                 for collection in native_collections_to_check:
                     if processor.is_stop_requested() or quota_exhausted: break
                     
-                    movies_to_keep = []
                     all_movies = collection['missing_movies_json']
+                    movies_to_keep = list(all_movies)
                     movies_changed = False
                     
+                    movies_due = []
                     for movie in all_movies:
-                        if processor.is_stop_requested(): break
-                        
-                        if movie.get('status') == 'missing':
-                            release_date_str = movie.get('release_date')
-                            if not release_date_str:
-                                movies_to_keep.append(movie)
-                                continue
-                            try:
-                                release_date = datetime.strptime(release_date_str.strip(), '%Y-%m-%d').date()
-                            except (ValueError, TypeError):
-                                movies_to_keep.append(movie)
-                                continue
-
-                            if release_date <= today:
-                                # ★★★ 核心修改 1/3: 在订阅前检查配额 ★★★
-                                current_quota = db_handler.get_subscription_quota()
-                                if current_quota <= 0:
-                                    quota_exhausted = True
-                                    logger.warning("每日订阅配额已用尽，原生合集检查提前结束。")
-                                    movies_to_keep.append(movie) # 把当前未处理的电影加回去
-                                    break # 跳出内层循环
-
-                                if moviepilot_handler.subscribe_movie_to_moviepilot(movie, config_manager.APP_CONFIG):
-                                    db_handler.decrement_subscription_quota() # 消耗配额
-                                    successfully_subscribed_items.append(f"电影《{movie['title']}》")
-                                    movies_changed = True
-                                    movie['status'] = 'subscribed'
-                                movies_to_keep.append(movie)
-                            else:
-                                movies_to_keep.append(movie)
-                        else:
-                            movies_to_keep.append(movie)
+                        if movie.get('status') != 'missing': continue
+                        release_date_str = movie.get('release_date')
+                        if not release_date_str: continue
+                        try:
+                            release_date = datetime.strptime(release_date_str.strip(), '%Y-%m-%d').date()
+                        except (ValueError, TypeError):
+                            continue
+                        if release_date <= today:
+                            movies_due.append(movie)
+
+                    # ★★★ 核心修改 1/3: 已上映的缺失电影并发提交，每个提交前从预留配额中取名额 ★★★
+                    results = _submit_subscriptions_with_quota(
+                        [lambda m=movie: moviepilot_handler.subscribe_movie_to_moviepilot(m, config_manager.APP_CONFIG) for movie in movies_due],
+                        quota, processor
+                    )
+                    for movie, success in zip(movies_due, results):
+                        if success:
+                            successfully_subscribed_items.append(f"电影《{movie['title']}》")
+                            movies_changed = True
+                            movie['status'] = 'subscribed'
+                    if None in results:
+                        quota_exhausted = True
+                        logger.warning("每日订阅配额已用尽，原生合集检查提前结束。")
                             
                     if movies_changed:
                         new_missing_json = json.dumps(movies_to_keep)
@@ -961,39 +1009,31 @@ def task_auto_subscribe(processor: MediaProcessor):
                         missing_seasons = missing_info.get('missing_seasons', [])
                         if not missing_seasons: continue
                         
-                        seasons_to_keep = []
-                        seasons_changed = False
+                        seasons_due = []
                         for season in missing_seasons:
-                            if processor.is_stop_requested(): break
-                            
                             air_date_str = season.get('air_date')
-                            if not air_date_str:
-                                seasons_to_keep.append(season)
-                                continue
+                            if not air_date_str: continue
                             try:
                                 season_date = datetime.strptime(air_date_str.strip(), '%Y-%m-%d').date()
                             except (ValueError, TypeError):
-                                seasons_to_keep.append(season)
                                 continue
-
                             if season_date <= today:
-                                # ★★★ 核心修改 2/3: 在订阅前检查配额 ★★★
-                                current_quota = db_handler.get_subscription_quota()
-                                if current_quota <= 0:
-                                    quota_exhausted = True
-                                    logger.warning("每日订阅配额已用尽，追剧检查提前结束。")
-                                    seasons_to_keep.append(season)
-                                    break
-
-                                success = moviepilot_handler.subscribe_series_to_moviepilot(dict(series), season['season_number'], config_manager.APP_CONFIG)
-                                if success:
-                                    db_handler.decrement_subscription_quota() # 消耗配额
-                                    successfully_subscribed_items.append(f"《{series['item_name']}》第 {season['season_number']} 季")
-                                    seasons_changed = True
-                                else:
-                                    seasons_to_keep.append(season)
-                            else:
-                                seasons_to_keep.append(season)
+                                seasons_due.append(season)
+
+                        # ★★★ 核心修改 2/3: 已开播的缺失季并发提交，每个提交前从预留配额中取名额 ★★★
+                        series_info = dict(series)
+                        results = _submit_subscriptions_with_quota(
+                            [lambda sn=season['season_number']: moviepilot_handler.subscribe_series_to_moviepilot(series_info, sn, config_manager.APP_CONFIG) for season in seasons_due],
+                            quota, processor
+                        )
+                        subscribed_seasons = [season for season, success in zip(seasons_due, results) if success]
+                        for season in subscribed_seasons:
+                            successfully_subscribed_items.append(f"《{series['item_name']}》第 {season['season_number']} 季")
+                        if None in results:
+                            quota_exhausted = True
+                            logger.warning("每日订阅配额已用尽，追剧检查提前结束。")
+                        seasons_to_keep = [season for season in missing_seasons if not any(season is s for s in subscribed_seasons)]
+                        seasons_changed = bool(subscribed_seasons)
                                 
                         if seasons_changed:
                             missing_info['missing_seasons'] = seasons_to_keep
@@ -1006,7 +1046,8 @@ def task_auto_subscribe(processor: MediaProcessor):
                 task_manager.update_status_from_thread(70, "正在检查自定义榜单合集...")
                 sql_query_custom_collections = "SELECT * FROM custom_collections WHERE type = 'list' AND health_status = 'has_missing' AND generated_media_info_json IS NOT NULL AND generated_media_info_json != '[]'"
                 cursor.execute(sql_query_custom_collections)
-                custom_collections_to_check = cursor.fetchall()
+                # 单项状态以成员子表为准
+                custom_collections_to_check = db_handler.apply_collection_member_fields(cursor, cursor.fetchall())
                 
                 for collection in custom_collections_to_check:
                     if processor.is_stop_requested() or quota_exhausted: break
@@ -1025,49 +1066,39 @@ def task_auto_subscribe(processor: MediaProcessor):
                         if authoritative_type not in ['Movie', 'Series']:
                             authoritative_type = 'Movie'
                             
-                        media_to_keep = []
+                        media_to_keep = list(all_media)
                         media_changed = False
+                        media_due = []
                         for media_item in all_media:
-                            if processor.is_stop_requested(): break
-                            
-                            if media_item.get('status') == 'missing':
-                                release_date_str = media_item.get('release_date')
-                                if not release_date_str:
-                                    media_to_keep.append(media_item)
-                                    continue
-                                try:
-                                    release_date = datetime.strptime(release_date_str.strip(), '%Y-%m-%d').date()
-                                except (ValueError, TypeError):
-                                    media_to_keep.append(media_item)
-                                    continue
-
-                                if release_date <= today:
-                                    # ★★★ 核心修改 3/3: 在订阅前检查配额 ★★★
-                                    current_quota = db_handler.get_subscription_quota()
-                                    if current_quota <= 0:
-                                        quota_exhausted = True
-                                        logger.warning("每日订阅配额已用尽，自定义合集检查提前结束。")
-                                        media_to_keep.append(media_item)
-                                        break
-                                        
-                                    success = False
-                                    media_title = media_item.get('title', '未知标题')
-                                    if authoritative_type == 'Movie':
-                                        success = moviepilot_handler.subscribe_movie_to_moviepilot(media_item, config_manager.APP_CONFIG)
-                                    elif authoritative_type == 'Series':
-                                        series_info = { "item_name": media_title, "tmdb_id": media_item.get('tmdb_id') }
-                                        success = moviepilot_handler.subscribe_series_to_moviepilot(series_info, season_number=None, config=config_manager.APP_CONFIG)
-                                    
-                                    if success:
-                                        db_handler.decrement_subscription_quota() # 消耗配额
-                                        successfully_subscribed_items.append(f"{authoritative_type}《{media_title}》")
-                                        media_changed = True
-                                        media_item['status'] = 'subscribed'
-                                    media_to_keep.append(media_item)
-                                else:
-                                    media_to_keep.append(media_item)
-                            else:
-                                media_to_keep.append(media_item)
+                            if media_item.get('status') != 'missing': continue
+                            release_date_str = media_item.get('release_date')
+                            if not release_date_str: continue
+                            try:
+                                release_date = datetime.strptime(release_date_str.strip(), '%Y-%m-%d').date()
+                            except (ValueError, TypeError):
+                                continue
+                            if release_date <= today:
+                                media_due.append(media_item)
+
+                        def subscribe_media(media_item):
+                            media_title = media_item.get('title', '未知标题')
+                            if authoritative_type == 'Movie':
+                                return moviepilot_handler.subscribe_movie_to_moviepilot(media_item, config_manager.APP_CONFIG)
+                            series_info = { "item_name": media_title, "tmdb_id": media_item.get('tmdb_id') }
+                            return moviepilot_handler.subscribe_series_to_moviepilot(series_info, season_number=None, config=config_manager.APP_CONFIG)
+
+                        # ★★★ 核心修改 3/3: 已上映的缺失项目并发提交，每个提交前从预留配额中取名额 ★★★
+                        results = _submit_subscriptions_with_quota(
+                            [lambda m=media_item: subscribe_media(m) for media_item in media_due], quota, processor
+                        )
+                        for media_item, success in zip(media_due, results):
+                            if success:
+                                successfully_subscribed_items.append(f"{authoritative_type}《{media_item.get('title', '未知标题')}》")
+                                media_changed = True
+                                media_item['status'] = 'subscribed'
+                        if None in results:
+                            quota_exhausted = True
+                            logger.warning("每日订阅配额已用尽，自定义合集检查提前结束。")
                                 
                         if media_changed:
                             new_missing_json = json.dumps(media_to_keep, ensure_ascii=False)
@@ -1077,6 +1108,7 @@ def task_auto_subscribe(processor: MediaProcessor):
                                 "UPDATE custom_collections SET generated_media_info_json = %s, health_status = %s, missing_count = %s WHERE id = %s", 
                                 (new_missing_json, new_health_status, new_missing_count, collection_id)
                             )
+                            db_handler.sync_custom_collection_members(cursor, collection_id, media_to_keep)
                     except Exception as e_coll:
                         logger.error(f"  -> 处理自定义合集 '{collection_name}' 时发生错误: {e_coll}", exc_info=True)
 
@@ -1355,10 +1387,211 @@ def get_task_registry(context: str = 'all'):
     }
 
 # ★★★ 一键生成所有合集的后台任务，核心优化在于只获取一次Emby媒体库 ★★★
+# 并行刷新自建合集时同时处理的合集数量上限
+CUSTOM_COLLECTION_REFRESH_WORKERS = 3
+# 一次刷新任务中所有合集共用的 TMDb 详情抓取线程数
+TMDB_DETAIL_FETCH_WORKERS = 5
+
+class _TmdbDetailMemo:
+    """
+    单次任务内的 TMDb 详情缓存。
+    同一个 TMDb ID 在一次任务中只请求一次；多个合集同时需要同一个 ID 时共享同一个 Future。
+    """
+
+    def __init__(self, tmdb_api_key: str, executor: ThreadPoolExecutor):
+        self._tmdb_api_key = tmdb_api_key
+        self._executor = executor
+        self._futures: Dict[tuple, concurrent.futures.Future] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def fetch_count(self) -> int:
+        return len(self._futures)
+
+    def _submit(self, tmdb_id: str, item_type: Optional[str]) -> concurrent.futures.Future:
+        is_series = item_type == 'Series'
+        key = (is_series, str(tmdb_id))
+        with self._lock:
+            future = self._futures.get(key)
+            if future is None:
+                fetcher = tmdb_handler.get_tv_details_tmdb if is_series else tmdb_handler.get_movie_details
+                future = self._executor.submit(fetcher, tmdb_id, self._tmdb_api_key)
+                self._futures[key] = future
+        return future
+
+    def get_details_map(self, tmdb_items: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """返回 {tmdb_id: 详情}，获取失败的条目不会出现在结果中。"""
+        pending = [self._submit(item['id'], item.get('type')) for item in tmdb_items]
+        details_map = {}
+        for future in pending:
+            try:
+                detail = future.result()
+                if detail: details_map[str(detail.get("id"))] = detail
+            except Exception as exc:
+                logger.error(f"获取TMDb详情时线程内出错: {exc}")
+        return details_map
+
+def _refresh_one_custom_collection(processor: MediaProcessor, collection: Dict[str, Any],
+                                   tmdb_to_emby_item_map: Dict[str, Any], prefetched_collection_map: Dict[str, Any],
+                                   detail_memo: _TmdbDetailMemo) -> Optional[Dict[str, Any]]:
+    """
+    生成单个合集并写回数据库，供“生成所有自建合集”任务并行调用。
+    返回需要生成封面的信息，封面留到所有合集处理完后统一生成。
+    """
+    if processor.is_stop_requested():
+        return None
+
+    collection_id = collection['id']
+    collection_name = collection['name']
+    collection_type = collection['type']
+    definition = collection['definition_json']
+
+    item_types_for_collection = definition.get('item_type', ['Movie'])
+    tmdb_items = []
+    if collection_type == 'list' and definition.get('url', '').startswith('maoyan://'):
+        importer = ListImporter(processor.tmdb_api_key)
+        greenlet = gevent.spawn(importer._execute_maoyan_fetch, definition)
+        tmdb_items = greenlet.get()
+    else:
+        if collection_type == 'list':
+            importer = ListImporter(processor.tmdb_api_key)
+            tmdb_items = importer.process(definition)
+        elif collection_type == 'filter':
+            engine = FilterEngine()
+            tmdb_items = engine.execute_filter(definition)
+    
+    if not tmdb_items:
+        logger.warning(f"合集 '{collection_name}' 未能生成任何媒体ID，跳过。")
+        db_handler.update_custom_collection_after_sync(collection_id, {"emby_collection_id": None, "generated_media_info_json": "[]", "generated_emby_ids_json": "[]"})
+        return None
+
+    ordered_emby_ids_in_library = [
+        tmdb_to_emby_item_map[item['id']]['Id'] 
+        for item in tmdb_items if item['id'] in tmdb_to_emby_item_map
+    ]
+
+    emby_collection_id = emby_handler.create_or_update_collection_with_emby_ids(
+        collection_name=collection_name, 
+        emby_ids_in_library=ordered_emby_ids_in_library, 
+        base_url=processor.emby_url,
+        api_key=processor.emby_api_key, 
+        user_id=processor.emby_user_id,
+        prefetched_collection_map=prefetched_collection_map
+    )
+    
+    if not emby_collection_id:
+        raise RuntimeError("在Emby中创建或更新合集失败。")
+    
+    update_data = {
+        "emby_collection_id": emby_collection_id,
+        "item_type": json.dumps(definition.get('item_type', ['Movie'])),
+        "last_synced_at": datetime.now(pytz.utc)
+    }
+
+    if collection_type == 'list':
+        previous_media_map = {}
+        try:
+            previous_media_list = collection.get('generated_media_info_json') or []
+            previous_media_map = {str(m.get('tmdb_id')): m for m in previous_media_list}
+        except TypeError:
+            logger.warning(f"解析合集 {collection_name} 的旧媒体JSON失败...")
+        
+        image_tag = None
+        if emby_collection_id:
+            emby_collection_details = emby_handler.get_emby_item_details(emby_collection_id, processor.emby_url, processor.emby_api_key, processor.emby_user_id)
+            image_tag = emby_collection_details.get("ImageTags", {}).get("Primary")
+        
+        details_map = detail_memo.get_details_map(tmdb_items)
+        all_media_details_ordered = [details_map[item['id']] for item in tmdb_items if item['id'] in details_map]
+
+        tmdb_id_to_season_map = {str(item['id']): item.get('season') for item in tmdb_items if item.get('type') == 'Series' and item.get('season') is not None}
+        tmdb_id_to_type_map = {str(item['id']): item.get('type') for item in tmdb_items}
+        all_media_with_status, has_missing, missing_count = [], False, 0
+        today_str = datetime.now().strftime('%Y-%m-%d')
+        
+        for media in all_media_details_ordered:
+            media_tmdb_id = str(media.get("id"))
+            emby_item = tmdb_to_emby_item_map.get(media_tmdb_id)
+            
+            release_date = media.get("release_date") or media.get("first_air_date", '')
+            media_status = "unknown"
+            if emby_item: media_status = "in_library"
+            elif previous_media_map.get(media_tmdb_id, {}).get('status') == 'subscribed': media_status = "subscribed"
+            elif release_date and release_date > today_str: media_status = "unreleased"
+            else: media_status, has_missing, missing_count = "missing", True, missing_count + 1
+            
+            final_media_item = {
+                "tmdb_id": media_tmdb_id,
+                "media_type": tmdb_id_to_type_map.get(media_tmdb_id),
+                "emby_id": emby_item.get('Id') if emby_item else None,
+                "title": media.get("title") or media.get("name"),
+                "release_date": release_date,
+                "poster_path": media.get("poster_path"),
+                "status": media_status
+            }
+
+            season_number = tmdb_id_to_season_map.get(media_tmdb_id)
+            if season_number is not None:
+                final_media_item['season'] = season_number
+                final_media_item['title'] = f"{final_media_item['title']} 第 {season_number} 季"
+            
+            all_media_with_status.append(final_media_item)
+
+        update_data.update({
+            "health_status": "has_missing" if has_missing else "ok",
+            "in_library_count": len(ordered_emby_ids_in_library),
+            "missing_count": missing_count,
+            "generated_media_info_json": json.dumps(all_media_with_status, ensure_ascii=False),
+            "poster_path": f"/Items/{emby_collection_id}/Images/Primary?tag={image_tag}" if image_tag and emby_collection_id else None
+        })
+    else: 
+        # ★★★ 核心修复 1: 为规则筛选类合集生成精简版JSON ★★★
+        logger.debug(f"  -> 为规则筛选合集 '{collection_name}' 生成精简版媒体信息JSON...")
+        all_media_with_status = [
+            {
+                'tmdb_id': item['id'],
+                'media_type': item.get('type'),
+                'emby_id': tmdb_to_emby_item_map.get(item['id'], {}).get('Id')
+            }
+            for item in tmdb_items
+        ]
+        update_data.update({
+            "health_status": "ok", 
+            "in_library_count": len(ordered_emby_ids_in_library),
+            "missing_count": 0, 
+            "generated_media_info_json": json.dumps(all_media_with_status, ensure_ascii=False), 
+            "poster_path": None
+        })
+    
+    db_handler.update_custom_collection_after_sync(collection_id, update_data)
+    logger.info(f"  -> ✅ 合集 '{collection_name}' 处理完成，并已更新数据库状态。")
+
+    return {
+        "collection_name": collection_name,
+        "emby_collection_id": emby_collection_id,
+        "item_count": '榜单' if collection_type == 'list' else update_data.get('in_library_count', 0),
+        "content_types": item_types_for_collection,
+    }
+
+def _generate_custom_collection_covers(processor: MediaProcessor, cover_service: CoverGeneratorService, cover_jobs: List[Dict[str, Any]]):
+    """封面阶段：一次查询所有合集的 Emby 信息，再交给封面生成器的流水线并行生成。"""
+    collections_map = emby_handler.get_emby_items_map_by_ids(
+        processor.emby_url, processor.emby_api_key, processor.emby_user_id,
+        [job['emby_collection_id'] for job in cover_jobs], fields="Id,Name,Type"
+    ) or {}
+    # ★★★ 核心修复 2: 调用封面生成器时，传入内容类型 ★★★
+    library_jobs = [
+        {"library": collections_map[job['emby_collection_id']], "item_count": job['item_count'], "content_types": job['content_types']}
+        for job in cover_jobs if job['emby_collection_id'] in collections_map
+    ]
+    cover_service.generate_for_libraries('main_emby', library_jobs, stop_event=processor.get_stop_event())
+
 def task_process_all_custom_collections(processor: MediaProcessor):
     """
-    【V6 - Emby ID 内嵌 & 排序保持最终版】
+    【V7 - 并行处理版】
     - 在循环外一次性获取全库媒体数据，提高效率。
+    - 多个合集在有界线程池中并行处理，同一个 TMDb ID 在一次任务中只请求一次。
+    - 封面在所有合集处理完毕后单独并行生成。
     - 严格确保榜单的原始排序被存入数据库并同步到Emby。
     - 将媒体项的 Emby ID 一并存入 generated_media_info_json。
     """
@@ -1396,168 +1629,41 @@ def task_process_all_custom_collections(processor: MediaProcessor):
             
             if cover_config.get("enabled"):
                 cover_service = CoverGeneratorService(config=cover_config)
-                logger.info("  -> 封面生成器已启用，将在每个合集处理后尝试生成封面。")
+                logger.info("  -> 封面生成器已启用，将在所有合集处理完毕后统一生成封面。")
         except Exception as e_cover_init:
             logger.error(f"初始化封面生成器时失败: {e_cover_init}", exc_info=True)
 
-        for i, collection in enumerate(active_collections):
-            if processor.is_stop_requested():
-                logger.warning("任务被用户中止。")
-                break
-
-            collection_id = collection['id']
-            collection_name = collection['name']
-            collection_type = collection['type']
-            definition = collection['definition_json']
-            
-            progress = 10 + int((i / total) * 90)
-            task_manager.update_status_from_thread(progress, f"({i+1}/{total}) 正在处理: {collection_name}")
-
+        # ★★★ 多个合集并行处理，所有合集共享同一个 TMDb 详情抓取池和本次任务内的详情缓存 ★★★
+        cover_jobs = []
+        finished = 0
+        with ThreadPoolExecutor(max_workers=TMDB_DETAIL_FETCH_WORKERS) as detail_executor, \
+             ThreadPoolExecutor(max_workers=CUSTOM_COLLECTION_REFRESH_WORKERS) as collection_executor:
+            detail_memo = _TmdbDetailMemo(processor.tmdb_api_key, detail_executor)
+            future_to_collection = {
+                collection_executor.submit(
+                    _refresh_one_custom_collection, processor, collection,
+                    tmdb_to_emby_item_map, prefetched_collection_map, detail_memo
+                ): collection
+                for collection in active_collections
+            }
+            for future in as_completed(future_to_collection):
+                collection = future_to_collection[future]
+                finished += 1
+                try:
+                    cover_job = future.result()
+                    if cover_job: cover_jobs.append(cover_job)
+                except Exception as e_coll:
+                    logger.error(f"处理合集 '{collection['name']}' (ID: {collection['id']}) 时发生错误: {e_coll}", exc_info=True)
+                progress = 10 + int((finished / total) * (80 if cover_service else 90))
+                task_manager.update_status_from_thread(progress, f"({finished}/{total}) 已处理: {collection['name']}")
+        logger.info(f"  -> 本次共请求 TMDb 详情 {detail_memo.fetch_count} 次（去重后）。")
+
+        if cover_service and cover_jobs and not processor.is_stop_requested():
+            task_manager.update_status_from_thread(90, f"正在为 {len(cover_jobs)} 个合集生成封面...")
             try:
-                item_types_for_collection = definition.get('item_type', ['Movie'])
-                tmdb_items = []
-                if collection_type == 'list' and definition.get('url', '').startswith('maoyan://'):
-                    importer = ListImporter(processor.tmdb_api_key)
-                    greenlet = gevent.spawn(importer._execute_maoyan_fetch, definition)
-                    tmdb_items = greenlet.get()
-                else:
-                    if collection_type == 'list':
-                        importer = ListImporter(processor.tmdb_api_key)
-                        tmdb_items = importer.process(definition)
-                    elif collection_type == 'filter':
-                        engine = FilterEngine()
-                        tmdb_items = engine.execute_filter(definition)
-                
-                if not tmdb_items:
-                    logger.warning(f"合集 '{collection_name}' 未能生成任何媒体ID，跳过。")
-                    db_handler.update_custom_collection_after_sync(collection_id, {"emby_collection_id": None, "generated_media_info_json": "[]", "generated_emby_ids_json": "[]"})
-                    continue
-
-                ordered_emby_ids_in_library = [
-                    tmdb_to_emby_item_map[item['id']]['Id'] 
-                    for item in tmdb_items if item['id'] in tmdb_to_emby_item_map
-                ]
-
-                emby_collection_id = emby_handler.create_or_update_collection_with_emby_ids(
-                    collection_name=collection_name, 
-                    emby_ids_in_library=ordered_emby_ids_in_library, 
-                    base_url=processor.emby_url,
-                    api_key=processor.emby_api_key, 
-                    user_id=processor.emby_user_id,
-                    prefetched_collection_map=prefetched_collection_map
-                )
-                
-                if not emby_collection_id:
-                    raise RuntimeError("在Emby中创建或更新合集失败。")
-                
-                update_data = {
-                    "emby_collection_id": emby_collection_id,
-                    "item_type": json.dumps(definition.get('item_type', ['Movie'])),
-                    "last_synced_at": datetime.now(pytz.utc)
-                }
-
-                if collection_type == 'list':
-                    previous_media_map = {}
-                    try:
-                        previous_media_list = collection.get('generated_media_info_json') or []
-                        previous_media_map = {str(m.get('tmdb_id')): m for m in previous_media_list}
-                    except TypeError:
-                        logger.warning(f"解析合集 {collection_name} 的旧媒体JSON失败...")
-                    
-                    image_tag = None
-                    if emby_collection_id:
-                        emby_collection_details = emby_handler.get_emby_item_details(emby_collection_id, processor.emby_url, processor.emby_api_key, processor.emby_user_id)
-                        image_tag = emby_collection_details.get("ImageTags", {}).get("Primary")
-                    
-                    all_media_details_unordered = []
-                    with ThreadPoolExecutor(max_workers=5) as executor:
-                        future_to_item = {executor.submit(tmdb_handler.get_movie_details if item['type'] != 'Series' else tmdb_handler.get_tv_details_tmdb, item['id'], processor.tmdb_api_key): item for item in tmdb_items}
-                        for future in as_completed(future_to_item):
-                            try:
-                                detail = future.result()
-                                if detail: all_media_details_unordered.append(detail)
-                            except Exception as exc:
-                                logger.error(f"获取TMDb详情时线程内出错: {exc}")
-                    
-                    details_map = {str(d.get("id")): d for d in all_media_details_unordered}
-                    all_media_details_ordered = [details_map[item['id']] for item in tmdb_items if item['id'] in details_map]
-
-                    tmdb_id_to_season_map = {str(item['id']): item.get('season') for item in tmdb_items if item.get('type') == 'Series' and item.get('season') is not None}
-                    all_media_with_status, has_missing, missing_count = [], False, 0
-                    today_str = datetime.now().strftime('%Y-%m-%d')
-                    
-                    for media in all_media_details_ordered:
-                        media_tmdb_id = str(media.get("id"))
-                        emby_item = tmdb_to_emby_item_map.get(media_tmdb_id)
-                        
-                        release_date = media.get("release_date") or media.get("first_air_date", '')
-                        media_status = "unknown"
-                        if emby_item: media_status = "in_library"
-                        elif previous_media_map.get(media_tmdb_id, {}).get('status') == 'subscribed': media_status = "subscribed"
-                        elif release_date and release_date > today_str: media_status = "unreleased"
-                        else: media_status, has_missing, missing_count = "missing", True, missing_count + 1
-                        
-                        final_media_item = {
-                            "tmdb_id": media_tmdb_id,
-                            "emby_id": emby_item.get('Id') if emby_item else None,
-                            "title": media.get("title") or media.get("name"),
-                            "release_date": release_date,
-                            "poster_path": media.get("poster_path"),
-                            "status": media_status
-                        }
-
-                        season_number = tmdb_id_to_season_map.get(media_tmdb_id)
-                        if season_number is not None:
-                            final_media_item['season'] = season_number
-                            final_media_item['title'] = f"{final_media_item['title']} 第 {season_number} 季"
-                        
-                        all_media_with_status.append(final_media_item)
-
-                    update_data.update({
-                        "health_status": "has_missing" if has_missing else "ok",
-                        "in_library_count": len(ordered_emby_ids_in_library),
-                        "missing_count": missing_count,
-                        "generated_media_info_json": json.dumps(all_media_with_status, ensure_ascii=False),
-                        "poster_path": f"/Items/{emby_collection_id}/Images/Primary?tag={image_tag}" if image_tag and emby_collection_id else None
-                    })
-                else: 
-                    # ★★★ 核心修复 1: 为规则筛选类合集生成精简版JSON ★★★
-                    logger.debug(f"  -> 为规则筛选合集 '{collection_name}' 生成精简版媒体信息JSON...")
-                    all_media_with_status = [
-                        {
-                            'tmdb_id': item['id'],
-                            'emby_id': tmdb_to_emby_item_map.get(item['id'], {}).get('Id')
-                        }
-                        for item in tmdb_items
-                    ]
-                    update_data.update({
-                        "health_status": "ok", 
-                        "in_library_count": len(ordered_emby_ids_in_library),
-                        "missing_count": 0, 
-                        "generated_media_info_json": json.dumps(all_media_with_status, ensure_ascii=False), 
-                        "poster_path": None
-                    })
-                
-                db_handler.update_custom_collection_after_sync(collection_id, update_data)
-                logger.info(f"  -> ✅ 合集 '{collection_name}' 处理完成，并已更新数据库状态。")
-
-                if cover_service and emby_collection_id:
-                    logger.info(f"  -> 正在为合集 '{collection_name}' 生成封面...")
-                    library_info = emby_handler.get_emby_item_details(emby_collection_id, processor.emby_url, processor.emby_api_key, processor.emby_user_id)
-                    if library_info:
-                        item_count_to_pass = update_data.get('in_library_count', 0)
-                        if collection_type == 'list': item_count_to_pass = '榜单'
-                        
-                        # ★★★ 核心修复 2: 调用封面生成器时，传入内容类型 ★★★
-                        cover_service.generate_for_library(
-                            emby_server_id='main_emby',
-                            library=library_info,
-                            item_count=item_count_to_pass,
-                            content_types=item_types_for_collection
-                        )
-            except Exception as e_coll:
-                logger.error(f"处理合集 '{collection_name}' (ID: {collection_id}) 时发生错误: {e_coll}", exc_info=True)
-                continue
+                _generate_custom_collection_covers(processor, cover_service, cover_jobs)
+            except Exception as e_cover:
+                logger.error(f"生成合集封面时发生错误: {e_cover}", exc_info=True)
         
         final_message = "所有启用的自定义合集均已处理完毕！"
         if processor.is_stop_requested(): final_message = "任务已中止。"
@@ -1663,6 +1769,7 @@ def task_process_custom_collection(processor: MediaProcessor, custom_collection_
             all_media_details_ordered = [details_map[item['id']] for item in tmdb_items if item['id'] in details_map]
             
             tmdb_id_to_season_map = {str(item['id']): item.get('season') for item in tmdb_items if item.get('type') == 'Series' and item.get('season') is not None}
+            tmdb_id_to_type_map = {str(item['id']): item.get('type') for item in tmdb_items}
             all_media_with_status, has_missing, missing_count = [], False, 0
             today_str = datetime.now().strftime('%Y-%m-%d')
             
@@ -1679,6 +1786,7 @@ def task_process_custom_collection(processor: MediaProcessor, custom_collection_
                 
                 final_media_item = {
                     "tmdb_id": media_tmdb_id,
+                    "media_type": tmdb_id_to_type_map.get(media_tmdb_id),
                     "emby_id": emby_item.get('Id') if emby_item else None,
                     "title": media.get("title") or media.get("name"),
                     "release_date": release_date,
@@ -1703,7 +1811,7 @@ def task_process_custom_collection(processor: MediaProcessor, custom_collection_
             logger.info(f"  -> 已为RSS合集 '{collection_name}' 分析健康状态。")
         else: 
             task_manager.update_status_from_thread(95, "筛选合集已生成，跳过缺失分析。")
-            all_media_with_status = [{'tmdb_id': item['id'], 'emby_id': tmdb_to_emby_item_map.get(item['id'], {}).get('Id')} for item in tmdb_items]
+            all_media_with_status = [{'tmdb_id': item['id'], 'media_type': item.get('type'), 'emby_id': tmdb_to_emby_item_map.get(item['id'], {}).get('Id')} for item in tmdb_items]
             update_data.update({
                 "health_status": "ok", "in_library_count": len(ordered_emby_ids_in_library),
                 "missing_count": 0, 
@@ -1828,6 +1936,25 @@ def task_populate_metadata_cache(processor: 'MediaProcessor', batch_size: int =
             logger.info("任务在冗余数据清理后被中止。")
             return
 
+        # ★★★ 顺带把 Emby ID 回填/校正到已有条目上，本地片名搜索索引依赖它把结果映射回 Emby 项目 ★★★
+        id_rows = [
+            (tmdb_id, item.get("Type"), item.get("Id"))
+            for tmdb_id, item in emby_items_map.items() if item.get("Id") and item.get("Type")
+        ]
+        if id_rows:
+            with db_handler.get_db_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    UPDATE media_metadata AS m
+                    SET emby_item_id = d.emby_item_id, last_updated_at = NOW()
+                    FROM unnest(%s::text[], %s::text[], %s::text[]) AS d(tmdb_id, item_type, emby_item_id)
+                    WHERE m.tmdb_id = d.tmdb_id AND m.item_type = d.item_type
+                      AND m.emby_item_id IS DISTINCT FROM d.emby_item_id
+                """, ([r[0] for r in id_rows], [r[1] for r in id_rows], [r[2] for r in id_rows]))
+                if cursor.rowcount:
+                    logger.info(f"  -> 已为 {cursor.rowcount} 个媒体项回填 Emby ID。")
+                conn.commit()
+
         items_to_process = [emby_items_map[tmdb_id] for tmdb_id in ids_to_process]
         
         total_to_process = len(items_to_process)
@@ -1940,7 +2067,7 @@ def task_populate_metadata_cache(processor: 'MediaProcessor', batch_size: int =
                 unified_rating = get_unified_rating(official_rating)    # 即使 official_rating 是 None，函数也能处理
 
                 metadata_to_save = {
-                    "tmdb_id": tmdb_id, "item_type": full_details_emby.get("Type"),
+                    "tmdb_id": tmdb_id, "item_type": full_details_emby.get("Type"), "emby_item_id": full_details_emby.get('Id'),
                     "title": full_details_emby.get('Name'), "original_title": full_details_emby.get('OriginalTitle'),
                     "release_year": full_details_emby.get('ProductionYear'), "rating": full_details_emby.get('CommunityRating'),
                     "official_rating": official_rating, # 保留原始值用于调试
@@ -2015,9 +2142,10 @@ def task_populate_metadata_cache(processor: 'MediaProcessor', batch_size: int =
 # ★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★
 # ★★★ 新增：立即生成所有媒体库封面的后台任务 ★★★
 # ★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★
-def task_generate_all_covers(processor: MediaProcessor):
+def task_generate_all_covers(processor: MediaProcessor, force: bool = False):
     """
     后台任务：为所有（未被忽略的）媒体库生成封面。
+    输入未变化的媒体库会被跳过，force=True 时全部重新生成。
     """
     task_name = "一键生成所有媒体库封面"
     logger.trace(f"--- 开始执行 '{task_name}' 任务 ---")
@@ -2070,7 +2198,7 @@ def task_generate_all_covers(processor: MediaProcessor):
             
         logger.info(f"  -> 将为 {total} 个媒体库生成封面: {[lib['Name'] for lib in libraries_to_process]}")
         
-        # 4. 实例化服务并循环处理
+        # 4. 实例化服务，统计各库项目数后批量生成
         cover_service = CoverGeneratorService(config=cover_config)
         
         TYPE_MAP = {
@@ -2082,12 +2210,7 @@ def task_generate_all_covers(processor: MediaProcessor):
             'audiobooks': 'AudioBook'  # <-- 增加有声读物的映射
         }
 
-        for i, library in enumerate(libraries_to_process):
-            if processor.is_stop_requested(): break
-            
-            progress = 10 + int((i / total) * 90)
-            task_manager.update_status_from_thread(progress, f"({i+1}/{total}) 正在处理: {library.get('Name')}")
-            
+        def count_library_items(library):
             try:
                 library_id = library.get('Id')
                 collection_type = library.get('CollectionType')
@@ -2114,15 +2237,27 @@ def task_generate_all_covers(processor: MediaProcessor):
                         parent_id=library_id,
                         item_type=item_type_to_query
                     ) or 0
-
-                cover_service.generate_for_library(
-                    emby_server_id='main_emby', # 这里的 server_id 只是一个占位符，不影响忽略逻辑
-                    library=library,
-                    item_count=item_count
-                )
-            except Exception as e_gen:
-                logger.error(f"为媒体库 '{library.get('Name')}' 生成封面时发生错误: {e_gen}", exc_info=True)
-                continue
+                return item_count
+            except Exception as e_count:
+                logger.error(f"统计媒体库 '{library.get('Name')}' 的项目数时发生错误: {e_count}", exc_info=True)
+                return 0
+
+        task_manager.update_status_from_thread(10, f"正在统计 {total} 个媒体库的项目数...")
+        with ThreadPoolExecutor(max_workers=5) as count_executor:
+            item_counts = list(count_executor.map(count_library_items, libraries_to_process))
+
+        # 下载、渲染、上传三个阶段在封面服务内部并行流水线执行
+        task_manager.update_status_from_thread(20, f"正在为 {total} 个媒体库并行生成封面...")
+        results = cover_service.generate_for_libraries(
+            'main_emby', # 这里的 server_id 只是一个占位符，不影响忽略逻辑
+            [{"library": library, "item_count": count} for library, count in zip(libraries_to_process, item_counts)],
+            stop_event=processor.get_stop_event(),
+            progress_callback=lambda done, library: task_manager.update_status_from_thread(
+                20 + int((done / total) * 80), f"({done}/{total}) 已处理: {library.get('Name')}"
+            ),
+            force=force
+        )
+        logger.info(f"  -> 封面生成完成：成功 {sum(1 for r in results if r)}/{total} 个媒体库。")
         
         final_message = "所有媒体库封面已处理完毕！"
         if processor.is_stop_requested(): final_message = "任务已中止。"
@@ -2160,186 +2295,141 @@ def _build_resubscribe_payload(item_details: dict, config: dict) -> Optional[dic
     logger.info(f"  -> 发现不合规项目: 《{item_name}》。原因: {reason}。将提交纯粹的洗版请求。")
     return payload
 
-def _item_needs_resubscribe(item_details: dict, config: dict, media_metadata: Optional[dict] = None) -> tuple[bool, str]:
+# 各种中文语言代码，音轨和字幕共用
+CHINESE_LANG_CODES = frozenset({'chi', 'zho', 'zh-cn', 'zh-hans', 'zh-sg', 'cmn', 'yue'})
+# 字幕检查中，音轨信息无效时按制片国豁免中文字幕的地区
+CHINESE_REGIONS = frozenset({'中国', '中国大陆', '香港', '中国香港', '台湾', '中国台湾', '新加坡'})
+RESOLUTION_THRESHOLD_NAMES = {3840: "4K", 1920: "1080p", 1280: "720p"}
+
+class CompiledResubscribeRule:
     """
-    【V9 - 中文识别升级版】
-    - 升级了字幕和音轨的中文识别逻辑，使其能够识别 zh-cn, zh-hans 等多种中文代码。
+    编译后的洗版规则：规则里的阈值、质量/特效关键词、音轨/字幕语言在构造时一次性解析成列表和集合，
+    evaluate() 对每个项目只做匹配。判断结果与逐项解析规则的旧实现完全一致。
     """
-    item_name = item_details.get('Name', '未知项目')
-    logger.trace(f"  -> 开始为《{item_name}》检查洗版需求 ---")
-    
-    media_streams = item_details.get('MediaStreams', [])
-    file_path = item_details.get('Path', '')
-    file_name_lower = os.path.basename(file_path).lower() if file_path else ""
 
-    reasons = []
-    video_stream = next((s for s in media_streams if s.get('Type') == 'Video'), None)
-
-    # --- ★★★ 核心改造 1/3: 定义一个更全面的中文代码集合 ★★★ ---
-    CHINESE_LANG_CODES = {'chi', 'zho', 'zh-cn', 'zh-hans', 'zh-sg', 'cmn', 'yue'}
-    CHINESE_SUB_CODES = CHINESE_LANG_CODES
-    CHINESE_AUDIO_CODES = CHINESE_LANG_CODES
-
-    # 1. 分辨率检查
-    try:
-        if config.get("resubscribe_resolution_enabled"):
+    def __init__(self, rule: dict):
+        self.rule = rule
+        self.resolution_enabled = bool(rule.get("resubscribe_resolution_enabled"))
+        self.resolution_threshold: Optional[int] = None
+        if self.resolution_enabled:
+            try:
+                self.resolution_threshold = int(rule.get("resubscribe_resolution_threshold") or 1920)
+            except (ValueError, TypeError) as e:
+                logger.warning(f"  -> [分辨率检查] 规则 '{rule.get('name')}' 的阈值无效，已跳过: {e}")
+        self.resolution_reason = f"分辨率低于{RESOLUTION_THRESHOLD_NAMES.get(self.resolution_threshold, '未知分辨率')}"
+
+        self.quality_terms = self._compile_terms(rule, "resubscribe_quality_enabled", "resubscribe_quality_include", "质量检查")
+        self.effect_terms = self._compile_terms(rule, "resubscribe_effect_enabled", "resubscribe_effect_include", "特效检查")
+
+        self.audio_required = self._compile_langs(rule, "resubscribe_audio_enabled", "resubscribe_audio_missing_languages")
+        if self.audio_required:
+            self.audio_requires_chinese = not self.audio_required.isdisjoint(CHINESE_LANG_CODES)
+            self.audio_other_required = self.audio_required - CHINESE_LANG_CODES
+
+        self.subtitle_required = self._compile_langs(rule, "resubscribe_subtitle_enabled", "resubscribe_subtitle_missing_languages")
+        if self.subtitle_required:
+            self.subtitle_requires_chinese = not self.subtitle_required.isdisjoint(CHINESE_LANG_CODES)
+            self.subtitle_other_required = self.subtitle_required - CHINESE_LANG_CODES
+
+    @staticmethod
+    def _compile_terms(rule: dict, enabled_key: str, list_key: str, check_name: str) -> Optional[Tuple[str, ...]]:
+        if not rule.get(enabled_key):
+            return None
+        required_list_raw = rule.get(list_key, [])
+        if not isinstance(required_list_raw, list):
+            logger.warning(f"  -> [{check_name}] 配置中的 '{list_key}' 不是列表，已跳过。")
+            return None
+        return tuple(str(term).lower() for term in required_list_raw) or None
+
+    @staticmethod
+    def _compile_langs(rule: dict, enabled_key: str, list_key: str) -> Optional[frozenset]:
+        if not rule.get(enabled_key):
+            return None
+        required_langs_raw = rule.get(list_key, [])
+        if not isinstance(required_langs_raw, list) or not required_langs_raw:
+            return None
+        return frozenset(str(lang).lower() for lang in required_langs_raw)
+
+    def evaluate(self, item_details: dict, media_metadata: Optional[dict] = None) -> Tuple[bool, str]:
+        item_name = item_details.get('Name', '未知项目')
+        media_streams = item_details.get('MediaStreams', [])
+        file_path = item_details.get('Path', '')
+        file_name_lower = os.path.basename(file_path).lower() if file_path else ""
+        video_stream = next((s for s in media_streams if s.get('Type') == 'Video'), None)
+        reasons = []
+
+        # 1. 分辨率检查
+        if self.resolution_enabled:
             if not video_stream:
                 reasons.append("无视频流信息")
-            else:
-                threshold = int(config.get("resubscribe_resolution_threshold") or 1920)
-                current_width = int(video_stream.get('Width') or 0)
-                logger.trace(f"  -> [分辨率检查] 阈值: {threshold}px, 当前宽度: {current_width}px")
-                if 0 < current_width < threshold:
-                    threshold_name = "未知分辨率"
-                    if threshold == 3840: threshold_name = "4K"
-                    elif threshold == 1920: threshold_name = "1080p"
-                    elif threshold == 1280: threshold_name = "720p"
-                    reasons.append(f"分辨率低于{threshold_name}")
-    except (ValueError, TypeError) as e:
-        logger.warning(f"  -> [分辨率检查] 处理时发生类型错误: {e}")
-
-    # 2. 质量检查
-    try:
-        if config.get("resubscribe_quality_enabled"):
-            required_list_raw = config.get("resubscribe_quality_include", [])
-            if isinstance(required_list_raw, list) and required_list_raw:
-                required_list = [str(q).lower() for q in required_list_raw]
-                logger.trace(f"  -> [质量检查] 要求: {required_list}")
-
-                quality_met = False
-
-                # 优先从文件名匹配
-                if any(required_term in file_name_lower for required_term in required_list):
-                    quality_met = True
-                    logger.trace(f"  -> [质量检查] 文件名匹配成功。")
-                else:
-                    # 文件名匹配不到，从 MediaStreams 匹配
-                    if video_stream:
-                        # Combine relevant video stream properties into a searchable string
-                        video_stream_info = f"{video_stream.get('Codec', '')} {video_stream.get('Profile', '')} {video_stream.get('VideoRange', '')} {video_stream.get('VideoRangeType', '')} {video_stream.get('DisplayTitle', '')}".lower()
-                        logger.trace(f"  -> [质量检查] MediaStream信息: '{video_stream_info}'")
-                        if any(required_term in video_stream_info for required_term in required_list):
-                            quality_met = True
-                            logger.trace(f"  -> [质量检查] MediaStream匹配成功。")
-
-                if not quality_met:
-                    reasons.append("质量不达标")
-            elif not isinstance(required_list_raw, list):
-                logger.warning(f"  -> [质量检查] 配置中的 'resubscribe_quality_include' 不是列表，已跳过。")
-    except Exception as e:
-        logger.warning(f"  -> [质量检查] 处理时发生未知错误: {e}")
-
-    # 3. 特效检查
-    try:
-        if config.get("resubscribe_effect_enabled"):
-            required_list_raw = config.get("resubscribe_effect_include", [])
-            if isinstance(required_list_raw, list) and required_list_raw:
-                required_list = [str(e).lower() for e in required_list_raw]
-                logger.trace(f"  -> [特效检查] 要求: {required_list}")
-
-                effect_met = False
-
-                # 优先从文件名匹配
-                if any(required_term in file_name_lower for required_term in required_list):
-                    effect_met = True
-                    logger.trace(f"  -> [特效检查] 文件名匹配成功。")
-                else:
-                    # 文件名匹配不到，从 MediaStreams 匹配
-                    if video_stream:
-                        # Combine relevant video stream properties for effects
-                        video_stream_effect_info = f"{video_stream.get('VideoRange', '')} {video_stream.get('VideoRangeType', '')} {video_stream.get('DisplayTitle', '')}".lower()
-                        logger.trace(f"  -> [特效检查] MediaStream效果信息: '{video_stream_effect_info}'")
-                        if any(required_term in video_stream_effect_info for required_term in required_list):
-                            effect_met = True
-                            logger.trace(f"  -> [特效检查] MediaStream匹配成功。")
-
-                if not effect_met:
-                    reasons.append("特效不达标")
-            elif not isinstance(required_list_raw, list):
-                logger.warning(f"  -> [特效检查] 配置中的 'resubscribe_effect_include' 不是列表，已跳过。")
-    except Exception as e:
-        logger.warning(f"  -> [特效检查] 处理时发生未知错误: {e}")
-
-    # 4. 音轨检查
-    try:
-        if config.get("resubscribe_audio_enabled"):
-            required_langs_raw = config.get("resubscribe_audio_missing_languages", [])
-            if isinstance(required_langs_raw, list) and required_langs_raw:
-                required_langs = set(str(lang).lower() for lang in required_langs_raw)
-                present_langs = {str(s.get('Language', '')).lower() for s in media_streams if s.get('Type') == 'Audio' and s.get('Language')}
-                
-                # --- ★★★ 核心改造 2/3: 使用新的中文代码集合进行判断 ★★★ ---
-                # 检查要求的语言是否包含任何一种中文
-                requires_chinese = not required_langs.isdisjoint(CHINESE_LANG_CODES)
-                # 检查现有的音轨是否包含任何一种中文
-                has_chinese = not present_langs.isdisjoint(CHINESE_LANG_CODES)
-
-                # 如果要求中文但没有中文，则标记为缺失
-                if requires_chinese and not has_chinese:
-                    reasons.append("缺中文音轨")
-                
-                # 检查其他非中文的语言
-                other_required_langs = required_langs - CHINESE_LANG_CODES
-                if not other_required_langs.issubset(present_langs):
-                    reasons.append("缺其他音轨")
-
-    except Exception as e:
-        logger.warning(f"  -> [音轨检查] 处理时发生未知错误: {e}")
-
-    # 5. 字幕检查
-    try:
-        if config.get("resubscribe_subtitle_enabled"):
-            required_langs_raw = config.get("resubscribe_subtitle_missing_languages", [])
-            if isinstance(required_langs_raw, list) and required_langs_raw:
-                required_langs = set(str(lang).lower() for lang in required_langs_raw)
-                
-                # --- ★★★ 核心改造 3/3: 使用新的中文代码集合进行豁免和判断 ★★★ ---
-                CHINESE_REGIONS = {'中国', '中国大陆', '香港', '中国香港', '台湾', '中国台湾', '新加坡'}
-                
-                # 检查是否要求中文字幕
-                needs_chinese_sub = not required_langs.isdisjoint(CHINESE_SUB_CODES)
-                
-                if needs_chinese_sub:
-                    is_exempted = False
-                    present_audio_langs = {str(s.get('Language', '')).lower() for s in media_streams if s.get('Type') == 'Audio' and s.get('Language')}
-
-                    # Plan A: 检查是否已有中文音轨
-                    if not present_audio_langs.isdisjoint(CHINESE_AUDIO_CODES):
-                        is_exempted = True
-                    
-                    # Plan B: 如果音轨信息无效，则检查制片国
-                    elif 'und' in present_audio_langs or not present_audio_langs:
-                        if media_metadata and media_metadata.get('countries_json'):
-                            countries = set(media_metadata['countries_json'])
-                            if not countries.isdisjoint(CHINESE_REGIONS):
-                                is_exempted = True
-
-                    # 如果没有被豁免，才去真正检查字幕
-                    if not is_exempted:
-                        present_sub_langs = {str(s.get('Language', '')).lower() for s in media_streams if s.get('Type') == 'Subtitle' and s.get('Language')}
-                        if present_sub_langs.isdisjoint(CHINESE_SUB_CODES):
-                            reasons.append("缺中文字幕")
-                
-                # 检查其他非中文的字幕
-                other_required_subs = required_langs - CHINESE_SUB_CODES
-                if other_required_subs:
-                    present_sub_langs = {str(s.get('Language', '')).lower() for s in media_streams if s.get('Type') == 'Subtitle' and s.get('Language')}
-                    if not other_required_subs.issubset(present_sub_langs):
-                        reasons.append("缺其他字幕")
-
-    except Exception as e:
-        logger.warning(f"  -> [字幕检查] 处理时发生未知错误: {e}")
-                 
-    if reasons:
-        # 使用 set 去重，避免出现 "缺其他音轨; 缺其他字幕" 这种重复提示
-        unique_reasons = sorted(list(set(reasons)))
-        final_reason = "; ".join(unique_reasons)
-        logger.info(f"  -> 《{item_name}》需要洗版。原因: {final_reason}")
-        return True, final_reason
-    else:
+            elif self.resolution_threshold is not None:
+                try:
+                    current_width = int(video_stream.get('Width') or 0)
+                    if 0 < current_width < self.resolution_threshold:
+                        reasons.append(self.resolution_reason)
+                except (ValueError, TypeError) as e:
+                    logger.warning(f"  -> [分辨率检查] 处理时发生类型错误: {e}")
+
+        # 2. 质量检查：优先匹配文件名，其次匹配视频流信息
+        if self.quality_terms:
+            quality_met = any(term in file_name_lower for term in self.quality_terms)
+            if not quality_met and video_stream:
+                video_stream_info = f"{video_stream.get('Codec', '')} {video_stream.get('Profile', '')} {video_stream.get('VideoRange', '')} {video_stream.get('VideoRangeType', '')} {video_stream.get('DisplayTitle', '')}".lower()
+                quality_met = any(term in video_stream_info for term in self.quality_terms)
+            if not quality_met:
+                reasons.append("质量不达标")
+
+        # 3. 特效检查
+        if self.effect_terms:
+            effect_met = any(term in file_name_lower for term in self.effect_terms)
+            if not effect_met and video_stream:
+                video_stream_effect_info = f"{video_stream.get('VideoRange', '')} {video_stream.get('VideoRangeType', '')} {video_stream.get('DisplayTitle', '')}".lower()
+                effect_met = any(term in video_stream_effect_info for term in self.effect_terms)
+            if not effect_met:
+                reasons.append("特效不达标")
+
+        present_audio_langs = None
+        if self.audio_required or self.subtitle_required:
+            present_audio_langs = {str(s.get('Language', '')).lower() for s in media_streams if s.get('Type') == 'Audio' and s.get('Language')}
+
+        # 4. 音轨检查
+        if self.audio_required:
+            if self.audio_requires_chinese and present_audio_langs.isdisjoint(CHINESE_LANG_CODES):
+                reasons.append("缺中文音轨")
+            if not self.audio_other_required.issubset(present_audio_langs):
+                reasons.append("缺其他音轨")
+
+        # 5. 字幕检查：已有中文音轨，或音轨信息无效但制片国属于华语地区时，豁免中文字幕要求
+        if self.subtitle_required:
+            present_sub_langs = {str(s.get('Language', '')).lower() for s in media_streams if s.get('Type') == 'Subtitle' and s.get('Language')}
+            if self.subtitle_requires_chinese:
+                is_exempted = False
+                if not present_audio_langs.isdisjoint(CHINESE_LANG_CODES):
+                    is_exempted = True
+                elif 'und' in present_audio_langs or not present_audio_langs:
+                    if media_metadata and media_metadata.get('countries_json'):
+                        if not set(media_metadata['countries_json']).isdisjoint(CHINESE_REGIONS):
+                            is_exempted = True
+                if not is_exempted and present_sub_langs.isdisjoint(CHINESE_LANG_CODES):
+                    reasons.append("缺中文字幕")
+            if self.subtitle_other_required and not self.subtitle_other_required.issubset(present_sub_langs):
+                reasons.append("缺其他字幕")
+
+        if reasons:
+            # 使用 set 去重，避免出现 "缺其他音轨; 缺其他字幕" 这种重复提示
+            final_reason = "; ".join(sorted(set(reasons)))
+            logger.info(f"  -> 《{item_name}》需要洗版。原因: {final_reason}")
+            return True, final_reason
         logger.debug(f"  -> 《{item_name}》质量达标。")
         return False, ""
 
+def _item_needs_resubscribe(item_details: dict, config: dict, media_metadata: Optional[dict] = None) -> tuple[bool, str]:
+    """
+    【V10 - 编译规则版】
+    单次检查的便捷入口。批量检查时请先用 CompiledResubscribeRule 编译规则再逐项调用 evaluate()，避免重复解析。
+    """
+    return CompiledResubscribeRule(config).evaluate(item_details, media_metadata)
+
 def task_resubscribe_library(processor: MediaProcessor):
     """【V7 - 优化数据流最终版】后台任务：订阅成功后，根据规则删除或更新缓存。"""
     task_name = "媒体洗版"
@@ -2364,59 +2454,72 @@ def task_resubscribe_library(processor: MediaProcessor):
         logger.info(f"  -> 共找到 {total_needed} 个项目待处理，将开始订阅...")
         resubscribed_count = 0
         deleted_count = 0
+        submitted_counter = [0]
+        counter_lock = threading.Lock()
 
-        for i, item in enumerate(items_to_resubscribe):
-            if processor.is_stop_requested(): break
-            
-            current_quota = db_handler.get_subscription_quota()
-            if current_quota <= 0:
-                logger.warning("  -> 每日订阅配额已用尽，任务提前结束。")
-                break
-
+        def finish_item(item):
+            """订阅成功后立即落库：根据规则删除源文件或标记为已订阅，中途重启也不会重复提交。"""
+            nonlocal resubscribed_count, deleted_count
             item_name = item.get('item_name')
             item_id = item.get('item_id')
+            with counter_lock:
+                resubscribed_count += 1
+
+            matched_rule_id = item.get('matched_rule_id')
+            rule = next((r for r in all_rules if r['id'] == matched_rule_id), None) if matched_rule_id else None
+
+            # --- ★★★ 核心逻辑改造：根据规则决定是“删除”还是“更新” ★★★ ---
+            if rule and rule.get('delete_after_resubscribe'):
+                logger.warning(f"规则 '{rule['name']}' 要求删除源文件，正在删除 Emby 项目: {item_name} (ID: {item_id})")
+                delete_success = emby_handler.delete_item(
+                    item_id=item_id, emby_server_url=processor.emby_url,
+                    emby_api_key=processor.emby_api_key, user_id=processor.emby_user_id
+                )
+                if delete_success:
+                    # 如果 Emby 项删除成功，就从我们的缓存里也删除
+                    db_handler.delete_resubscribe_cache_item(item_id)
+                    with counter_lock:
+                        deleted_count += 1
+                else:
+                    # 如果 Emby 项删除失败，那我们只更新状态，让用户知道订阅成功了但删除失败
+                    db_handler.update_resubscribe_item_status(item_id, 'subscribed')
+            else:
+                # 如果没有删除规则，就正常更新状态
+                db_handler.update_resubscribe_item_status(item_id, 'subscribed')
+
+        def submit_item(item):
+            with counter_lock:
+                submitted_counter[0] += 1
+                index = submitted_counter[0]
             task_manager.update_status_from_thread(
-                int((i / total_needed) * 100), 
-                f"({i+1}/{total_needed}) [配额:{current_quota}] 正在订阅: {item_name}"
+                int(((index - 1) / total_needed) * 100), 
+                f"({index}/{total_needed}) 正在订阅: {item.get('item_name')}"
             )
-
             payload = {
-                "name": item_name, "tmdbid": int(item['tmdb_id']),
+                "name": item.get('item_name'), "tmdbid": int(item['tmdb_id']),
                 "type": "电影" if item['item_type'] == "Movie" else "电视剧",
                 "best_version": 1
             }
-            
             success = moviepilot_handler.subscribe_with_custom_payload(payload, config)
-            
             if success:
-                db_handler.decrement_subscription_quota()
-                resubscribed_count += 1
-                
-                matched_rule_id = item.get('matched_rule_id')
-                rule = next((r for r in all_rules if r['id'] == matched_rule_id), None) if matched_rule_id else None
-
-                # --- ★★★ 核心逻辑改造：根据规则决定是“删除”还是“更新” ★★★ ---
-                if rule and rule.get('delete_after_resubscribe'):
-                    logger.warning(f"规则 '{rule['name']}' 要求删除源文件，正在删除 Emby 项目: {item_name} (ID: {item_id})")
-                    delete_success = emby_handler.delete_item(
-                        item_id=item_id, emby_server_url=processor.emby_url,
-                        emby_api_key=processor.emby_api_key, user_id=processor.emby_user_id
-                    )
-                    if delete_success:
-                        # 如果 Emby 项删除成功，就从我们的缓存里也删除
-                        db_handler.delete_resubscribe_cache_item(item_id)
-                        deleted_count += 1
-                    else:
-                        # 如果 Emby 项删除失败，那我们只更新状态，让用户知道订阅成功了但删除失败
-                        db_handler.update_resubscribe_item_status(item_id, 'subscribed')
-                else:
-                    # 如果没有删除规则，就正常更新状态
-                    db_handler.update_resubscribe_item_status(item_id, 'subscribed')
-                
-                if i < total_needed - 1: time.sleep(delay)
+                try:
+                    finish_item(item)
+                except Exception as e:
+                    # 订阅已经成功，配额不应归还，这里只记录后续处理的错误
+                    logger.error(f"项目 '{item.get('item_name')}' 订阅成功，但后续处理失败: {e}", exc_info=True)
+            return success
+
+        # 一次性预留与待处理数量相同的配额，有限并发提交，提交间隔仍遵循配置的延时；结束时归还未用掉的配额
+        with db_handler.SubscriptionQuotaReservation(block_size=total_needed) as quota:
+            results = _submit_subscriptions_with_quota(
+                [lambda it=item: submit_item(it) for item in items_to_resubscribe], quota, processor, delay=delay
+            )
+        quota_exhausted = None in results
+        if quota_exhausted:
+            logger.warning("  -> 每日订阅配额已用尽，部分项目未提交。")
 
         final_message = f"任务完成！成功提交 {resubscribed_count} 个订阅，并根据规则删除了 {deleted_count} 个媒体项。"
-        if not processor.is_stop_requested() and current_quota <= 0:
+        if not processor.is_stop_requested() and quota_exhausted:
              final_message = f"配额用尽！成功提交 {resubscribed_count} 个订阅，删除 {deleted_count} 个媒体项。"
         task_manager.update_status_from_thread(100, final_message)
 
@@ -2424,6 +2527,32 @@ def task_resubscribe_library(processor: MediaProcessor):
         logger.error(f"执行 '{task_name}' 任务时发生严重错误: {e}", exc_info=True)
         task_manager.update_status_from_thread(-1, f"任务失败: {e}")
 
+# 洗版缓存刷新时每页从 Emby 拉取的项目数
+RESUBSCRIBE_CACHE_PAGE_SIZE = 200
+# 洗版检查需要的项目字段，随分页请求一次带回，不再逐个查询详情
+RESUBSCRIBE_CACHE_ITEM_FIELDS = "ProviderIds,Name,Type,ChildCount,MediaStreams,Path,DateModified,DateLastMediaAdded"
+
+def _resubscribe_rule_hash(rule: Optional[dict]) -> Optional[str]:
+    """规则内容的哈希。排序值只决定哪条规则生效，不影响评估结果，不计入。"""
+    if not rule:
+        return None
+    relevant = {k: v for k, v in rule.items() if k != 'sort_order'}
+    return hashlib.sha1(json.dumps(relevant, sort_keys=True, default=str, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+def _resubscribe_source_fingerprint(item: dict, media_metadata: Optional[dict] = None) -> str:
+    """
+    洗版评估输入的指纹：电影取路径、修改时间和 MediaStreams；
+    剧集取修改时间、子项目数和最近入库时间，分集有增减或替换时都会变化。
+    另外计入本地元数据中的制片国家（决定中字豁免），元数据行出现或变化后会重新评估。
+    """
+    if item.get('Type') == 'Series':
+        parts = [item.get('Path'), item.get('DateModified'), item.get('ChildCount'), item.get('DateLastMediaAdded')]
+    else:
+        parts = [item.get('Path'), item.get('DateModified'), item.get('MediaStreams')]
+    countries = (media_metadata or {}).get('countries_json')
+    parts.append(sorted(countries) if isinstance(countries, list) else countries)
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
 def task_update_resubscribe_cache(processor: MediaProcessor):
     """
     【V-Final Simple - 简化最终版】
@@ -2448,124 +2577,156 @@ def task_update_resubscribe_cache(processor: MediaProcessor):
             task_manager.update_status_from_thread(100, "任务跳过：没有规则指定媒体库")
             return
         
-        # 2. 从 Emby 获取目标库的所有项目
-        task_manager.update_status_from_thread(10, f"正在从 {len(libs_to_process_ids)} 个目标库中获取项目...")
-        all_items_base_info = emby_handler.get_emby_library_items(
-            base_url=processor.emby_url, api_key=processor.emby_api_key, user_id=processor.emby_user_id,
-            media_type_filter="Movie,Series", library_ids=libs_to_process_ids,
-            fields="ProviderIds,Name,Type,ChildCount,_SourceLibraryId"
-        ) or []
-        
-        # 3. 后续的并发处理逻辑完全不变
-        current_db_status_map = {item['item_id']: item['status'] for item in db_handler.get_all_resubscribe_cache()}
-        total = len(all_items_base_info)
-        if total == 0:
-            task_manager.update_status_from_thread(100, "任务完成：在目标媒体库中未找到任何项目。")
-            return
-
-        logger.info(f"  -> 将为 {total} 个媒体项目获取详情并按规则检查洗版状态...")
-        cache_update_batch = []
-        processed_count = 0
         library_to_rule_map = {}
         for rule in reversed(all_enabled_rules):
             target_libs = rule.get('target_library_ids')
             if isinstance(target_libs, list):
                 for lib_id in target_libs:
                     library_to_rule_map[lib_id] = rule
-
-        def process_item_for_cache(item_base_info):
-            # ... (这个内部函数的全部内容保持原样，无需改动)
-            item_id = item_base_info.get('Id')
-            item_name = item_base_info.get('Name')
-            source_lib_id = item_base_info.get('_SourceLibraryId')
-            try:
-                applicable_rule = library_to_rule_map.get(source_lib_id)
-                if not applicable_rule:
-                    return {
-                        "item_id": item_id, "item_name": item_name,
-                        "tmdb_id": item_base_info.get("ProviderIds", {}).get("Tmdb"),
-                        "item_type": item_base_info.get('Type'), "status": 'ok', "reason": "无匹配规则",
-                        "matched_rule_id": None, "matched_rule_name": None, "source_library_id": source_lib_id
-                    }
-                item_details = emby_handler.get_emby_item_details(
-                    item_id=item_id, emby_server_url=processor.emby_url,
-                    emby_api_key=processor.emby_api_key, user_id=processor.emby_user_id
-                )
-                if not item_details: return None
-                tmdb_id = item_details.get("ProviderIds", {}).get("Tmdb")
-                media_metadata = db_handler.get_media_metadata_by_tmdb_id(tmdb_id) if tmdb_id else None
-                item_type = item_details.get('Type')
-                if item_type == 'Series' and item_details.get('ChildCount', 0) > 0:
-                    first_episode_list = emby_handler.get_series_children(
-                        series_id=item_id, base_url=processor.emby_url,
-                        api_key=processor.emby_api_key, user_id=processor.emby_user_id,
-                        include_item_types="Episode", fields="MediaStreams,Path"
-                    )
-                    if first_episode_list:
-                        first_episode = first_episode_list[0]
-                        item_details['MediaStreams'] = first_episode.get('MediaStreams', item_details.get('MediaStreams', []))
-                        item_details['Path'] = first_episode.get('Path', item_details.get('Path', ''))
-                needs_resubscribe, reason = _item_needs_resubscribe(item_details, applicable_rule, media_metadata)
-                old_status = current_db_status_map.get(item_id)
-                new_status = 'ok' if not needs_resubscribe else ('subscribed' if old_status == 'subscribed' else 'needed')
-                AUDIO_LANG_MAP = {'chi': '国语', 'zho': '国语', 'yue': '粤语', 'eng': '英语', 'jpn': '日语', 'kor': '韩语'}
-                SUBTITLE_LANG_MAP = {'chi': '中字', 'zho': '中字', 'eng': '英文'}
-                media_streams = item_details.get('MediaStreams', [])
-                video_stream = next((s for s in media_streams if s.get('Type') == 'Video'), None)
-                resolution_str = "未知"
-                if video_stream and video_stream.get('Width'):
-                    width = video_stream.get('Width')
-                    if width >= 3840: resolution_str = "4K"
-                    elif width >= 1920: resolution_str = "1080p"
-                    elif width >= 1280: resolution_str = "720p"
-                    else: resolution_str = f"{width}p"
-                file_name_lower = os.path.basename(item_details.get('Path', '')).lower()
-                quality_str = _extract_quality_tag_from_filename(file_name_lower, video_stream)
-                effect_str = video_stream.get('VideoRangeType') or video_stream.get('VideoRange', '未知') if video_stream else '未知'
-                audio_langs = list(set(s.get('Language') for s in media_streams if s.get('Type') == 'Audio' and s.get('Language')))
-                audio_str = ', '.join(sorted([AUDIO_LANG_MAP.get(lang, lang) for lang in audio_langs])) or '无'
-                subtitle_langs_raw = list(set(s.get('Language') for s in media_streams if s.get('Type') == 'Subtitle' and s.get('Language')))
-                priority_langs = ['chi', 'zho', 'eng']
-                display_langs = []
-                for lang in priority_langs:
-                    if lang in subtitle_langs_raw:
-                        display_langs.append(SUBTITLE_LANG_MAP.get(lang, lang))
-                        subtitle_langs_raw = [l for l in subtitle_langs_raw if l != lang]
-                display_langs = sorted(list(set(display_langs)))
-                remaining_to_show = 3 - len(display_langs)
-                if subtitle_langs_raw and remaining_to_show > 0:
-                    other_langs_translated = sorted([SUBTITLE_LANG_MAP.get(lang, lang.upper()) for lang in subtitle_langs_raw])
-                    display_langs.extend(other_langs_translated[:remaining_to_show])
-                    if len(subtitle_langs_raw) > remaining_to_show:
-                        display_langs.append('...')
-                subtitle_str = ', '.join(display_langs) or '无'
+        rule_hash_by_library = {lib_id: _resubscribe_rule_hash(rule) for lib_id, rule in library_to_rule_map.items()}
+        # 每条规则只编译一次，同一规则生效的多个媒体库共用
+        compiled_rules = {rule['id']: CompiledResubscribeRule(rule) for rule in all_enabled_rules}
+        existing_cache = {item['item_id']: item for item in db_handler.get_all_resubscribe_cache()}
+        current_db_status_map = {item_id: item['status'] for item_id, item in existing_cache.items()}
+
+        def build_cache_row(item_details, source_lib_id, media_metadata, source_fingerprint):
+            item_id = item_details.get('Id')
+            applicable_rule = library_to_rule_map.get(source_lib_id)
+            if not applicable_rule:
                 return {
                     "item_id": item_id, "item_name": item_details.get('Name'),
-                    "tmdb_id": tmdb_id, "item_type": item_type, "status": new_status, 
-                    "reason": reason if needs_resubscribe else "", "resolution_display": resolution_str, 
-                    "quality_display": quality_str, "effect_display": effect_str.upper(), 
-                    "audio_display": audio_str, "subtitle_display": subtitle_str, 
-                    "audio_languages_raw": audio_langs, "subtitle_languages_raw": subtitle_langs_raw,
-                    "matched_rule_id": applicable_rule.get('id'), "matched_rule_name": applicable_rule.get('name'),
-                    "source_library_id": source_lib_id
+                    "tmdb_id": item_details.get("ProviderIds", {}).get("Tmdb"),
+                    "item_type": item_details.get('Type'), "status": 'ok', "reason": "无匹配规则",
+                    "matched_rule_id": None, "matched_rule_name": None, "source_library_id": source_lib_id,
+                    "source_fingerprint": source_fingerprint, "rule_hash": None
                 }
-            except Exception as e:
-                logger.error(f"处理项目 '{item_name}' (ID: {item_id}) 时线程内发生错误: {e}", exc_info=True)
-                return None
+            tmdb_id = item_details.get("ProviderIds", {}).get("Tmdb")
+            item_type = item_details.get('Type')
+            needs_resubscribe, reason = compiled_rules[applicable_rule['id']].evaluate(item_details, media_metadata)
+            old_status = current_db_status_map.get(item_id)
+            new_status = 'ok' if not needs_resubscribe else ('subscribed' if old_status == 'subscribed' else 'needed')
+            AUDIO_LANG_MAP = {'chi': '国语', 'zho': '国语', 'yue': '粤语', 'eng': '英语', 'jpn': '日语', 'kor': '韩语'}
+            SUBTITLE_LANG_MAP = {'chi': '中字', 'zho': '中字', 'eng': '英文'}
+            media_streams = item_details.get('MediaStreams', [])
+            video_stream = next((s for s in media_streams if s.get('Type') == 'Video'), None)
+            resolution_str = "未知"
+            if video_stream and video_stream.get('Width'):
+                width = video_stream.get('Width')
+                if width >= 3840: resolution_str = "4K"
+                elif width >= 1920: resolution_str = "1080p"
+                elif width >= 1280: resolution_str = "720p"
+                else: resolution_str = f"{width}p"
+            file_name_lower = os.path.basename(item_details.get('Path', '')).lower()
+            quality_str = _extract_quality_tag_from_filename(file_name_lower, video_stream)
+            effect_str = video_stream.get('VideoRangeType') or video_stream.get('VideoRange', '未知') if video_stream else '未知'
+            audio_langs = list(set(s.get('Language') for s in media_streams if s.get('Type') == 'Audio' and s.get('Language')))
+            audio_str = ', '.join(sorted([AUDIO_LANG_MAP.get(lang, lang) for lang in audio_langs])) or '无'
+            subtitle_langs_raw = list(set(s.get('Language') for s in media_streams if s.get('Type') == 'Subtitle' and s.get('Language')))
+            priority_langs = ['chi', 'zho', 'eng']
+            display_langs = []
+            for lang in priority_langs:
+                if lang in subtitle_langs_raw:
+                    display_langs.append(SUBTITLE_LANG_MAP.get(lang, lang))
+                    subtitle_langs_raw = [l for l in subtitle_langs_raw if l != lang]
+            display_langs = sorted(list(set(display_langs)))
+            remaining_to_show = 3 - len(display_langs)
+            if subtitle_langs_raw and remaining_to_show > 0:
+                other_langs_translated = sorted([SUBTITLE_LANG_MAP.get(lang, lang.upper()) for lang in subtitle_langs_raw])
+                display_langs.extend(other_langs_translated[:remaining_to_show])
+                if len(subtitle_langs_raw) > remaining_to_show:
+                    display_langs.append('...')
+            subtitle_str = ', '.join(display_langs) or '无'
+            return {
+                "item_id": item_id, "item_name": item_details.get('Name'),
+                "tmdb_id": tmdb_id, "item_type": item_type, "status": new_status, 
+                "reason": reason if needs_resubscribe else "", "resolution_display": resolution_str, 
+                "quality_display": quality_str, "effect_display": effect_str.upper(), 
+                "audio_display": audio_str, "subtitle_display": subtitle_str, 
+                "audio_languages_raw": audio_langs, "subtitle_languages_raw": subtitle_langs_raw,
+                "matched_rule_id": applicable_rule.get('id'), "matched_rule_name": applicable_rule.get('name'),
+                "source_library_id": source_lib_id,
+                "source_fingerprint": source_fingerprint, "rule_hash": rule_hash_by_library.get(source_lib_id)
+            }
 
-        with ThreadPoolExecutor(max_workers=10) as executor:
-            future_to_item = {executor.submit(process_item_for_cache, item): item for item in all_items_base_info}
-            for future in as_completed(future_to_item):
+        # 2. 按页从 Emby 拉取项目（一次带回 MediaStreams/Path），剧集的第一集每页批量查询一次，每页写库一次
+        #    文件指纹和规则哈希都与缓存一致的项目直接跳过；规则修改后只有它生效的媒体库会被重新评估
+        processed_count = 0
+        written_count = 0
+        skipped_count = 0
+        for lib_index, lib_id in enumerate(libs_to_process_ids):
+            if processor.is_stop_requested(): break
+            pages = emby_handler.iter_emby_library_items_paged(
+                base_url=processor.emby_url, api_key=processor.emby_api_key, user_id=processor.emby_user_id,
+                library_id=lib_id, media_type_filter="Movie,Series",
+                fields=RESUBSCRIBE_CACHE_ITEM_FIELDS, page_size=RESUBSCRIBE_CACHE_PAGE_SIZE,
+                stop_event=processor.get_stop_event()
+            )
+            for page in pages:
                 if processor.is_stop_requested(): break
-                result = future.result()
-                if result: cache_update_batch.append(result)
-                processed_count += 1
-                progress = int(20 + (processed_count / (total or 1)) * 80)
-                task_manager.update_status_from_thread(progress, f"({processed_count}/{total}) 正在分析: {future_to_item[future].get('Name')}")
+                processed_count += len(page)
+
+                # 本地元数据整页一次查询（不请求 Emby），它也参与指纹，所以放在跳过判断之前
+                metadata_map = {}
+                for item_type in ('Movie', 'Series'):
+                    tmdb_ids = [item.get("ProviderIds", {}).get("Tmdb") for item in page if item.get('Type') == item_type]
+                    tmdb_ids = [tid for tid in tmdb_ids if tid]
+                    for row in db_handler.get_media_metadata_by_tmdb_ids(tmdb_ids, item_type):
+                        metadata_map[(row['tmdb_id'], item_type)] = row
+
+                def metadata_for(item):
+                    tmdb_id = item.get("ProviderIds", {}).get("Tmdb")
+                    return metadata_map.get((tmdb_id, item.get('Type'))) if tmdb_id else None
+
+                lib_rule_hash = rule_hash_by_library.get(lib_id)
+                fingerprints = {}
+                items_to_evaluate = []
+                for item in page:
+                    fingerprint = _resubscribe_source_fingerprint(item, metadata_for(item))
+                    cached_row = existing_cache.get(item.get('Id'))
+                    if cached_row and cached_row.get('source_fingerprint') == fingerprint and cached_row.get('rule_hash') == lib_rule_hash:
+                        skipped_count += 1
+                        continue
+                    fingerprints[item.get('Id')] = fingerprint
+                    items_to_evaluate.append(item)
+                if not items_to_evaluate:
+                    continue
 
-        if cache_update_batch:
-            logger.info(f"分析完成，正在将 {len(cache_update_batch)} 条记录写入缓存表...")
-            db_handler.upsert_resubscribe_cache_batch(cache_update_batch)
+                series_ids = [item['Id'] for item in items_to_evaluate if item.get('Type') == 'Series' and item.get('ChildCount', 0) > 0]
+                first_episodes = {}
+                if series_ids:
+                    first_episodes = emby_handler.get_first_episodes_for_series(
+                        base_url=processor.emby_url, api_key=processor.emby_api_key,
+                        user_id=processor.emby_user_id, series_ids=series_ids
+                    ) or {}
+                series_id_set = set(series_ids)
+
+                cache_update_batch = []
+                for item_details in items_to_evaluate:
+                    try:
+                        item_id = item_details.get('Id')
+                        fingerprint = fingerprints[item_id]
+                        first_episode = first_episodes.get(item_id)
+                        if first_episode:
+                            item_details['MediaStreams'] = first_episode.get('MediaStreams', item_details.get('MediaStreams', []))
+                            item_details['Path'] = first_episode.get('Path', item_details.get('Path', ''))
+                        elif item_id in series_id_set:
+                            # 分集未能取回（批量查询失败或结果缺失），本次结果不可信，不写指纹，下次运行重新评估
+                            fingerprint = None
+                        result = build_cache_row(item_details, lib_id, metadata_for(item_details), fingerprint)
+                        if result: cache_update_batch.append(result)
+                    except Exception as e:
+                        logger.error(f"处理项目 '{item_details.get('Name')}' (ID: {item_details.get('Id')}) 时发生错误: {e}", exc_info=True)
+
+                if cache_update_batch:
+                    db_handler.upsert_resubscribe_cache_batch(cache_update_batch)
+                    written_count += len(cache_update_batch)
+                progress = int(10 + (lib_index / len(libs_to_process_ids)) * 90)
+                task_manager.update_status_from_thread(progress, f"已分析 {processed_count} 个项目 (媒体库 {lib_index + 1}/{len(libs_to_process_ids)})...")
+
+        if processed_count == 0 and not processor.is_stop_requested():
+            task_manager.update_status_from_thread(100, "任务完成：在目标媒体库中未找到任何项目。")
+            return
+        logger.info(f"  -> 分析完成，共检查 {processed_count} 个媒体项目，{skipped_count} 个未变化已跳过，写入 {written_count} 条缓存记录。")
 
         final_message = "媒体洗版状态刷新完成！"
         if processor.is_stop_requested(): final_message = "任务已中止。"
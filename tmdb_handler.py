@@ -418,6 +418,35 @@ def get_person_credits_tmdb(person_id: int, api_key: str) -> Optional[Dict[str,
 
     return details
 
+# --- 获取一段时间内有变动的人物ID ---
+def get_changed_person_ids(api_key: str, start_date: str, end_date: Optional[str] = None,
+                           max_pages: Optional[int] = None, rate_limiter=None) -> Optional[set]:
+    """
+    通过 /person/changes 获取 start_date 以来有变动的人物 ID 集合（TMDb 最多支持 14 天的区间）。
+    任何一页请求失败、或总页数超过 max_pages 时都返回 None，调用方应视为“全部可能有变动”。
+    rate_limiter: 可选，带 wait() 方法的速率限制器，每次请求前调用。
+    """
+    params = {"start_date": start_date, "page": 1}
+    if end_date:
+        params["end_date"] = end_date
+    changed_ids = set()
+    while True:
+        if rate_limiter is not None:
+            rate_limiter.wait()
+        data = _tmdb_request("/person/changes", api_key, params)
+        if data is None:
+            return None
+        total_pages = data.get("total_pages") or 1
+        if max_pages is not None and total_pages > max_pages:
+            logger.debug(f"TMDb: {start_date} 以来的人物变动共 {total_pages} 页，超过上限 {max_pages} 页，放弃使用变动列表。")
+            return None
+        changed_ids.update(item.get("id") for item in data.get("results", []) if item.get("id"))
+        if params["page"] >= total_pages:
+            break
+        params["page"] += 1
+    logger.debug(f"TMDb: {start_date} 以来共有 {len(changed_ids)} 个人物有变动。")
+    return changed_ids
+
 # --- 通过 TMDb API v3 /find/{imdb_id} 方式获取TMDb ID ---
 def get_tmdb_id_by_imdb_id(imdb_id: str, api_key: str, media_type: str) -> Optional[int]:
     """
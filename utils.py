@@ -201,6 +201,29 @@ class LogDBManager:
         except Exception as e:
             logger.error(f"更新资源同步时间戳时失败 for item {item_id}: {e}", exc_info=True)
 
+    def get_cast_fingerprint(self, cursor: psycopg2.extensions.cursor, item_id: str) -> Optional[str]:
+        """读取媒体项上次成功写回 Emby 的演员表指纹。"""
+        try:
+            cursor.execute("SELECT cast_fingerprint FROM processed_log WHERE item_id = %s", (item_id,))
+            row = cursor.fetchone()
+            return row['cast_fingerprint'] if row else None
+        except Exception as e:
+            logger.error(f"读取演员表指纹失败 (Item ID: {item_id}): {e}")
+            return None
+
+    def save_cast_fingerprint(self, cursor: psycopg2.extensions.cursor, item_id: str, fingerprint: str):
+        """记录媒体项本次写回 Emby 的演员表指纹，下次内容不变时可跳过写回。"""
+        sql = """
+            INSERT INTO processed_log (item_id, cast_fingerprint)
+            VALUES (%s, %s)
+            ON CONFLICT (item_id) DO UPDATE SET
+                cast_fingerprint = EXCLUDED.cast_fingerprint;
+        """
+        try:
+            cursor.execute(sql, (item_id, fingerprint))
+        except Exception as e:
+            logger.error(f"保存演员表指纹失败 (Item ID: {item_id}): {e}")
+
 # --- ★★★ 统一分级映射功能 (V2 - 健壮版) ★★★ ---
 # 1. 定义我们自己的、统一的、友好的分级体系
 UNIFIED_RATING_CATEGORIES = [
@@ -3,6 +3,7 @@
 import time
 import json
 import os
+import hashlib
 import concurrent.futures
 from typing import Optional, Dict, Any, List
 from datetime import datetime, timedelta, timezone
@@ -35,12 +36,50 @@ INTERNAL_STATUS_TRANSLATION = {
 STATUS_WATCHING = 'Watching'
 STATUS_PAUSED = 'Paused'
 STATUS_COMPLETED = 'Completed'
+# 常规追剧检查会提前这么多小时处理“即将到期”的剧集，避免定时任务比 next_check_at 早几分钟启动而整整错过一轮
+WATCHLIST_DUE_GRACE_HOURS = 2
+# 待播集即将播出或已播出但尚未入库时的复查间隔
+WATCHLIST_ACTIVE_RECHECK = timedelta(hours=12)
+# 追剧检查需要的剧集级字段：用于判断本地分集是否有变化
+WATCHLIST_EMBY_SERIES_FIELDS = "Id,Name,RecursiveItemCount,DateLastMediaAdded"
 def translate_status(status: str) -> str:
     """一个简单的辅助函数，用于翻译状态，如果找不到翻译则返回原文。"""
     return TMDB_STATUS_TRANSLATION.get(status, status)
 def translate_internal_status(status: str) -> str:
     """★★★ 新增：一个辅助函数，用于翻译内部状态，用于日志显示 ★★★"""
     return INTERNAL_STATUS_TRANSLATION.get(status, status)
+def _parse_air_date(episode: Optional[Dict[str, Any]]) -> Optional[datetime]:
+    if not episode or not episode.get('air_date'): return None
+    try:
+        return datetime.strptime(episode['air_date'], '%Y-%m-%d').replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+def calculate_next_check_at(final_status: str, tmdb_status: Optional[str], next_episode: Optional[Dict[str, Any]],
+                            last_episode: Optional[Dict[str, Any]], has_complete_metadata: bool,
+                            now: Optional[datetime] = None) -> Optional[datetime]:
+    """
+    根据待播集、最近播出集和剧集状态，计算这部剧下一次需要被常规追剧检查处理的时间。
+    返回 None 表示常规检查不再处理它（已完结的剧集交给复活检查）。
+    """
+    if final_status == STATUS_COMPLETED:
+        return None
+    now = now or datetime.now(timezone.utc)
+
+    next_air = _parse_air_date(next_episode)
+    if next_air:
+        # 播出前一天开始检查，与 paused_until 保持一致
+        check_at = next_air - timedelta(days=1)
+        return check_at if check_at > now + WATCHLIST_ACTIVE_RECHECK else now + WATCHLIST_ACTIVE_RECHECK
+
+    last_air = _parse_air_date(last_episode)
+    if not has_complete_metadata or (last_air and now - last_air <= timedelta(days=14)):
+        # 刚播完或元数据不全，TMDb 数据还在频繁变化
+        return now + timedelta(days=1)
+    if tmdb_status in ["Ended", "Canceled"]:
+        # 已完结但本地不完整，等待补全
+        return now + timedelta(days=3)
+    # 季歇期
+    return now + timedelta(days=7)
 class WatchlistProcessor:
     """
     【V12 - 精准强制完结版】
@@ -130,48 +169,56 @@ class WatchlistProcessor:
                 logger.error(f"自动添加剧集 '{item_name}' 到追剧列表时发生数据库错误: {e}", exc_info=True)
 
     # --- 核心任务启动器 ---
-    def run_regular_processing_task_concurrent(self, progress_callback: callable, item_id: Optional[str] = None):
-        """【高铁版 - 并发追剧更新】处理所有活跃的剧集。"""
+    def run_regular_processing_task_concurrent(self, progress_callback: callable, item_id: Optional[str] = None, force: bool = False):
+        """
+        【高铁版 - 并发追剧更新】处理所有活跃的剧集。
+        默认只处理 next_check_at 已到期的剧集；force=True 时忽略 next_check_at 全部重新检查。
+        """
         self.progress_callback = progress_callback
         task_name = "并发追剧更新"
         if item_id: task_name = f"单项追剧更新 (ID: {item_id})"
         
         self.progress_callback(0, "准备检查待更新剧集...")
         try:
-            today_str = datetime.now(timezone.utc).date().isoformat()
-            active_series = self._get_series_to_process(
-                f"WHERE status = '{STATUS_WATCHING}' OR (status = '{STATUS_PAUSED}' AND paused_until <= '{today_str}')",
-                item_id
-            )
+            emby_series_snapshot = None
             # --- 新增：检测 Emby 中已删除的剧集并从追剧列表移除 ---
             if not item_id: # 只在全量处理时执行此检查
                 self.progress_callback(0, "正在检测 Emby 中已删除的剧集...")
                 
-                # 1. 获取 Emby 媒体库中所有剧集的 ID
+                # 1. 获取 Emby 媒体库中所有剧集的快照（同时用于后面的存活检查和分集变化判断）
                 emby_series_ids = set()
                 try:
                     all_libraries = emby_handler.get_emby_libraries(self.emby_url, self.emby_api_key, self.emby_user_id)
                     if all_libraries:
                         library_ids_to_scan = [lib['Id'] for lib in all_libraries if lib.get('CollectionType') in ['tvshows', 'mixed']]
                         
-                        # 使用并发获取所有剧集
+                        # 使用并发获取所有剧集；任何一个库获取失败，快照都不完整，不能用来判断删除
                         all_emby_series_items = []
+                        failed_library_ids = []
                         with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
                             future_to_library = {
                                 executor.submit(emby_handler.get_emby_library_items, 
-                                                self.emby_url, self.emby_api_key, "Series", self.emby_user_id, [lib_id]): lib_id
+                                                self.emby_url, self.emby_api_key, "Series", self.emby_user_id, [lib_id],
+                                                fields=WATCHLIST_EMBY_SERIES_FIELDS, strict=True): lib_id
                                 for lib_id in library_ids_to_scan
                             }
                             for future in concurrent.futures.as_completed(future_to_library):
                                 try:
                                     result = future.result()
-                                    if result:
+                                    if result is None:
+                                        failed_library_ids.append(future_to_library[future])
+                                    else:
                                         all_emby_series_items.extend(result)
                                 except Exception as exc:
+                                    failed_library_ids.append(future_to_library[future])
                                     logger.error(f"从媒体库 {future_to_library[future]} 获取剧集时发生异常: {exc}")
                         
-                        emby_series_ids = {item['Id'] for item in all_emby_series_items if item.get('Id')}
-                        logger.info(f"已从 Emby 获取到 {len(emby_series_ids)} 个剧集ID。")
+                        if failed_library_ids:
+                            logger.warning(f"有 {len(failed_library_ids)} 个媒体库的剧集获取失败 ({failed_library_ids})，Emby 剧集快照不完整。")
+                        else:
+                            emby_series_snapshot = {item['Id']: item for item in all_emby_series_items if item.get('Id')}
+                            emby_series_ids = set(emby_series_snapshot)
+                            logger.info(f"已从 Emby 获取到 {len(emby_series_ids)} 个剧集ID。")
                     else:
                         logger.warning("未能从 Emby 获取到任何媒体库，跳过已删除剧集检测。")
                 except Exception as e:
@@ -190,9 +237,11 @@ class WatchlistProcessor:
                     logger.error(f"获取追剧列表剧集ID时发生数据库错误: {e}", exc_info=True)
                     # 即使出错也继续
                 
-                # 3. 比较并找出已删除的剧集
-                deleted_series_ids = watchlist_series_ids - emby_series_ids
-                if deleted_series_ids:
+                # 3. 比较并找出已删除的剧集（快照获取失败时跳过，避免误删整个列表）
+                deleted_series_ids = watchlist_series_ids - emby_series_ids if emby_series_snapshot is not None else set()
+                if emby_series_snapshot is None:
+                    logger.warning("Emby 剧集快照不可用，跳过已删除剧集检测。")
+                elif deleted_series_ids:
                     logger.warning(f"检测到 {len(deleted_series_ids)} 部剧集已从 Emby 删除，将从追剧列表移除。")
                     for deleted_id in deleted_series_ids:
                         db_handler.remove_item_from_watchlist(item_id=deleted_id)
@@ -201,15 +250,23 @@ class WatchlistProcessor:
             # --- 新增逻辑结束 ---
 
             today_str = datetime.now(timezone.utc).date().isoformat()
-            active_series = self._get_series_to_process(
-                f"WHERE status = '{STATUS_WATCHING}' OR (status = '{STATUS_PAUSED}' AND paused_until <= '{today_str}')",
-                item_id
-            )
+            where_clause = f"WHERE (status = '{STATUS_WATCHING}' OR (status = '{STATUS_PAUSED}' AND paused_until <= '{today_str}'))"
+            if not force:
+                # ★★★ 只处理到期的剧集，下一集还远的剧不再每轮都请求TMDb ★★★
+                where_clause += f" AND (next_check_at IS NULL OR next_check_at <= NOW() + INTERVAL '{WATCHLIST_DUE_GRACE_HOURS} hours')"
+            active_series = self._get_series_to_process(where_clause, item_id)
             total = len(active_series)
             if total == 0:
                 self.progress_callback(100, "没有需要立即处理的剧集。")
                 return
 
+            # ★★★ 存活检查：全量处理时直接复用上面的剧集快照，否则对待处理集合做一次批量ID查询 ★★★
+            if emby_series_snapshot is None:
+                emby_series_snapshot = emby_handler.get_emby_items_map_by_ids(
+                    self.emby_url, self.emby_api_key, self.emby_user_id,
+                    [series['item_id'] for series in active_series], fields=WATCHLIST_EMBY_SERIES_FIELDS
+                )
+
             self.progress_callback(5, f"开始并发处理 {total} 部剧集 (5个并发)...")
             
             processed_count = 0
@@ -227,7 +284,7 @@ class WatchlistProcessor:
                 
                 try:
                     # ★ 核心耗时操作在这里
-                    self._process_one_series(series)
+                    self._process_one_series(series, emby_series_snapshot)
                     return "处理成功"
                 except Exception as e:
                     logger.error(f"处理剧集 {series.get('item_name')} (ID: {series.get('item_id')}) 时发生错误: {e}", exc_info=False)
@@ -323,7 +380,8 @@ class WatchlistProcessor:
                         "paused_until": None,
                         "tmdb_status": new_tmdb_status,
                         # 【关键】一旦因新一季而复活，就必须重置 force_ended 标志，让它恢复正常追剧逻辑
-                        "force_ended": False 
+                        "force_ended": False,
+                        "next_check_at": None
                     }
                     self._update_watchlist_entry(series['item_id'], series['item_name'], updates_to_db)
                 
@@ -478,8 +536,29 @@ class WatchlistProcessor:
             logger.error(f"获取追剧列表时发生数据库错误: {e}")
             return []
             
+    @staticmethod
+    def _tmdb_episodes_fingerprint(tmdb_status: Optional[str], all_tmdb_episodes: List[Dict[str, Any]]) -> str:
+        """TMDb 侧的分集指纹：分集列表、播出日期、是否有简介以及剧集状态。"""
+        episodes = sorted(
+            (ep.get('season_number') or 0, ep.get('episode_number') or 0, ep.get('air_date') or '', bool((ep.get('overview') or '').strip()))
+            for ep in all_tmdb_episodes
+        )
+        return hashlib.sha1(json.dumps([tmdb_status, episodes]).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _emby_series_fingerprint(emby_series: Optional[Dict[str, Any]]) -> Optional[str]:
+        """Emby 侧的剧集指纹：子项目数量和最后入库时间，两者都拿不到时返回 None（不可用于跳过）。"""
+        if not emby_series: return None
+        count, last_added = emby_series.get('RecursiveItemCount'), emby_series.get('DateLastMediaAdded')
+        if count is None and last_added is None: return None
+        return f"{count}|{last_added}"
+
     # ★★★ 核心处理逻辑：单个剧集的所有操作在此完成 ★★★
-    def _process_one_series(self, series_data: Dict[str, Any]):
+    def _process_one_series(self, series_data: Dict[str, Any], emby_series_snapshot: Optional[Dict[str, Dict[str, Any]]] = None):
+        """
+        处理单部剧集。
+        emby_series_snapshot 为批量获取的 {Emby ID: 剧集} 快照；提供时不再逐部请求 Emby 做存活检查。
+        """
         item_id = series_data['item_id']
         tmdb_id = series_data['tmdb_id']
         item_name = series_data['item_name']
@@ -488,10 +567,13 @@ class WatchlistProcessor:
         logger.info(f"【追剧检查】正在处理: '{item_name}' (TMDb ID: {tmdb_id})")
 
         # 步骤1: 存活检查
-        item_details_for_check = emby_handler.get_emby_item_details(
-            item_id=item_id, emby_server_url=self.emby_url, emby_api_key=self.emby_api_key,
-            user_id=self.emby_user_id, fields="Id,Name"
-        )
+        if emby_series_snapshot is not None:
+            item_details_for_check = emby_series_snapshot.get(item_id)
+        else:
+            item_details_for_check = emby_handler.get_emby_item_details(
+                item_id=item_id, emby_server_url=self.emby_url, emby_api_key=self.emby_api_key,
+                user_id=self.emby_user_id, fields=WATCHLIST_EMBY_SERIES_FIELDS
+            )
         if not item_details_for_check:
             logger.warning(f"  -> 剧集 '{item_name}' (ID: {item_id}) 在 Emby 中已不存在。将从追剧列表移除。")
             db_handler.remove_item_from_watchlist(item_id=item_id)
@@ -518,13 +600,25 @@ class WatchlistProcessor:
             time.sleep(0.1)
 
         # 步骤3: 获取Emby本地数据
-        emby_children = emby_handler.get_series_children(item_id, self.emby_url, self.emby_api_key, self.emby_user_id, fields="Id,Name,ParentIndexNumber,IndexNumber,Type,Overview")
+        # TMDb 分集和 Emby 剧集指纹都与上次一致时，复用上次记录的本地分集，不再拉取子项目
+        tmdb_fingerprint = self._tmdb_episodes_fingerprint(latest_series_data.get("status"), all_tmdb_episodes)
+        emby_fingerprint = self._emby_series_fingerprint(item_details_for_check)
+        children_cache = series_data.get('emby_children_cache_json') or {}
+        emby_children = None
         emby_seasons = {}
-        if emby_children:
-            for child in emby_children:
-                s_num, e_num = child.get('ParentIndexNumber'), child.get('IndexNumber')
-                if s_num is not None and e_num is not None:
-                    emby_seasons.setdefault(s_num, set()).add(e_num)
+        reused_children_cache = False
+        if (emby_fingerprint and children_cache.get('tmdb') == tmdb_fingerprint
+                and children_cache.get('emby') == emby_fingerprint and 'seasons' in children_cache):
+            logger.debug("  -> TMDb 与 Emby 均无变化，复用上次记录的本地分集信息。")
+            emby_seasons = {int(s_num): set(e_nums) for s_num, e_nums in children_cache['seasons'].items()}
+            reused_children_cache = True
+        else:
+            emby_children = emby_handler.get_series_children(item_id, self.emby_url, self.emby_api_key, self.emby_user_id, fields="Id,Name,ParentIndexNumber,IndexNumber,Type,Overview")
+            if emby_children:
+                for child in emby_children:
+                    s_num, e_num = child.get('ParentIndexNumber'), child.get('IndexNumber')
+                    if s_num is not None and e_num is not None:
+                        emby_seasons.setdefault(s_num, set()).add(e_num)
 
         # 步骤4: 计算状态和缺失信息
         new_tmdb_status = latest_series_data.get("status")
@@ -597,8 +691,39 @@ class WatchlistProcessor:
             paused_until_date = None
             logger.warning(f"  -> [强制完结生效] 剧集 '{item_name}' 被标记为强制完结，即使系统判断为其他状态，也将强制变更为 '已完结'。")
 
+        next_check_at = calculate_next_check_at(
+            final_status, new_tmdb_status, real_next_episode_to_air, last_episode_to_air, has_complete_metadata
+        )
+        if next_check_at:
+            logger.debug(f"  -> 下次常规检查时间: {next_check_at.strftime('%Y-%m-%d %H:%M')} (UTC)")
+
+        tmdb_episodes_map = {
+            f"S{ep.get('season_number')}E{ep.get('episode_number')}": ep
+            for ep in all_tmdb_episodes
+            if ep.get('season_number') is not None and ep.get('episode_number') is not None
+        }
+
+        # 只有在没有待注入简介的分集时才记录分集快照，否则下次仍需拉取子项目重试
+        new_children_cache = None
+        if reused_children_cache:
+            new_children_cache = children_cache
+        elif emby_children is not None and emby_fingerprint:
+            has_pending_overview = any(
+                child.get("Type") == "Episode" and not child.get("Overview")
+                and (tmdb_episodes_map.get(f"S{child.get('ParentIndexNumber')}E{child.get('IndexNumber')}", {}).get("overview") or '').strip()
+                for child in emby_children
+            )
+            if not has_pending_overview:
+                new_children_cache = {
+                    "tmdb": tmdb_fingerprint,
+                    "emby": emby_fingerprint,
+                    "seasons": {str(s_num): sorted(e_nums) for s_num, e_nums in emby_seasons.items()}
+                }
+
         # 步骤5: 更新追剧数据库
         updates_to_db = {
+            "next_check_at": next_check_at,
+            "emby_children_cache_json": json.dumps(new_children_cache) if new_children_cache else None,
             "status": final_status,
             "paused_until": paused_until_date.isoformat() if paused_until_date else None,
             "tmdb_status": new_tmdb_status,
@@ -609,14 +734,8 @@ class WatchlistProcessor:
         self._update_watchlist_entry(item_id, item_name, updates_to_db)
 
         # 步骤6: 【最终动作】如果需要，命令Emby刷新自己
-        # (此部分逻辑不变)
-        tmdb_episodes_map = {
-            f"S{ep.get('season_number')}E{ep.get('episode_number')}": ep
-            for ep in all_tmdb_episodes
-            if ep.get('season_number') is not None and ep.get('episode_number') is not None
-        }
-
-        for emby_episode in emby_children:
+        # (复用了分集快照时没有需要注入的分集)
+        for emby_episode in emby_children or []:
             if emby_episode.get("Type") == "Episode" and not emby_episode.get("Overview"):
                 s_num = emby_episode.get("ParentIndexNumber")
                 e_num = emby_episode.get("IndexNumber")
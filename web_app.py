@@ -132,7 +132,8 @@ def init_db():
                         processed_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(), 
                         score REAL,
                         assets_synced_at TIMESTAMP WITH TIME ZONE,
-                        last_emby_modified_at TIMESTAMP WITH TIME ZONE
+                        last_emby_modified_at TIMESTAMP WITH TIME ZONE,
+                        cast_fingerprint TEXT
                     )
                 """)
                 cursor.execute("""
@@ -210,6 +211,24 @@ def init_db():
                 """)
                 cursor.execute("CREATE INDEX IF NOT EXISTS idx_cc_type ON custom_collections (type)")
                 cursor.execute("CREATE INDEX IF NOT EXISTS idx_cc_status ON custom_collections (status)")
+                # 新媒体入库时用 @> 查找包含该 TMDb ID 的榜单合集，GIN 索引避免逐行解析整个 JSON
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_cc_generated_media_gin ON custom_collections USING GIN (generated_media_info_json jsonb_path_ops)")
+
+                logger.trace("  -> 正在创建 'custom_collection_members' 表...")
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS custom_collection_members (
+                        collection_id INTEGER NOT NULL REFERENCES custom_collections(id) ON DELETE CASCADE,
+                        position INTEGER NOT NULL,
+                        tmdb_id TEXT,
+                        media_type TEXT,
+                        season INTEGER,
+                        status TEXT,
+                        emby_id TEXT,
+                        PRIMARY KEY (collection_id, position)
+                    )
+                """)
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_ccm_tmdb_id ON custom_collection_members (tmdb_id)")
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_ccm_collection_status ON custom_collection_members (collection_id, status, position)")
 
                 logger.trace("  -> 正在创建 'media_metadata' 表...")
                 cursor.execute("""
@@ -248,7 +267,9 @@ def init_db():
                         next_episode_to_air_json JSONB,
                         missing_info_json JSONB,
                         paused_until DATE DEFAULT NULL,
-                        force_ended BOOLEAN DEFAULT FALSE NOT NULL
+                        force_ended BOOLEAN DEFAULT FALSE NOT NULL,
+                        next_check_at TIMESTAMP WITH TIME ZONE,
+                        emby_children_cache_json JSONB
                     )
                 """)
                 cursor.execute("CREATE INDEX IF NOT EXISTS idx_watchlist_status ON watchlist (status)")
@@ -263,7 +284,8 @@ def init_db():
                         imdb_id TEXT UNIQUE, 
                         douban_celebrity_id TEXT UNIQUE,
                         last_synced_at TIMESTAMP WITH TIME ZONE, 
-                        last_updated_at TIMESTAMP WITH TIME ZONE
+                        last_updated_at TIMESTAMP WITH TIME ZONE,
+                        emby_fingerprint TEXT
                     )
                 """)
 
@@ -295,7 +317,9 @@ def init_db():
                         status TEXT DEFAULT 'active',
                         last_checked_at TIMESTAMP WITH TIME ZONE,
                         added_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
-                        config_min_rating REAL DEFAULT 6.0
+                        config_min_rating REAL DEFAULT 6.0,
+                        credits_fingerprint TEXT,
+                        credits_checked_at TIMESTAMP WITH TIME ZONE
                     )
                 """)
                 cursor.execute("CREATE INDEX IF NOT EXISTS idx_as_status ON actor_subscriptions (status)")
@@ -374,11 +398,26 @@ def init_db():
                         audio_languages_raw JSONB,
                         subtitle_languages_raw JSONB,
                         last_checked_at TIMESTAMP WITH TIME ZONE,
-                        source_library_id TEXT
+                        source_library_id TEXT,
+                        source_fingerprint TEXT,
+                        rule_hash TEXT
                     )
                 """)
                 cursor.execute("CREATE INDEX IF NOT EXISTS idx_resubscribe_cache_status ON resubscribe_cache (status);")
 
+                logger.trace("  -> 正在创建 'task_checkpoints' 表 (全量任务断点续跑)...")
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS task_checkpoints (
+                        run_key TEXT PRIMARY KEY,
+                        params_json JSONB,
+                        work_list_json JSONB,
+                        cursor_index INTEGER DEFAULT 0,
+                        completed_ahead_json JSONB,
+                        created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+                        updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+                    )
+                """)
+
                 # --- 2. 执行平滑升级检查 ---
                 logger.info("  -> 开始执行数据库表结构平滑升级检查...")
                 try:
@@ -401,17 +440,32 @@ def init_db():
                     # --- 2.2 定义所有需要检查和添加的新列 ---
                     # 格式: {'table_name': {'column_name': 'COLUMN_TYPE'}}
                     schema_upgrades = {
+                        'processed_log': {
+                            "cast_fingerprint": "TEXT"
+                        },
+                        'person_identity_map': {
+                            "emby_fingerprint": "TEXT"
+                        },
                         'media_metadata': {
                             "official_rating": "TEXT",
-                            "unified_rating": "TEXT"
+                            "unified_rating": "TEXT",
+                            "emby_item_id": "TEXT"
                         },
                         'watchlist': {
-                            "last_episode_to_air_json": "JSONB"
+                            "last_episode_to_air_json": "JSONB",
+                            "next_check_at": "TIMESTAMP WITH TIME ZONE",
+                            "emby_children_cache_json": "JSONB"
+                        },
+                        'actor_subscriptions': {
+                            "credits_fingerprint": "TEXT",
+                            "credits_checked_at": "TIMESTAMP WITH TIME ZONE"
                         },
                         'resubscribe_cache': {
                             "matched_rule_id": "INTEGER",
                             "matched_rule_name": "TEXT",
-                            "source_library_id": "TEXT"
+                            "source_library_id": "TEXT",
+                            "source_fingerprint": "TEXT",
+                            "rule_hash": "TEXT"
                         }
                     }
 
@@ -459,6 +513,14 @@ def init_db():
                 except Exception as e_fk:
                      logger.error(f"  -> [数据库升级] 检查或添加外键时出错: {e_fk}", exc_info=True)
 
+                try:
+                    # 从 generated_media_info_json 回填合集成员子表（只处理还没有成员行的合集）
+                    backfilled = db_handler.rebuild_missing_custom_collection_members(cursor)
+                    if backfilled:
+                        logger.info(f"    -> [数据库升级] 已从媒体列表JSON回填 {backfilled} 条合集成员记录。")
+                except Exception as e_members:
+                    logger.error(f"  -> [数据库升级] 回填合集成员子表时出错: {e_members}", exc_info=True)
+
                 logger.info("  -> 数据库平滑升级检查完成。")
 
             conn.commit()
@@ -773,6 +835,8 @@ def emby_webhook():
                 log_manager = LogDBManager()
                 log_manager.remove_from_processed_log(conn.cursor(), original_item_id)
                 conn.commit()
+            if extensions.media_processor_instance:
+                extensions.media_processor_instance.processed_items_cache.discard(original_item_id)
             return jsonify({"status": "processed_log_entry_removed", "item_id": original_item_id}), 200
         except Exception as e:
             return jsonify({"status": "error_processing_remove_event", "error": str(e)}), 500